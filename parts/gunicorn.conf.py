@@ -0,0 +1,31 @@
+# Gunicorn reads this automatically from the working directory.
+#
+# The site runs as WSGI with sync workers by default. Set ASGI=true to run
+# parts.asgi under Uvicorn workers instead, so async views (STEP export)
+# wait on Onshape without holding a worker.
+import os
+
+if os.environ.get("ASGI", "").lower() in ("1", "true", "yes"):
+    wsgi_app = "parts.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "parts.wsgi:application"
+
+# With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to files
+# there (see parts_site/metrics.py). Clear the previous run's files when the
+# server starts; subdirectories belong to the background worker services.
+_metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    if _metrics_dir:
+        os.makedirs(_metrics_dir, exist_ok=True)
+        for name in os.listdir(_metrics_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(_metrics_dir, name))
+
+
+def child_exit(server, worker):
+    if _metrics_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid, _metrics_dir)
@@ -3,6 +3,10 @@ ASGI config for parts project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with Gunicorn's Uvicorn worker:
+
+    gunicorn -k uvicorn_worker.UvicornWorker parts.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -13,4 +17,32 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parts.settings')
 
-application = get_asgi_application()
+# Under ASGI, sync views run on per-request threads, so persistent connections
+# would pile up one per thread. Use DB_POOL (psycopg 3) for reuse instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+django_application = get_asgi_application()
+
+# Imported once get_asgi_application() has set Django up
+from parts_site.onshape import close_async_session, open_async_session
+
+
+async def lifespan(receive, send):
+    # One event loop serves the worker from startup to shutdown, so the
+    # Onshape client can keep its connections alive between requests
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            open_async_session()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_session()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -94,12 +94,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'parts_site.metrics.MetricsMiddleware',  # First, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    'parts_site.static_files.StaticFilesMiddleware',  # WhiteNoise for static files, async capable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'parts_site.roles.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -120,6 +122,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'parts_site.roles.roles_context',
             ],
         },
     },
@@ -188,7 +191,56 @@ else:
         }
     }
 
+# Connection reuse
+# Each gunicorn worker keeps its connection open for DB_CONN_MAX_AGE seconds
+# instead of reconnecting on every request; health checks drop connections
+# the server has closed (restart, idle timeout) before a request uses them.
+DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # WAL lets readers carry on while the Onshape worker writes, and the busy
+    # timeout makes a writer wait for the lock instead of failing at once
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'timeout': env.int('SQLITE_BUSY_TIMEOUT', default=20),
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+    })
+elif env.bool('DB_POOL', default=False):
+    # Server-side pool per worker (needs psycopg 3: pip install "psycopg[binary,pool]").
+    # Django's pool manages connection lifetime itself, so CONN_MAX_AGE must be 0.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size': env.int('DB_POOL_MAX_SIZE', default=4),
+        'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+    }
+
+
+# Cache
+# Local memory by default (per process). Point CACHE_URL at a shared backend
+# when running several gunicorn workers, e.g. filecache:///var/tmp/parts-cache
+# or redis://localhost:6379/1 (needs the redis package).
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
 
+# Seconds a rendered part/assembly table stays cached. With a shared cache
+# edits invalidate it straight away and this only bounds how long orphaned
+# fragments linger. A per-process cache only sees the edits made in its own
+# process, so there it also bounds how stale the other workers' tables get.
+LOCAL_CACHE = CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+TREE_CACHE_TIMEOUT = env.int('TREE_CACHE_TIMEOUT', default=60 if LOCAL_CACHE else 60 * 60 * 24)
+
+# Seconds a user's groups stay cached in their session. Group changes
+# invalidate it through the cache; this only matters when CACHE_URL is
+# per process and the change was made in another worker.
+ROLE_CACHE_TIMEOUT = env.int('ROLE_CACHE_TIMEOUT', default=5 * 60)
+
+# Bearer token Prometheus scrapes /metrics with; staff users can always
+# see it. Set PROMETHEUS_MULTIPROC_DIR in the environment to add up the
+# metrics of every worker (see parts_site/metrics.py).
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -214,6 +266,13 @@ DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Media is served by parts_site.media_views behind login. Set MEDIA_SENDFILE to
+# "x-sendfile" (Apache/Caddy) or "x-accel-redirect" (nginx) to let the front-end
+# server do the transfer; for nginx, map MEDIA_ACCEL_PREFIX to MEDIA_ROOT as an
+# internal location.
+MEDIA_SENDFILE = env('MEDIA_SENDFILE', default='')
+MEDIA_ACCEL_PREFIX = env('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
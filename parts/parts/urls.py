@@ -16,7 +16,6 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
-from django.conf.urls.static import static
 from django.conf import settings
 
 from allauth.account.decorators import secure_admin_login
@@ -31,14 +30,9 @@ urlpatterns = [
 ]
 
 # Serve media files (static files are handled by WhiteNoise)
-# Always serve media files, regardless of DEBUG setting
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-else:
-    # In production, use a custom media serving view
-    from django.views.static import serve
-    from django.urls import re_path
-    urlpatterns += [
-        re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    ]
-
+# Media is only available to logged in users, with ETag/Range support
+from django.urls import re_path
+from parts_site import media_views
+urlpatterns += [
+    re_path(r'^media/(?P<path>.*)$', media_views.media, name='media'),
+]
@@ -0,0 +1,51 @@
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Sink:
+    """Write-only file object that hands back whatever zipfile wrote since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_stream(entries):
+    """
+    Yields a ZIP archive of (arcname, path) entries as it is built.
+
+    zipfile writes data descriptors when the output can't seek, so each
+    file is read, compressed and sent in chunks and the whole archive is
+    never held in memory. Missing files are skipped.
+    """
+    sink = _Sink()
+    seen = set()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for arcname, path in entries:
+            # Two revisions can't share a name in the archive
+            if arcname in seen:
+                continue
+            try:
+                source = open(path, "rb")
+            except OSError:
+                continue
+            seen.add(arcname)
+            with source, archive.open(arcname, "w", force_zip64=True) as target:
+                while chunk := source.read(CHUNK_SIZE):
+                    target.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
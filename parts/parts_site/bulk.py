@@ -0,0 +1,40 @@
+from django.db import transaction
+
+from .jobs import assembly_is_onshape_managed, enqueue_parts
+from .models import Part, PartRevision, PartStatus, index_for_search, rollup_assembly_status, schedule_mfg_counts
+from .numbering import allocate_part_numbers, format_part_number
+from .tree_cache import invalidate_project
+
+
+def create_parts(assembly, rows):
+    """
+    Creates a part with an initial revision A for every (name, description) row.
+
+    Numbers come from one contiguous block, parts and revisions are inserted
+    with bulk_create, and the assembly status is rolled up once at the end.
+    Onshape part studios for the whole batch are created by a single job.
+    """
+    project = assembly.project
+    with transaction.atomic():
+        numbers = allocate_part_numbers(assembly, len(rows))
+        parts = Part.objects.bulk_create([
+            Part(assembly=assembly, part_number=format_part_number(project, "P", number), name=name, description=description)
+            for number, (name, description) in zip(numbers, rows)
+        ])
+        revisions = PartRevision.objects.bulk_create([
+            PartRevision(part=part, revision_number='A', status=PartStatus.NEW)
+            for part in parts
+        ])
+        # bulk_create skips the post_save hook that normally sets latest_revision
+        for part, revision in zip(parts, revisions):
+            part.latest_revision = revision
+        Part.objects.bulk_update(parts, ["latest_revision"])
+        rollup_assembly_status(assembly.pk)
+        # ...and the ones that drop the cached part tables and recount the mfg summary
+        invalidate_project(project.pk)
+        schedule_mfg_counts(project.pk)
+        index_for_search([*parts, *revisions])
+
+    if assembly_is_onshape_managed(assembly):
+        enqueue_parts(assembly, parts)
+    return parts
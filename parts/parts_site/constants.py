@@ -3,4 +3,18 @@ import math
 PART_DIGITS = 4
 ASM_INCR = int(math.pow(10, PART_DIGITS-2))
 
-TEAM = "668"
\ No newline at end of file
+TEAM = "668"
+
+# Parts per page on the mfg dashboard tabs
+MFG_PAGE_SIZE = 100
+
+# Rows per infinite-scroll fragment in the project and order listings
+LIST_PAGE_SIZE = 50
+
+# Onshape translation format for batch exports from the mfg queue; flat
+# stock for the laser cutter and router goes out as DXF, everything else STEP
+EXPORT_FORMATS = {
+    "LASER_CUT": "DXF",
+    "ROUTER": "DXF",
+}
+DEFAULT_EXPORT_FORMAT = "STEP"
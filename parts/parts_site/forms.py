@@ -1,9 +1,12 @@
 # import form class from django
 from django import forms
+import csv
+import io
 import os
  
 # import GeeksModel from models.py
 from .models import *
+from .roles import NO_ROLES
  
 # create a ModelForm
 class ProjectForm(forms.ModelForm):
@@ -23,7 +26,7 @@ class AssemblyFormEdit(forms.ModelForm):
     # specify the name of model to use
     class Meta:
         model = Assembly
-        exclude = ["onshape_folder_id", "onshape_document_id", "onshape_element_id"]
+        exclude = ["onshape_folder_id", "onshape_document_id", "onshape_element_id", "onshape_workspace_id", "onshape_step", "last_part_number"]
 
 class SubAssemblyForm(AssemblyForm):
     # specify the name of model to use
@@ -37,6 +40,44 @@ class PartForm(forms.ModelForm):
         model = Part
         fields = ["assembly", "name", "description"]
 
+def clean_part_rows(rows):
+    """Validates (name, description) pairs for bulk part creation."""
+    name_length = Part._meta.get_field("name").max_length
+    description_length = Part._meta.get_field("description").max_length
+    cleaned = []
+    for i, row in enumerate(rows, start=1):
+        name, description = (str(value).strip() for value in (list(row) + ["", ""])[:2])
+        if not name:
+            raise forms.ValidationError(f"Row {i}: name is required")
+        if len(name) > name_length or len(description) > description_length:
+            raise forms.ValidationError(f"Row {i}: name and description must be at most {name_length} characters")
+        cleaned.append((name, description))
+    if not cleaned:
+        raise forms.ValidationError("Add at least one part")
+    return cleaned
+
+class BulkPartForm(forms.Form):
+    parts = forms.CharField(required=False, widget=forms.Textarea(attrs={"rows": 15}),
+                            help_text="One part per line: name, description")
+    csv_file = forms.FileField(required=False, label="CSV File", help_text="Columns: name, description")
+
+    def clean(self):
+        super().clean()
+
+        rows = []
+        if self.cleaned_data.get("parts"):
+            rows.extend(csv.reader(io.StringIO(self.cleaned_data["parts"])))
+        if self.cleaned_data.get("csv_file"):
+            try:
+                text = self.cleaned_data["csv_file"].read().decode("utf-8-sig")
+            except UnicodeDecodeError:
+                raise forms.ValidationError("CSV file must be UTF-8 text")
+            rows.extend(csv.reader(io.StringIO(text)))
+
+        # Skip blank lines
+        self.cleaned_data["rows"] = clean_part_rows([row for row in rows if any(v.strip() for v in row)])
+        return self.cleaned_data
+
 class PartFormEdit(forms.ModelForm):
     # specify the name of model to use
     class Meta:
@@ -50,7 +91,7 @@ class PartRevisionForm(forms.ModelForm):
         fields = ["status", "drawing", "material", "quantity", "mfg_type", "owner", "notes"]
 
     def __init__(self, *args, **kwargs):
-        self.user = kwargs.pop('user', None)
+        self.roles = kwargs.pop('roles', NO_ROLES)
         super().__init__(*args, **kwargs)
 
     def clean_drawing(self):
@@ -76,10 +117,10 @@ class PartRevisionForm(forms.ModelForm):
                 self._errors["mfg_type"] = self.error_class(["Manufacturing method required to advance status"])
 
         if self.cleaned_data.get("status") == PartStatus.DESIGN_REVIEWED:
-            if not self.user.groups.filter(name='mentors').exists():
+            if not self.roles.is_mentor:
                 self._errors["Status"] = self.error_class(["Only a mentor can complete this step"])
         if self.cleaned_data.get("status") in [PartStatus.MFG_REVIEWED, PartStatus.QUALITY_CHECKED] :
-            if not self.user.groups.filter(name='leads').exists():
+            if not self.roles.is_lead:
                 self._errors["Status"] = self.error_class(["Only a lead can complete this step"])
 
         return self.cleaned_data
@@ -91,7 +132,7 @@ class PartRevisionCreateForm(forms.ModelForm):
         fields = ["revision_number", "status", "drawing", "material", "quantity", "mfg_type", "owner", "notes"]
 
     def __init__(self, *args, **kwargs):
-        self.user = kwargs.pop('user', None)
+        self.roles = kwargs.pop('roles', NO_ROLES)
         super().__init__(*args, **kwargs)
 
     def clean_drawing(self):
@@ -117,10 +158,10 @@ class PartRevisionCreateForm(forms.ModelForm):
                 self._errors["mfg_type"] = self.error_class(["Manufacturing method required to advance status"])
 
         if self.cleaned_data.get("status") == PartStatus.DESIGN_REVIEWED:
-            if not self.user.groups.filter(name='mentors').exists():
+            if not self.roles.is_mentor:
                 self._errors["Status"] = self.error_class(["Only a mentor can complete this step"])
         if self.cleaned_data.get("status") in [PartStatus.MFG_REVIEWED, PartStatus.QUALITY_CHECKED] :
-            if not self.user.groups.filter(name='leads').exists():
+            if not self.roles.is_lead:
                 self._errors["Status"] = self.error_class(["Only a lead can complete this step"])
 
         return self.cleaned_data
@@ -142,10 +183,7 @@ class OrderFormEdit(forms.ModelForm):
         # Pre-fill tax if 0.0 and status is NEW or READY (before PLACED)
         # Requirement: "Pre-fill the Sales Tax field with a value equal to 10% of the subtotal"
         if self.instance.pk and (self.instance.tax == 0.0 or self.instance.tax is None):
-            subtotal = 0
-            for item in self.instance.item_set.all():
-                subtotal += item.unit_price * item.quantity
-            self.initial['tax'] = round(subtotal * 0.10, 2)
+            self.initial['tax'] = round(self.instance.item_subtotal() * 0.10, 2)
 
     def clean(self):
         super().clean()
@@ -166,13 +204,13 @@ class OrderFormEdit(forms.ModelForm):
 
     def save(self, commit=True):
         instance = super().save(commit=False)
-        subtotal = 0
-        if instance.pk:
-             for item in instance.item_set.all():
-                subtotal += item.unit_price * item.quantity
-        
+        if commit and instance.pk:
+            # Saves the order with a total taken under its row lock
+            instance.update_total(save=True)
+            return instance
+
+        subtotal = instance.item_subtotal() if instance.pk else 0
         instance.order_total = subtotal + (instance.tax or 0) + (instance.shipping or 0)
-        
         if commit:
             instance.save()
         return instance
\ No newline at end of file
@@ -0,0 +1,489 @@
+"""
+Database-backed job queue for Onshape provisioning.
+
+Views enqueue an OnshapeJob and return straight away; the run_onshape_jobs
+management command claims pending jobs and runs them. Handlers save the
+Onshape ids and onshape_step on the Assembly/Part row after every remote
+call, so a job that fails part way resumes from the failed step on its next
+attempt instead of creating a second folder or document.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Assembly, ExportBatch, JobKind, JobStatus, OnshapeJob, OnshapeStep, Part, StepExport, SubAssembly, TranslationState
+from .onshape import OnshapeClient
+from .tree_cache import invalidate_project
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30  # seconds, doubled after every failed attempt
+DEFER_DELAY = 5  # seconds to wait for a parent that is still being provisioned
+POLL_DELAY = 5  # seconds before the first translation status poll, doubled after each poll
+MAX_POLL_DELAY = 300
+TRANSLATION_TIMEOUT = timedelta(hours=1)
+HEARTBEAT = timedelta(minutes=1)  # how often a running job's locked_at is refreshed
+STALE_LOCK = timedelta(minutes=10)  # RUNNING jobs not refreshed for this long belonged to a dead worker
+
+DEFAULT_ELEMENTS = {("Part Studio 1", "PARTSTUDIO"), ("Assembly 1", "ASSEMBLY")}
+ACTIVE_STATUSES = [JobStatus.PENDING, JobStatus.RUNNING]
+
+
+class ProvisioningError(Exception):
+    """An Onshape call failed; the job is retried with backoff."""
+
+
+class JobDeferred(Exception):
+    """The parent object is still being provisioned (or Onshape is still working); try again shortly."""
+
+    def __init__(self, message, delay=None):
+        super().__init__(message)
+        self.delay = delay
+
+
+def enqueue_assembly(assembly, top_level=False):
+    """Queues creation of the folder, document and assembly tab for an assembly."""
+    job = OnshapeJob.objects.create(kind=JobKind.ASSEMBLY, assembly=assembly, payload={"top_level": top_level})
+    _mark_queued(assembly)
+    logger.info(f"Queued Onshape provisioning job {job.pk} for assembly {assembly.part_number}")
+    return job
+
+
+def enqueue_part(part):
+    """Queues creation of the part studio and initial version for a part."""
+    job = OnshapeJob.objects.create(kind=JobKind.PART, part=part)
+    _mark_queued(part)
+    logger.info(f"Queued Onshape provisioning job {job.pk} for part {part.part_number}")
+    return job
+
+
+def enqueue_parts(assembly, parts):
+    """Queues one job creating part studios for a batch of parts and a single version."""
+    part_ids = [part.pk for part in parts]
+    job = OnshapeJob.objects.create(kind=JobKind.BULK_PARTS, assembly=assembly, payload={"part_ids": part_ids})
+    Part.objects.filter(pk__in=part_ids, onshape_step=OnshapeStep.NONE).update(onshape_step=OnshapeStep.QUEUED)
+    logger.info(f"Queued Onshape provisioning job {job.pk} for {len(part_ids)} parts in {assembly.part_number}")
+    return job
+
+
+def enqueue_version(revision):
+    """Queues an Onshape version of the part's document for a new revision."""
+    part = revision.part
+    job = OnshapeJob.objects.create(kind=JobKind.VERSION, part=part, payload={
+        "name": f"Rev {revision.revision_number} - {part.name}",
+        "description": f"Revision {revision.revision_number} for {part.part_number}",
+    })
+    logger.info(f"Queued Onshape version job {job.pk} for {part.part_number} rev {revision.revision_number}")
+    return job
+
+
+def enqueue_step_export(export, delay=POLL_DELAY):
+    """
+    Queues the download of a STEP translation. The job polls the translation
+    with backoff until it finishes; the Onshape webhook just makes it run now.
+    """
+    job = OnshapeJob.objects.create(kind=JobKind.STEP_EXPORT, payload={"export_id": export.pk},
+                                    run_after=timezone.now() + timedelta(seconds=delay))
+    logger.info(f"Queued STEP download job {job.pk} for translation {export.translation_id}")
+    return job
+
+
+def enqueue_export_batch(batch, parts):
+    """Queues the translations for a batch export of parts."""
+    job = OnshapeJob.objects.create(kind=JobKind.EXPORT_BATCH, payload={"batch_id": batch.pk, "part_ids": [part.pk for part in parts]})
+    logger.info(f"Queued batch export job {job.pk} for {len(parts)} parts")
+    return job
+
+
+def step_export_finished(translation_id):
+    """Webhook hook: runs the pending download job for a translation straight away."""
+    export = StepExport.objects.filter(translation_id=translation_id, state=TranslationState.ACTIVE).first()
+    if export is None:
+        return None
+    pulled = OnshapeJob.objects.filter(
+        kind=JobKind.STEP_EXPORT, status=JobStatus.PENDING, payload__export_id=export.pk
+    ).update(run_after=timezone.now())
+    if not pulled and not _has_active_job(kind=JobKind.STEP_EXPORT, payload__export_id=export.pk):
+        enqueue_step_export(export, delay=0)
+    return export
+
+
+def _mark_queued(obj):
+    if obj.onshape_step == OnshapeStep.NONE:
+        obj.onshape_step = OnshapeStep.QUEUED
+        type(obj).objects.filter(pk=obj.pk).update(onshape_step=OnshapeStep.QUEUED)
+
+
+def project_is_onshape_managed(project):
+    """True once the project has a folder or its top level assembly is queued for one."""
+    if project.onshape_folder_id:
+        return True
+    return (
+        Assembly.objects.filter(project=project, subassembly__isnull=True)
+        .exclude(onshape_step=OnshapeStep.NONE)
+        .exists()
+    )
+
+
+def assembly_is_onshape_managed(assembly):
+    """True when parts of the assembly can get part studios: it has a document, or one is being created."""
+    if assembly.onshape_document_id:
+        return True
+    return (
+        assembly.onshape_step != OnshapeStep.NONE
+        and _has_active_job(assembly=assembly, kind=JobKind.ASSEMBLY)
+    )
+
+
+def assembly_has_onshape_folder(assembly):
+    """True when sub-assemblies can get folders inside the assembly: it has a folder, or one is being created."""
+    if assembly.onshape_folder_id:
+        return True
+    return (
+        assembly.onshape_step != OnshapeStep.NONE
+        and _has_active_job(assembly=assembly, kind=JobKind.ASSEMBLY)
+    )
+
+
+def _has_active_job(**filters):
+    return OnshapeJob.objects.filter(status__in=ACTIVE_STATUSES, **filters).exists()
+
+
+def _require(result, step):
+    if not result:
+        raise ProvisioningError(f"Onshape call failed: {step}")
+    return result
+
+
+def _advance(obj, step, *fields):
+    obj.onshape_step = step
+    obj.save(update_fields=["onshape_step", *fields])
+
+
+def _parent_folder_id(assembly):
+    """Folder a new assembly's folder is created in, deferring while the parent is pending."""
+    try:
+        parent = assembly.subassembly.assembly
+    except SubAssembly.DoesNotExist:
+        project = assembly.project
+        if project.onshape_folder_id:
+            return project.onshape_folder_id
+        if _has_active_job(assembly__project=project, kind=JobKind.ASSEMBLY, payload__top_level=True):
+            raise JobDeferred(f"Project {project.name} folder is still being created")
+        raise ProvisioningError(f"Project {project.name} has no Onshape folder")
+
+    if parent.onshape_folder_id:
+        return parent.onshape_folder_id
+    if _has_active_job(assembly=parent, kind=JobKind.ASSEMBLY):
+        raise JobDeferred(f"Parent assembly {parent.part_number} is still being provisioned")
+    raise ProvisioningError(f"Parent assembly {parent.part_number} has no Onshape folder")
+
+
+def provision_assembly(job, client):
+    assembly = Assembly.objects.select_related("project").get(pk=job.assembly_id)
+
+    # 1. Folder. The top level assembly lives directly in the project folder.
+    if assembly.onshape_step < OnshapeStep.FOLDER:
+        if job.payload.get("top_level"):
+            project = assembly.project
+            if not project.onshape_folder_id:
+                folder = _require(client.create_folder(project.name), "create project folder")
+                project.onshape_folder_id = folder["id"]
+                project.save(update_fields=["onshape_folder_id"])
+            assembly.onshape_folder_id = project.onshape_folder_id
+        else:
+            parent_folder_id = _parent_folder_id(assembly)
+            folder = _require(client.create_folder(assembly.part_number, parent_id=parent_folder_id), "create folder")
+            assembly.onshape_folder_id = folder["id"]
+        _advance(assembly, OnshapeStep.FOLDER, "onshape_folder_id")
+
+    # 2. Document in the folder
+    if assembly.onshape_step < OnshapeStep.DOCUMENT:
+        doc = _require(client.create_document(assembly.part_number, folder_id=assembly.onshape_folder_id), "create document")
+        assembly.onshape_document_id = doc["id"]
+        _advance(assembly, OnshapeStep.DOCUMENT, "onshape_document_id")
+
+    # 3. Assembly tab, listing the elements alongside it
+    # 4. Delete default elements (Part Studio 1 and Assembly 1)
+    if assembly.onshape_step < OnshapeStep.DONE:
+        doc_id = assembly.onshape_document_id
+        workspace_id = _require(assembly.get_onshape_workspace_id(client), "get workspace")
+        calls = [(client.get_elements, doc_id, workspace_id)]
+        if assembly.onshape_step < OnshapeStep.ELEMENT:
+            calls.append((client.create_assembly, doc_id, workspace_id, assembly.part_number))
+        elements, *assembly_tab = client.run_batch(calls)
+
+        if assembly_tab:
+            assembly.onshape_element_id = _require(assembly_tab[0], "create assembly tab")["id"]
+            _advance(assembly, OnshapeStep.ELEMENT, "onshape_element_id")
+
+        defaults = [e for e in elements or [] if (e.get("name"), e.get("elementType")) in DEFAULT_ELEMENTS]
+        for e in defaults:
+            logger.info(f"Deleting default element: {e.get('name')} ({e.get('id')})")
+        client.run_batch((client.delete_element, doc_id, workspace_id, e["id"]) for e in defaults)
+        _advance(assembly, OnshapeStep.DONE)
+
+
+def provision_part(job, client):
+    part = Part.objects.select_related("assembly").get(pk=job.part_id)
+    assembly = part.assembly
+
+    if not assembly.onshape_document_id:
+        if _has_active_job(assembly=assembly, kind=JobKind.ASSEMBLY):
+            raise JobDeferred(f"Assembly {assembly.part_number} is still being provisioned")
+        raise ProvisioningError(f"Assembly {assembly.part_number} has no Onshape document")
+
+    # 1. Part studio in the assembly's document
+    if part.onshape_step < OnshapeStep.ELEMENT:
+        part_studio = _require(assembly.with_onshape_workspace(
+            client, lambda workspace_id: client.create_part_studio(assembly.onshape_document_id, workspace_id, part.part_number)
+        ), "create part studio")
+        part.onshape_element_id = part_studio["id"]
+        _advance(part, OnshapeStep.ELEMENT, "onshape_element_id")
+
+    # 2. Version for the initial revision
+    if part.onshape_step < OnshapeStep.DONE:
+        _require(client.create_version(assembly.onshape_document_id, f"Rev A - {part.name}", description=f"Initial revision for {part.part_number}"), "create version")
+        _advance(part, OnshapeStep.DONE)
+
+
+def provision_parts(job, client):
+    assembly = Assembly.objects.get(pk=job.assembly_id)
+    doc_id = assembly.onshape_document_id
+    part_ids = job.payload.get("part_ids", [])
+
+    if not doc_id:
+        if _has_active_job(assembly=assembly, kind=JobKind.ASSEMBLY):
+            raise JobDeferred(f"Assembly {assembly.part_number} is still being provisioned")
+        raise ProvisioningError(f"Assembly {assembly.part_number} has no Onshape document")
+
+    # 1. Part studios, created concurrently. Parts that got one on an earlier attempt are skipped.
+    parts = list(Part.objects.filter(pk__in=part_ids, onshape_step__lt=OnshapeStep.ELEMENT).order_by("id"))
+    if parts:
+        workspace_id = _require(assembly.get_onshape_workspace_id(client), "get workspace")
+        results = client.run_batch((client.create_part_studio, doc_id, workspace_id, part.part_number) for part in parts)
+        created = []
+        for part, part_studio in zip(parts, results):
+            if part_studio:
+                part.onshape_element_id = part_studio["id"]
+                part.onshape_step = OnshapeStep.ELEMENT
+                created.append(part)
+        Part.objects.bulk_update(created, ["onshape_element_id", "onshape_step"])
+        invalidate_project(assembly.project_id)
+        if len(created) < len(parts):
+            raise ProvisioningError(f"create part studio failed for {len(parts) - len(created)} part(s)")
+
+    # 2. One version covering the whole batch
+    pending_version = Part.objects.filter(pk__in=part_ids, onshape_step=OnshapeStep.ELEMENT)
+    if pending_version.exists():
+        _require(client.create_version(doc_id, f"Rev A - {len(part_ids)} imported parts", description=f"Initial revision for {len(part_ids)} imported parts"), "create version")
+        pending_version.update(onshape_step=OnshapeStep.DONE)
+
+
+def create_revision_version(job, client):
+    assembly = Assembly.objects.get(part=job.part_id)
+    if not assembly.onshape_document_id:
+        if _has_active_job(assembly=assembly, kind=JobKind.ASSEMBLY):
+            raise JobDeferred(f"Assembly {assembly.part_number} is still being provisioned")
+        raise ProvisioningError(f"Assembly {assembly.part_number} has no Onshape document")
+    _require(client.create_version(assembly.onshape_document_id, job.payload["name"], description=job.payload["description"]), "create version")
+
+
+def download_step_export(job, client):
+    export = StepExport.objects.select_related("revision__part__assembly").get(pk=job.payload["export_id"])
+    if export.state != TranslationState.ACTIVE:
+        return
+
+    status = _require(client.get_translation_status(export.translation_id), "get translation status")
+    state = status.get("requestState")
+    if state == TranslationState.ACTIVE:
+        if timezone.now() - export.created_at > TRANSLATION_TIMEOUT:
+            export.state = TranslationState.FAILED
+            export.last_error = "Timed out waiting for Onshape"
+            export.save(update_fields=["state", "last_error", "updated_at"])
+            return
+        export.polls += 1
+        export.save(update_fields=["polls", "updated_at"])
+        raise JobDeferred(f"Translation {export.translation_id} still running",
+                          delay=min(MAX_POLL_DELAY, POLL_DELAY * 2 ** export.polls))
+    if state != TranslationState.DONE:
+        export.state = TranslationState.FAILED
+        export.last_error = status.get("failureReason") or f"Translation ended in state {state}"
+        export.save(update_fields=["state", "last_error", "updated_at"])
+        return
+
+    revision = export.revision
+    document_id = status.get("documentId") or revision.part.assembly.onshape_document_id
+    data_id = status["resultExternalDataIds"][0]
+    content = _require(client.download_external_data(document_id, data_id), "download translation")
+    export.file.save(f"{revision.part.part_number}-{revision.revision_number}.{export.format.lower()}", ContentFile(content), save=False)
+    export.state = TranslationState.DONE
+    export.last_error = ""
+    export.save()
+    logger.info(f"Stored STEP export {export.file.name} for {revision}")
+
+
+def start_export_batch(job, client):
+    batch = ExportBatch.objects.get(pk=job.payload["batch_id"])
+    parts = Part.objects.filter(pk__in=job.payload["part_ids"]).select_related("assembly", "latest_revision").order_by("id")
+
+    # Reuse finished or running exports of unchanged revisions, including the
+    # ones this job started before a failed attempt
+    to_start = []
+    for part in parts:
+        existing = StepExport.current_for(part.latest_revision, batch.format).first()
+        if existing:
+            batch.exports.add(existing)
+        else:
+            to_start.append(part)
+    if not to_start:
+        return
+
+    calls = []
+    for part in to_start:
+        workspace_id = _require(part.assembly.get_onshape_workspace_id(client), f"get workspace for {part.part_number}")
+        calls.append((client.create_part_studio_export, part.assembly.onshape_document_id, workspace_id, part.onshape_element_id, batch.format))
+    # At most ONSHAPE_BATCH_WORKERS translations are requested at once
+    results = client.run_batch(calls)
+
+    failed = []
+    for part, result in zip(to_start, results):
+        if result and "id" in result:
+            revision = part.latest_revision
+            export = StepExport.objects.create(revision=revision, translation_id=result["id"], format=batch.format,
+                                               revision_updated_at=revision.updated_at)
+            enqueue_step_export(export)
+            batch.exports.add(export)
+        else:
+            failed.append(part.part_number)
+    if failed:
+        raise ProvisioningError(f"Starting the export failed for {', '.join(failed)}")
+
+
+HANDLERS = {
+    JobKind.ASSEMBLY: provision_assembly,
+    JobKind.PART: provision_part,
+    JobKind.BULK_PARTS: provision_parts,
+    JobKind.VERSION: create_revision_version,
+    JobKind.STEP_EXPORT: download_step_export,
+    JobKind.EXPORT_BATCH: start_export_batch,
+}
+
+
+def claim_job():
+    """Locks the next runnable job and marks it RUNNING, or returns None."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            OnshapeJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.PENDING, run_after__lte=now)
+                | Q(status=JobStatus.RUNNING, locked_at__lt=now - STALE_LOCK)
+            )
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = JobStatus.RUNNING
+        job.locked_at = now
+        job.save(update_fields=["status", "locked_at", "updated_at"])
+    return job
+
+
+class _Heartbeat:
+    """
+    Refreshes a running job's locked_at from a background thread.
+
+    Handlers can run longer than STALE_LOCK (a large batch, or a slow
+    download), and without this another worker would reclaim the job and run
+    it a second time. locked_at doubles as the owner's token: a refresh only
+    applies while it still matches what this worker last wrote.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"job-{job.pk}-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT.total_seconds()):
+                if not self.beat():
+                    break
+        finally:
+            connections.close_all()
+
+    def beat(self):
+        """Moves locked_at forward; returns False once another worker holds the job."""
+        now = timezone.now()
+        try:
+            owned = OnshapeJob.objects.filter(pk=self.job.pk, status=JobStatus.RUNNING, locked_at=self.job.locked_at).update(locked_at=now)
+        except DatabaseError as e:
+            logger.warning(f"Could not refresh the lock on job {self.job.pk}: {e}")
+            return True
+        if owned:
+            self.job.locked_at = now
+        return bool(owned)
+
+
+def run_job(job, client=None):
+    fields = {"locked_at": None, "updated_at": timezone.now()}
+    try:
+        with _Heartbeat(job):
+            HANDLERS[job.kind](job, client or OnshapeClient())
+    except JobDeferred as e:
+        logger.info(f"Deferring job {job.pk}: {e}")
+        fields.update(status=JobStatus.PENDING, last_error=str(e), run_after=timezone.now() + timedelta(seconds=e.delay or DEFER_DELAY))
+    except Exception as e:
+        attempts = job.attempts + 1
+        logger.error(f"Onshape job {job.pk} failed (attempt {attempts}/{MAX_ATTEMPTS}): {e}", exc_info=True)
+        fields.update(attempts=attempts, last_error=str(e))
+        if attempts >= MAX_ATTEMPTS:
+            fields["status"] = JobStatus.FAILED
+        else:
+            fields.update(status=JobStatus.PENDING, run_after=timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (attempts - 1)))
+    else:
+        fields.update(status=JobStatus.DONE, last_error="")
+
+    # Queryset update so a job whose target was deleted mid-run isn't
+    # re-inserted, and one another worker has reclaimed keeps its state
+    if not OnshapeJob.objects.filter(pk=job.pk, locked_at=job.locked_at).update(**fields):
+        logger.warning(f"Onshape job {job.pk} is no longer held by this worker; dropping its result")
+        return job
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return job
+
+
+def run_pending(limit=None, client=None):
+    """Runs runnable jobs until the queue is empty (or limit is hit); returns how many ran."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job, client)
+        count += 1
+    return count
+
+
+def retry_failed():
+    """Puts every FAILED job back in the queue; returns how many were requeued."""
+    return OnshapeJob.objects.filter(status=JobStatus.FAILED).update(
+        status=JobStatus.PENDING, attempts=0, run_after=timezone.now()
+    )
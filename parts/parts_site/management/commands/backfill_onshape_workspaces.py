@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from parts_site.models import Assembly
+from parts_site.onshape import OnshapeClient
+
+
+class Command(BaseCommand):
+    help = 'Store the default Onshape workspace id on assemblies that have a document but no workspace'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Refetch the workspace id for every linked assembly, not just missing ones'
+        )
+
+    def handle(self, *args, **options):
+        assemblies = Assembly.objects.filter(onshape_document_id__isnull=False)
+        if not options['refresh']:
+            assemblies = assemblies.filter(onshape_workspace_id__isnull=True)
+
+        client = OnshapeClient()
+        updated = 0
+        for assembly in assemblies:
+            workspace_id = assembly.get_onshape_workspace_id(client, refresh=True)
+            if workspace_id:
+                updated += 1
+            else:
+                self.stdout.write(
+                    self.style.WARNING(f'Could not fetch the workspace of {assembly.part_number} ({assembly.onshape_document_id}), left as is')
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored workspace ids for {updated} assemblies')
+        )
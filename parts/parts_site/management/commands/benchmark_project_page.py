@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+import statistics
+import time
+
+from parts_site.models import Project
+from parts_site.tree_cache import invalidate_project
+
+
+class Command(BaseCommand):
+    help = 'Time requests to a project page with fresh vs persistent database connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'project_id',
+            nargs='?',
+            type=int,
+            help='Project to load (defaults to the first project)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Requests per run'
+        )
+        parser.add_argument(
+            '--username',
+            help='User to log in as (defaults to the first superuser)'
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help="Drop this project's cached part tables before every request, so each one runs the tree queries"
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('No user to log in as; pass --username')
+
+        project = Project.objects.filter(pk=options['project_id']) if options['project_id'] else Project.objects.order_by('id')
+        project = project.first()
+        if project is None:
+            raise CommandError('No project to load')
+
+        client = Client()
+        client.force_login(user)
+        url = reverse('project', args=(project.id,))
+        configured = connection.settings_dict['CONN_MAX_AGE']
+
+        self.stdout.write(f'{options["requests"]} requests to {url} ({project.name}) as {user.username}')
+        runs = [('new connection per request', 0), (f'CONN_MAX_AGE={configured}', configured)]
+        if configured == 0:
+            runs[1] = ('persistent (CONN_MAX_AGE=None)', None)
+
+        try:
+            for label, max_age in runs:
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                timings, connects = self.time_requests(client, project, url, options['requests'], options['cold'])
+                self.stdout.write(
+                    f'{label:<32} median {statistics.median(timings):7.2f} ms   '
+                    f'p95 {self.percentile(timings, 95):7.2f} ms   '
+                    f'mean {statistics.mean(timings):7.2f} ms   '
+                    f'{connects} connections'
+                )
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = configured
+
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def time_requests(self, client, project, url, count, cold):
+        # One warm-up request so both runs start with compiled templates
+        client.get(url)
+        close_old_connections()
+        connects = 0
+
+        def count_connect(**kwargs):
+            nonlocal connects
+            connects += 1
+
+        timings = []
+        connection_created.connect(count_connect)
+        try:
+            for _ in range(count):
+                if cold:
+                    # Only this project's fragments; the cache is shared with the site
+                    invalidate_project(project.pk)
+                start = time.perf_counter()
+                # The test client disconnects Django's request_started and
+                # request_finished handlers, so close connections the way
+                # they would or every request shares the first connection
+                close_old_connections()
+                response = client.get(url)
+                close_old_connections()
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} returned {response.status_code}')
+        finally:
+            connection_created.disconnect(count_connect)
+        return timings, connects
+
+    def percentile(self, timings, pct):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,145 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+import re
+
+from parts_site.constants import LIST_PAGE_SIZE, MFG_PAGE_SIZE
+from parts_site.media_views import drawing_parts
+from parts_site.mfg_views import filter_parts
+from parts_site.models import (
+    Assembly,
+    MfgTypes,
+    Order,
+    OrderStatus,
+    Part,
+    PartRevision,
+    PartStatus,
+    Project,
+)
+from parts_site.order_views import ORDER_TABS
+from parts_site.pagination import keyset_queryset
+
+# SQLite: "SEARCH t USING INDEX name (...)"; Postgres: "Index Scan using name on t", "Bitmap Index Scan on name"
+INDEX_PATTERN = re.compile(r'USING (?:COVERING )?INDEX (\w+)|Index (?:Only )?Scan (?:Backward )?using (\w+)|Bitmap Index Scan on (\w+)')
+
+MFG_FILTERS = ['todo', 'complete', MfgTypes.LASER_CUT]
+
+
+def hot_queries():
+    """
+    (label, queryset) for the queries the order, mfg and drawing views run,
+    built by the same functions the views use. The project is the newest one,
+    which is the seed unless --no-seed is given.
+    """
+    project = Project.objects.order_by('-id').first()
+    part = Part.objects.order_by('id').first()
+    assembly = Assembly.objects.order_by('-id').first()
+    order = Order.objects.order_by('-id').first()
+    queries = [
+        (f'orders tab {tab}', keyset_queryset(Order.objects.filter(status=status), ordering)[:LIST_PAGE_SIZE + 1])
+        for tab, (status, ordering) in ORDER_TABS.items()
+    ]
+    queries += [
+        (f'mfg filter {filter}', filter_parts(project, filter)[:MFG_PAGE_SIZE])
+        for filter in MFG_FILTERS
+    ]
+    return queries + [
+        ('project drawings zip', drawing_parts(Part.objects.filter(assembly__project=project))),
+        ('mfg drawings zip', drawing_parts(filter_parts(project, 'todo'))),
+        ('open order for vendor', Order.objects.filter(status=OrderStatus.NEW, vendor=order.vendor if order else '')),
+        ('latest revision of part', PartRevision.objects.filter(part=part).order_by('-revision_number')[:1]),
+        ('assembly by part number', Assembly.objects.filter(part_number=assembly.part_number if assembly else '')),
+        ('part by part number', Part.objects.filter(part_number=part.part_number if part else '')),
+    ]
+
+
+def indexes_used(plan):
+    return sorted({name for match in INDEX_PATTERN.finditer(plan) for name in match.groups() if name})
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot view queries against a seeded dataset and report which indexes they use'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--parts',
+            type=int,
+            default=5000,
+            help='Parts to seed (with a matching number of orders); the seed is rolled back afterwards'
+        )
+        parser.add_argument(
+            '--no-seed',
+            action='store_true',
+            help='Explain against the existing data instead of seeding'
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full plan for every query'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Exit with an error if any query does not use an index'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options['no_seed']:
+                self.seed(options['parts'])
+            # Fresh planner statistics, so the plans reflect the seeded row counts
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            missing = []
+            for label, queryset in hot_queries():
+                plan = queryset.explain()
+                used = indexes_used(plan)
+                if used:
+                    self.stdout.write(f'{label:<28} {", ".join(used)}')
+                else:
+                    missing.append(label)
+                    self.stdout.write(self.style.WARNING(f'{label:<28} NO INDEX'))
+                if options['verbose_plans']:
+                    self.stdout.write(f'    {plan}'.replace('\n', '\n    '))
+
+            transaction.set_rollback(True)
+
+        if missing and options['strict']:
+            raise CommandError(f'No index used by: {", ".join(missing)}')
+        self.stdout.write(self.style.SUCCESS(f'{len(missing)} quer{"y" if len(missing) == 1 else "ies"} without an index'))
+
+    def seed(self, count):
+        """Bulk-creates a project of count parts spread over assemblies, statuses and mfg types, plus orders."""
+        project = Project.objects.create(name='EXPLAIN seed', description='', prefix='EXP')
+        assemblies = Assembly.objects.bulk_create(
+            Assembly(project=project, part_number=f'668-EXP-A-{n:04d}', name=f'Assembly {n}', description='')
+            for n in range(max(1, count // 50))
+        )
+        parts = Part.objects.bulk_create(
+            Part(assembly=assemblies[n % len(assemblies)], part_number=f'668-EXP-P-{n:05d}', name=f'Part {n}', description='')
+            for n in range(count)
+        )
+        statuses = list(PartStatus)
+        mfg_types = list(MfgTypes)
+        revisions = PartRevision.objects.bulk_create(
+            PartRevision(
+                part=part,
+                revision_number=revision,
+                status=statuses[(n + i) % len(statuses)],
+                mfg_type=mfg_types[n % len(mfg_types)],
+                drawing=f'drawings/seed-{n}-{revision}.pdf' if n % 3 else '',
+            )
+            for n, part in enumerate(parts)
+            for i, revision in enumerate('AB'[:1 + n % 2])
+        )
+        # bulk_create skips the hook that sets latest_revision, which the mfg filters join on
+        latest = {revision.part_id: revision for revision in revisions}
+        for part in parts:
+            part.latest_revision = latest[part.pk]
+        Part.objects.bulk_update(parts, ['latest_revision'], batch_size=1000)
+        order_statuses = list(OrderStatus)
+        Order.objects.bulk_create(
+            Order(vendor=f'Vendor {n % 40}', status=order_statuses[n % len(order_statuses)])
+            for n in range(count)
+        )
+        self.stdout.write(f'Seeded {count} parts and {count} orders')
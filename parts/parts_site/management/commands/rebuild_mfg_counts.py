@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from parts_site.models import Project, refresh_mfg_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount the manufacturing summary for every project (or the given ones)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'project_ids',
+            nargs='*',
+            type=int,
+            help='Projects to recount (defaults to all)'
+        )
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by('id')
+        if options['project_ids']:
+            projects = projects.filter(pk__in=options['project_ids'])
+
+        count = 0
+        for project_id in projects.values_list('id', flat=True):
+            refresh_mfg_counts(project_id)
+            count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Recounted {count} project(s)')
+        )
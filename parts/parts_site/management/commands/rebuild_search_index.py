@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from parts_site.models import Assembly, Item, Part, PartRevision, SearchEntry, index_for_search
+from parts_site.search import FTS_TABLE
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index from every part, assembly, revision and order item'
+
+    def handle(self, *args, **options):
+        sources = [
+            Assembly.objects.all(),
+            Part.objects.select_related('assembly'),
+            PartRevision.objects.select_related('part__assembly'),
+            Item.objects.all(),
+        ]
+        count = 0
+        with transaction.atomic():
+            SearchEntry.objects.all().delete()
+            for queryset in sources:
+                batch = []
+                for instance in queryset.iterator(chunk_size=BATCH_SIZE):
+                    batch.append(instance)
+                    if len(batch) == BATCH_SIZE:
+                        index_for_search(batch)
+                        count += len(batch)
+                        batch = []
+                index_for_search(batch)
+                count += len(batch)
+
+            if connection.vendor == 'sqlite':
+                # Resyncs the FTS5 table with its content table in case the triggers were lost
+                with connection.cursor() as cursor:
+                    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {count} object(s)')
+        )
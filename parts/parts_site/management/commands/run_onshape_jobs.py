@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+import time
+
+from parts_site.jobs import retry_failed, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued Onshape provisioning jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling forever'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the queue is empty'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Requeue failed jobs before starting'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = retry_failed()
+            self.stdout.write(
+                self.style.SUCCESS(f'Requeued {requeued} failed job(s)')
+            )
+
+        if options['once']:
+            ran = run_pending()
+            self.stdout.write(
+                self.style.SUCCESS(f'Ran {ran} job(s)')
+            )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS('Waiting for Onshape jobs...')
+        )
+        while True:
+            if not run_pending():
+                time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+import time
+
+from parts_site.models import JobStatus, SlackMessage
+from parts_site.notifications import BATCH_SIZE, send_pending
+
+
+class Command(BaseCommand):
+    help = 'Send queued Slack notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit instead of polling forever'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep when the outbox is empty'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Messages claimed per batch'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Requeue failed messages before starting'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = SlackMessage.objects.filter(status=JobStatus.FAILED).update(status=JobStatus.PENDING, attempts=0)
+            self.stdout.write(
+                self.style.SUCCESS(f'Requeued {requeued} failed message(s)')
+            )
+
+        if options['once']:
+            sent = send_pending(options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Processed {sent} message(s)')
+            )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS('Waiting for Slack messages...')
+        )
+        while True:
+            if not send_pending(options['batch_size']):
+                time.sleep(options['interval'])
@@ -0,0 +1,233 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+import mimetypes
+import os
+import re
+import urllib.parse
+
+from .archive import zip_stream
+from .mfg_views import filter_parts
+from .models import *
+from .project_tree import assembly_subtree_ids
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _parse_range(header, size):
+    """
+    Returns the inclusive (start, end) of a single byte range, or None when
+    the header should be ignored and the whole file sent (missing, malformed
+    or multi-range requests). Raises RangeNotSatisfiable for ranges past EOF.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start >= size:
+            raise RangeNotSatisfiable()
+        return start, min(end, size - 1)
+    suffix = int(last)
+    if suffix == 0 or size == 0:
+        raise RangeNotSatisfiable()
+    return max(size - suffix, 0), size - 1
+
+
+def _range_matches(request, etag, last_modified):
+    """If-Range: only honour the Range header if the client's copy is still current."""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def _aiter(iterator):
+    # Advance on the request's sync thread (ASGIHandler gives each request its
+    # own), so iterators that read the database use the view's connection
+    while (chunk := await sync_to_async(next)(iterator, None)) is not None:
+        yield chunk
+
+
+def _stream(request, iterator):
+    # Under ASGI Django reads a sync iterator into memory before sending it,
+    # so give the server an async one and large downloads still stream
+    if isinstance(request, ASGIRequest):
+        return _aiter(iterator)
+    return iterator
+
+
+def stream_zip(request, entries, filename):
+    """
+    Streams a ZIP of (arcname, path) entries as an attachment.
+
+    entries is consumed as the archive is written, so a queryset .iterator()
+    is fetched in chunks rather than loaded before the first byte goes out.
+    """
+    response = StreamingHttpResponse(_stream(request, zip_stream(entries)), content_type="application/zip")
+    response["Content-Disposition"] = f"attachment; filename*=UTF-8''{urllib.parse.quote(filename)}"
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def serve_file(request, path, name, download_name=None):
+    """
+    Streams a file from MEDIA_ROOT with a strong ETag, conditional GET and
+    single-range support. With MEDIA_SENDFILE set, the transfer is handed to
+    the front-end server via X-Sendfile / X-Accel-Redirect instead.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("File not found")
+
+    etag = quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    sendfile = settings.MEDIA_SENDFILE
+
+    if sendfile:
+        response = HttpResponse(content_type=content_type)
+        if sendfile == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + urllib.parse.quote(name)
+        else:
+            response["X-Sendfile"] = path
+    else:
+        byte_range = None
+        if _range_matches(request, etag, last_modified):
+            try:
+                byte_range = _parse_range(request.META.get("HTTP_RANGE"), stat.st_size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{stat.st_size}"
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_stream(request, _iter_file(path, start, end - start + 1)), status=206, content_type=content_type)
+            response["Content-Length"] = str(end - start + 1)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        elif isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(_stream(request, _iter_file(path, 0, stat.st_size)), content_type=content_type)
+            response["Content-Length"] = str(stat.st_size)
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+            response["Content-Length"] = str(stat.st_size)
+
+    if download_name:
+        response["Content-Disposition"] = f"inline; filename*=UTF-8''{urllib.parse.quote(download_name)}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Drawings are private; make browsers revalidate (and get a 304) on every open
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def drawing(request, revision_id):
+    revision = get_object_or_404(PartRevision.objects.select_related("part"), pk=revision_id)
+    if not revision.drawing:
+        raise Http404("Revision has no drawing")
+    extension = os.path.splitext(revision.drawing.name)[1]
+    download_name = f"{revision.part.part_number}-{revision.revision_number}{extension}"
+    return serve_file(request, revision.drawing.path, revision.drawing.name, download_name)
+
+
+@login_required
+def media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found")
+    return serve_file(request, full_path, path)
+
+
+@login_required
+def step_export(request, export_id):
+    export = get_object_or_404(StepExport, pk=export_id, state=TranslationState.DONE)
+    return serve_file(request, export.file.path, export.file.name, os.path.basename(export.file.name))
+
+
+@login_required
+def export_batch_zip(request, batch_id):
+    batch = get_object_or_404(ExportBatch.objects.select_related("project"), pk=batch_id)
+    exports = batch.exports.filter(state=TranslationState.DONE).select_related("revision__part").order_by("revision__part__part_number")
+    entries = (
+        (f"{export.revision.part.part_number}-{export.revision.revision_number}.{export.format.lower()}", export.file.path)
+        for export in exports
+    )
+    return stream_zip(request, entries, f"{batch.project.prefix}-{batch.filter}-{batch.pk}.zip")
+
+
+def drawing_parts(parts):
+    """The parts whose latest revision has a drawing, in part number order."""
+    return (
+        parts.exclude(latest_revision__drawing="")
+        .filter(latest_revision__drawing__isnull=False)
+        .select_related("latest_revision")
+        .order_by("part_number")
+    )
+
+
+def _drawing_entries(parts):
+    """(arcname, path) for the latest-revision drawing of each part, named by part number and revision."""
+    for part in drawing_parts(parts).iterator():
+        drawing = part.latest_revision.drawing
+        extension = os.path.splitext(drawing.name)[1]
+        yield f"{part.part_number}-{part.latest_revision.revision_number}{extension}", drawing.path
+
+
+@login_required
+def project_drawings(request, project_id):
+    project = get_object_or_404(Project, pk=project_id)
+    parts = Part.objects.filter(assembly__project=project)
+    return stream_zip(request, _drawing_entries(parts), f"{project.prefix}-drawings.zip")
+
+
+@login_required
+def assembly_drawings(request, project_id, assembly_id):
+    assembly = get_object_or_404(Assembly, pk=assembly_id, project_id=project_id)
+    parts = Part.objects.filter(assembly_id__in=assembly_subtree_ids(assembly))
+    return stream_zip(request, _drawing_entries(parts), f"{assembly.part_number}-drawings.zip")
+
+
+@login_required
+def mfg_drawings(request, project_id, filter):
+    project = get_object_or_404(Project, pk=project_id)
+    return stream_zip(request, _drawing_entries(filter_parts(project, filter)), f"{project.prefix}-{filter}-drawings.zip")
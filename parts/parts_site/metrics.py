@@ -0,0 +1,179 @@
+"""
+Prometheus metrics for the site, served at /metrics.
+
+MetricsMiddleware times every request by URL name and counts the database
+queries it ran. The Onshape client, the Slack outbox and the fragment and
+role caches record into the metrics below.
+
+With PROMETHEUS_MULTIPROC_DIR set (it must be in the environment before
+the process starts), every process writes its samples to files in that
+directory and /metrics adds them up, so the numbers cover all gunicorn
+workers rather than whichever one answered the scrape. Subdirectories are
+read too, which lets the background worker services write to their own
+subdirectory of a shared volume. Without it the metrics are per process,
+which is what runserver and the tests use.
+"""
+import glob
+import hmac
+import os
+import re
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+UNMATCHED_VIEW = "<unmatched>"
+
+REQUEST_LATENCY = Histogram(
+    "parts_request_duration_seconds",
+    "Time to produce a response, by URL name",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "parts_request_db_queries",
+    "Database queries run per request",
+    ["view"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, float("inf")),
+)
+REQUEST_DB_TIME = Histogram(
+    "parts_request_db_duration_seconds",
+    "Time spent in database queries per request",
+    ["view"],
+)
+ONSHAPE_LATENCY = Histogram(
+    "parts_onshape_request_duration_seconds",
+    "Onshape API call time, per attempt",
+    ["method", "endpoint", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf")),
+)
+SLACK_LATENCY = Histogram(
+    "parts_slack_send_duration_seconds",
+    "Slack message send time",
+    ["result"],
+)
+CACHE_LOOKUPS = Counter(
+    "parts_cache_lookups",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+
+# Onshape document, workspace, element, folder and translation ids
+_ONSHAPE_ID = re.compile(r"(?<=/)[0-9a-fA-F]{24}(?=/|$)")
+
+
+def onshape_endpoint(endpoint):
+    """endpoint with its ids replaced, so every document shares one label."""
+    return _ONSHAPE_ID.sub(":id", endpoint)
+
+
+def record_onshape_call(method, endpoint, status, elapsed):
+    ONSHAPE_LATENCY.labels(method, onshape_endpoint(endpoint), status or "error").observe(elapsed)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and adds up their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - start
+
+
+def _time_queries(queries):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(queries))
+    return stack
+
+
+class MetricsMiddleware:
+    """Records request latency and database use per URL name; goes first in MIDDLEWARE."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = QueryTimer()
+        start = time.perf_counter()
+        with _time_queries(queries):
+            response = self.get_response(request)
+        self.record(request, response, queries, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryTimer()
+        start = time.perf_counter()
+        # Connections are per thread. Under ASGI the request's sync code (and
+        # the async ORM) runs on the request's own sync thread, so wrap the
+        # connections there rather than the event loop's.
+        stack = await sync_to_async(_time_queries)(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, queries, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, queries, elapsed):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else UNMATCHED_VIEW
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        REQUEST_DB_TIME.labels(view).observe(queries.elapsed)
+
+
+class _MultiProcessCollector(MultiProcessCollector):
+    def collect(self):
+        files = glob.glob(os.path.join(self._path, "**", "*.db"), recursive=True)
+        return self.merge(files, accumulate=True)
+
+
+def _registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    _MultiProcessCollector(registry, MULTIPROC_DIR)
+    return registry
+
+
+def _authorized(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "").encode()
+    if token and hmac.compare_digest(authorization, f"Bearer {token}".encode()):
+        return True
+    return request.user.is_staff
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, for METRICS_TOKEN bearers and staff users."""
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -1,18 +1,69 @@
-from django.http import HttpResponseRedirect
+from collections import defaultdict
+
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
-from django.db.models import F
+from django.db.models import F, Max
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.views.decorators.http import condition, require_POST
 
 from .models import *
 from .forms import *
 from .constants import *
+from .project_tree import annotate_part, part_queryset
+from .jobs import enqueue_export_batch
+from .pagination import request_page
+
+def summarize_counts(cells):
+    """
+    Rolls MfgCount cells up by mfg type, in MfgTypes order with unspecified
+    last. Each row has the todo and complete totals and the count per status.
+    """
+    rows = {}
+    for cell in cells:
+        row = rows.setdefault(cell.mfg_type, {"mfg_type": cell.mfg_type, "todo": 0, "complete": 0, "statuses": {}})
+        row["todo" if cell.status <= PartStatus.QUALITY_CHECKED else "complete"] += cell.count
+        row["statuses"][cell.status] = cell.count
+    labels = dict(MfgTypes.choices, **{"": "Unspecified"})
+    return [
+        dict(rows[mfg_type], label=label)
+        for mfg_type, label in labels.items()
+        if mfg_type in rows and (rows[mfg_type]["todo"] or rows[mfg_type]["complete"])
+    ]
+
+def _counts_updated_at(request, project_id):
+    return MfgCount.objects.filter(project_id=project_id).aggregate(Max("updated_at"))["updated_at__max"]
+
+def _counts_etag(request, project_id):
+    # Full precision: Last-Modified is whole seconds, so two saves in the same
+    # second would leave pollers with a stale 304
+    updated_at = _counts_updated_at(request, project_id)
+    return updated_at.isoformat() if updated_at else None
 
 @login_required
 def mfg(request):
-    project_list = Project.objects.order_by("id")
-    context = {"project_list": project_list}
-    return render(request, "mfg.html", context)
+    page = request_page(request, Project.objects.all(), ["id"])
+    cells = defaultdict(list)
+    for cell in MfgCount.objects.filter(project__in=[project.id for project in page], count__gt=0):
+        cells[cell.project_id].append(cell)
+    for project in page:
+        project.mfg_summary = summarize_counts(cells[project.id])
+    context = {"project_list": page, "page": page}
+    return render(request, "mfg_project_rows.html" if "cursor" in request.GET else "mfg.html", context)
+
+@login_required
+@condition(etag_func=_counts_etag)
+def mfg_counts(request, project_id):
+    """The project's mfg summary as JSON; pollers sending If-None-Match get a 304 until a count changes."""
+    project = get_object_or_404(Project, pk=project_id)
+    updated_at = _counts_updated_at(request, project_id)
+    rows = summarize_counts(project.mfg_counts.filter(count__gt=0))
+    return JsonResponse({
+        "project": project.id,
+        "updated_at": updated_at.isoformat() if updated_at else None,
+        "types": [dict(row, statuses={str(status): count for status, count in row["statuses"].items()}) for row in rows],
+    })
 
 @login_required
 def mfg_project(request, project_id):
@@ -20,56 +71,65 @@ def mfg_project(request, project_id):
     context = {"project": current_project,}
     return render(request, "mfg_project.html", context)
 
+def filter_parts(project, filter):
+    """Parts of a project in an mfg filter ("todo", "complete" or an MfgTypes value), highest status first."""
+    parts = part_queryset().filter(assembly__project=project, latest_revision__isnull=False)
+    match filter:
+        case "todo":
+            parts = parts.filter(latest_revision__status__lte=PartStatus.QUALITY_CHECKED)
+        case "complete":
+            parts = parts.filter(latest_revision__status__gt=PartStatus.QUALITY_CHECKED)
+        case _:
+            parts = parts.filter(latest_revision__mfg_type=filter)
+    return parts.order_by("-latest_revision__status", "part_number")
+
 @login_required
 def mfg_filters(request, project_id, filter):
     current_project = get_object_or_404(Project, pk=project_id)
-    
-    assembly_list = []
-    for a in current_project.assembly_set.all():
-        assembly_list.append(a)
-        for a_ in a.sub.all():
-            assembly_list.append(a_)
-    for a in assembly_list:
-        if type(a) == SubAssembly:
-            for i in range(len(assembly_list)):
-                if assembly_list[i].part_number == a.part_number and type(assembly_list[i]) == Assembly:
-                    assembly_list.pop(i)
-                    break
-
-    parts_list = []
-    for assembly in assembly_list:
-        parts = assembly.part_set.all()
-        for part in parts:
-            if part.latest_revision:
-                # Add revision info to each part
-                part.current_status = part.latest_revision.status
-                part.current_status_display = part.latest_revision.get_status_display()
-                part.current_mfg_type = part.latest_revision.mfg_type
-                part.current_mfg_type_display = part.latest_revision.get_mfg_type_display()
-                part.current_material = part.latest_revision.material
-                part.current_quantity = part.latest_revision.quantity
-                part.current_drawing = part.latest_revision.drawing
-                
-                # Apply filters based on latest revision
-                should_include = False
-                match filter:
-                    case "todo":
-                        should_include = part.latest_revision.status <= PartStatus.QUALITY_CHECKED.value
-                    case "complete":
-                        should_include = part.latest_revision.status > PartStatus.QUALITY_CHECKED.value
-                    case _:
-                        should_include = part.latest_revision.mfg_type == filter
-                
-                if should_include:
-                    parts_list.append(part)
-    
-    # Sort by status (descending)
-    parts_list.sort(key=lambda x: x.current_status if x.current_status else 0, reverse=True)
+    page = Paginator(filter_parts(current_project, filter), MFG_PAGE_SIZE).get_page(request.GET.get("page"))
 
     context = {"project": current_project,
                "mfg_types": MfgTypes.choices,
-               "parts_list": parts_list,
+               "parts_list": [annotate_part(part) for part in page],
+               "page": page,
                "current_filter": filter,
                }
 
-    return render(request, "mfg_filter.html", context)
\ No newline at end of file
+    return render(request, "mfg_filter.html", context)
+
+@login_required
+@require_POST
+def mfg_export(request, project_id, filter):
+    """Exports every part in the filter from Onshape; the worker starts the translations."""
+    current_project = get_object_or_404(Project, pk=project_id)
+    parts_list = list(filter_parts(current_project, filter))
+    linked = [part for part in parts_list if part.onshape_element_id and part.assembly.onshape_document_id]
+
+    batch = ExportBatch.objects.create(
+        project=current_project,
+        filter=filter,
+        format=EXPORT_FORMATS.get(filter, DEFAULT_EXPORT_FORMAT),
+        skipped=[part.part_number for part in parts_list if part not in linked],
+        part_count=len(linked),
+        created_by=request.user,
+    )
+    if linked:
+        enqueue_export_batch(batch, linked)
+    return HttpResponseRedirect(reverse("exportbatch", args=(batch.id,)))
+
+@login_required
+def export_batch(request, batch_id):
+    batch = get_object_or_404(ExportBatch.objects.select_related("project"), pk=batch_id)
+    exports = list(batch.exports.select_related("revision__part").order_by("revision__part__part_number"))
+    ready = sum(1 for export in exports if export.state == TranslationState.DONE)
+    failed = sum(1 for export in exports if export.state == TranslationState.FAILED)
+
+    context = {"batch": batch,
+               "project": batch.project,
+               "exports": exports,
+               "ready": ready,
+               "failed": failed,
+               "pending": batch.part_count - ready - failed,
+               }
+
+    return render(request, "export_batch.html", context)
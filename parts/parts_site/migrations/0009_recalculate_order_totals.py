@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def recalculate_order_totals(apps, schema_editor):
+    # orders_filters used to overwrite order_total with the item subtotal only,
+    # so bring every stored total back in line with items + tax + shipping.
+    Order = apps.get_model('parts_site', 'Order')
+    for order in Order.objects.annotate(
+        subtotal=Sum(F('item__unit_price') * F('item__quantity'), output_field=models.FloatField())
+    ):
+        total = (order.subtotal or 0) + (order.tax or 0) + (order.shipping or 0)
+        Order.objects.filter(pk=order.pk).update(order_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0008_order_shipping_order_tax'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalculate_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1 on 2026-10-18 17:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_onshape_step(apps, schema_editor):
+    # Rows provisioned before the job queue existed were linked synchronously
+    Assembly = apps.get_model('parts_site', 'Assembly')
+    Part = apps.get_model('parts_site', 'Part')
+    Assembly.objects.filter(onshape_element_id__isnull=False).update(onshape_step=5)
+    # Rows with a folder but no document stay Not Linked: no job will ever
+    # create their document, so parts under them can't be provisioned
+    Assembly.objects.filter(onshape_element_id__isnull=True, onshape_document_id__isnull=False).update(onshape_step=3)
+    Part.objects.filter(onshape_element_id__isnull=False).update(onshape_step=5)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0009_recalculate_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assembly',
+            name='onshape_step',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Not Linked'), (1, 'Queued'), (2, 'Folder Created'), (3, 'Document Created'), (4, 'Element Created'), (5, 'Linked')], default=0),
+        ),
+        migrations.AddField(
+            model_name='part',
+            name='onshape_step',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Not Linked'), (1, 'Queued'), (2, 'Folder Created'), (3, 'Document Created'), (4, 'Element Created'), (5, 'Linked')], default=0),
+        ),
+        migrations.CreateModel(
+            name='OnshapeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ASSEMBLY', 'Provision Assembly'), ('PART', 'Provision Part')], max_length=20)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'Running'), (3, 'Done'), (4, 'Failed')], default=1)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assembly', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='parts_site.assembly')),
+                ('part', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='parts_site.part')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(backfill_onshape_step, migrations.RunPython.noop),
+    ]
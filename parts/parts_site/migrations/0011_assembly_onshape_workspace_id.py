@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0010_onshape_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assembly',
+            name='onshape_workspace_id',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+def backfill_last_part_number(apps, schema_editor):
+    # Same numbering newpart used to derive by scanning the assembly's parts
+    Assembly = apps.get_model('parts_site', 'Assembly')
+    for assembly in Assembly.objects.prefetch_related('part_set'):
+        last = int(assembly.part_number.split("-")[3])
+        for part in assembly.part_set.all():
+            if part.part_number.split("-")[2] == "P":
+                last = max(last, int(part.part_number.split("-")[3]))
+        Assembly.objects.filter(pk=assembly.pk).update(last_part_number=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0011_assembly_onshape_workspace_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assembly',
+            name='last_part_number',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='onshapejob',
+            name='kind',
+            field=models.CharField(choices=[('ASSEMBLY', 'Provision Assembly'), ('PART', 'Provision Part'), ('BULK_PARTS', 'Provision Imported Parts')], max_length=20),
+        ),
+        migrations.RunPython(backfill_last_part_number, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+def backfill_last_assembly_number(apps, schema_editor):
+    # Same numbering newassembly used to derive by scanning the project's assemblies
+    Project = apps.get_model('parts_site', 'Project')
+    for project in Project.objects.prefetch_related('assembly_set'):
+        last = 0
+        for assembly in project.assembly_set.all():
+            if assembly.part_number.split("-")[2] == "A":
+                last = max(last, int(assembly.part_number.split("-")[3]))
+        Project.objects.filter(pk=project.pk).update(last_assembly_number=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0012_assembly_last_part_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='last_assembly_number',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_assembly_number, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0013_project_last_assembly_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='onshapejob',
+            name='kind',
+            field=models.CharField(choices=[('ASSEMBLY', 'Provision Assembly'), ('PART', 'Provision Part'), ('BULK_PARTS', 'Provision Imported Parts'), ('VERSION', 'Create Revision Version')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1 on 2026-10-18 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0015_slack_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='onshapejob',
+            name='kind',
+            field=models.CharField(choices=[('ASSEMBLY', 'Provision Assembly'), ('PART', 'Provision Part'), ('BULK_PARTS', 'Provision Imported Parts'), ('VERSION', 'Create Revision Version'), ('STEP_EXPORT', 'Download STEP Export')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='StepExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('translation_id', models.CharField(max_length=200, unique=True)),
+                ('state', models.CharField(choices=[('ACTIVE', 'In Progress'), ('DONE', 'Ready'), ('FAILED', 'Failed')], default='ACTIVE', max_length=10)),
+                ('revision_updated_at', models.DateTimeField()),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/%Y/%m/%d')),
+                ('polls', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('revision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='step_exports', to='parts_site.partrevision')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0016_step_exports'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stepexport',
+            name='format',
+            field=models.CharField(default='STEP', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='onshapejob',
+            name='kind',
+            field=models.CharField(choices=[('ASSEMBLY', 'Provision Assembly'), ('PART', 'Provision Part'), ('BULK_PARTS', 'Provision Imported Parts'), ('VERSION', 'Create Revision Version'), ('STEP_EXPORT', 'Download STEP Export'), ('EXPORT_BATCH', 'Start Batch Export')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ExportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filter', models.CharField(max_length=50)),
+                ('format', models.CharField(default='STEP', max_length=10)),
+                ('skipped', models.JSONField(blank=True, default=list)),
+                ('part_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('exports', models.ManyToManyField(blank=True, related_name='batches', to='parts_site.stepexport')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='parts_site.project')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
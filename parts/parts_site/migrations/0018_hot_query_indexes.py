@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 17:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0017_export_batches'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assembly',
+            index=models.Index(fields=['part_number'], name='assembly_part_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'vendor'], name='order_status_vendor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='part',
+            index=models.Index(fields=['part_number'], name='part_part_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partrevision',
+            index=models.Index(fields=['status'], name='revision_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partrevision',
+            index=models.Index(fields=['mfg_type', 'status'], name='revision_mfg_type_status_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_parts(apps, schema_editor):
+    Part = apps.get_model('parts_site', 'Part')
+    MfgCount = apps.get_model('parts_site', 'MfgCount')
+    rows = (
+        Part.objects.filter(latest_revision__isnull=False)
+        .annotate(mfg_type=Coalesce('latest_revision__mfg_type', Value('')))
+        .values_list('assembly__project_id', 'mfg_type', 'latest_revision__status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    MfgCount.objects.bulk_create(
+        MfgCount(project_id=project_id, mfg_type=mfg_type, status=status, count=count)
+        for project_id, mfg_type, status, count in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0018_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MfgCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mfg_type', models.CharField(blank=True, choices=[('CNC_MILL', 'CNC Mill'), ('MANUAL_MILL', 'Manual Mill'), ('ROUTER', 'Router'), ('LATHE', 'Lathe'), ('3D_PRINT', '3D Printer'), ('LASER_CUT', 'Laser Cutter')], max_length=200)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'New Part'), (2, 'In Design'), (3, 'In Design Review'), (4, 'Design Review Complete'), (5, 'Manufacturing Review Complete'), (6, 'In Manufacturing'), (7, 'Manufacturing Complete'), (8, 'Quality Check Complete'), (9, 'In Assembly'), (10, 'Assembly Completed')])),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mfg_counts', to='parts_site.project')),
+            ],
+            options={
+                'ordering': ['mfg_type', 'status'],
+                'unique_together': {('project', 'mfg_type', 'status')},
+            },
+        ),
+        migrations.RunPython(count_existing_parts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,143 @@
+# Generated by Django 5.1 on 2026-10-18 17:51
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+from django.urls import reverse
+
+# Kept in step with SearchEntry by triggers, so Django only ever writes the
+# entry table. Note that SQLite rebuilds a table (dropping its triggers) on
+# most AlterField operations; rerun these statements after any such change
+# to SearchEntry, then rebuild_search_index.
+POSTGRES_SQL = [
+    """
+    CREATE FUNCTION parts_site_searchentry_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.body, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER parts_site_searchentry_vector BEFORE INSERT OR UPDATE OF title, body
+    ON parts_site_searchentry FOR EACH ROW EXECUTE FUNCTION parts_site_searchentry_vector()
+    """,
+    "CREATE INDEX searchentry_vector_idx ON parts_site_searchentry USING gin (search_vector)",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS searchentry_vector_idx",
+    "DROP TRIGGER IF EXISTS parts_site_searchentry_vector ON parts_site_searchentry",
+    "DROP FUNCTION IF EXISTS parts_site_searchentry_vector()",
+]
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE parts_site_searchentry_fts USING fts5(
+        title, body, content='parts_site_searchentry', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER parts_site_searchentry_ai AFTER INSERT ON parts_site_searchentry BEGIN
+        INSERT INTO parts_site_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER parts_site_searchentry_ad AFTER DELETE ON parts_site_searchentry BEGIN
+        INSERT INTO parts_site_searchentry_fts(parts_site_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER parts_site_searchentry_au AFTER UPDATE ON parts_site_searchentry BEGIN
+        INSERT INTO parts_site_searchentry_fts(parts_site_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO parts_site_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS parts_site_searchentry_ai",
+    "DROP TRIGGER IF EXISTS parts_site_searchentry_ad",
+    "DROP TRIGGER IF EXISTS parts_site_searchentry_au",
+    "DROP TABLE IF EXISTS parts_site_searchentry_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_full_text_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_SQL, 'sqlite': SQLITE_SQL})
+
+
+def drop_full_text_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_REVERSE_SQL, 'sqlite': SQLITE_REVERSE_SQL})
+
+
+def index_existing_objects(apps, schema_editor):
+    # Same documents as models.search_document, frozen against the historical models
+    SearchEntry = apps.get_model('parts_site', 'SearchEntry')
+    Assembly = apps.get_model('parts_site', 'Assembly')
+    Part = apps.get_model('parts_site', 'Part')
+    PartRevision = apps.get_model('parts_site', 'PartRevision')
+    Item = apps.get_model('parts_site', 'Item')
+
+    entries = []
+    for assembly in Assembly.objects.all():
+        entries.append(SearchEntry(
+            kind='assembly', object_id=assembly.pk, project_id=assembly.project_id,
+            title=f'{assembly.part_number} {assembly.name}'[:400], body=assembly.description,
+            url=reverse('assembly', args=(assembly.project_id, assembly.pk)),
+        ))
+    for part in Part.objects.select_related('assembly'):
+        entries.append(SearchEntry(
+            kind='part', object_id=part.pk, project_id=part.assembly.project_id,
+            title=f'{part.part_number} {part.name}'[:400], body=part.description,
+            url=reverse('part', args=(part.assembly.project_id, part.assembly_id, part.pk)),
+        ))
+    for revision in PartRevision.objects.select_related('part__assembly'):
+        part = revision.part
+        entries.append(SearchEntry(
+            kind='revision', object_id=revision.pk, project_id=part.assembly.project_id,
+            title=f'{part.part_number} {part.name} Rev {revision.revision_number}'[:400],
+            body=' '.join(filter(None, [revision.material, revision.notes])),
+            url=reverse('part_revision', args=(part.assembly.project_id, part.assembly_id, part.pk, revision.pk)),
+        ))
+    for item in Item.objects.all():
+        entries.append(SearchEntry(
+            kind='item', object_id=item.pk,
+            title=f'{item.part_number} {item.name}'[:400], body=f'{item.vendor} {item.justification}',
+            url=reverse('order', args=(item.order_id,)),
+        ))
+    SearchEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parts_site', '0019_mfg_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('part', 'Part'), ('assembly', 'Assembly'), ('revision', 'Revision'), ('item', 'Order Item')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=400)),
+                ('body', models.TextField(blank=True)),
+                ('url', models.CharField(max_length=400)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='parts_site.project')),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+        migrations.RunPython(index_existing_objects, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,18 @@
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save, pre_save
+from django.contrib.auth.models import Group
+from django.db import models, transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.contrib.postgres.search import SearchVectorField
 from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import logging
 
-from django_slack import slack_message
+from .roles import invalidate_roles
+from .tree_cache import invalidate_project
 
 logger = logging.getLogger(__name__)
 
@@ -31,11 +38,21 @@ class MfgTypes(models.TextChoices):
     THREE_D_PRINT = "3D_PRINT", _("3D Printer")
     LASER_CUT = "LASER_CUT", _("Laser Cutter")
 
+class OnshapeStep(models.IntegerChoices):
+    NONE = 0, _("Not Linked")
+    QUEUED = 1, _("Queued")
+    FOLDER = 2, _("Folder Created")
+    DOCUMENT = 3, _("Document Created")
+    ELEMENT = 4, _("Element Created")
+    DONE = 5, _("Linked")
+
 class Project(models.Model):
     name = models.CharField(max_length=200)
     description = models.CharField(max_length=200)
     prefix = models.CharField(max_length=10)
     onshape_folder_id = models.CharField(max_length=200, null=True, blank=True)
+    # Highest assembly number handed out in this project, see numbering.allocate_assembly_number
+    last_assembly_number = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -49,9 +66,70 @@ class Assembly(models.Model):
     onshape_folder_id = models.CharField(max_length=200, null=True, blank=True)
     onshape_document_id = models.CharField(max_length=200, null=True, blank=True)
     onshape_element_id = models.CharField(max_length=200, null=True, blank=True)
+    onshape_workspace_id = models.CharField(max_length=200, null=True, blank=True)
+    onshape_step = models.PositiveSmallIntegerField(choices=OnshapeStep, default=OnshapeStep.NONE)
+    # Highest part number handed out to this assembly's parts, see numbering.allocate_part_numbers
+    last_part_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['part_number'], name='assembly_part_number_idx')]
     
     def __str__(self):
         return self.name
+
+    def get_onshape_workspace_id(self, client, refresh=False):
+        """Default workspace of the Onshape document, fetched once and stored on the row."""
+        if not self.onshape_document_id:
+            return None
+        if self.onshape_workspace_id and not refresh:
+            return self.onshape_workspace_id
+        workspace = client.get_document_workspace(self.onshape_document_id)
+        if not workspace:
+            # A failed lookup (timeout, 5xx, throttling) leaves the stored id alone
+            return None
+        self.onshape_workspace_id = workspace['id']
+        Assembly.objects.filter(pk=self.pk).update(onshape_workspace_id=self.onshape_workspace_id)
+        return self.onshape_workspace_id
+
+    def with_onshape_workspace(self, client, call):
+        """Runs call(workspace_id), refetching the stored workspace once if Onshape returns 404."""
+        workspace_id = self.get_onshape_workspace_id(client)
+        if not workspace_id:
+            return None
+        result = call(workspace_id)
+        if result is None and client.last_status == 404:
+            logger.info(f"Workspace {workspace_id} of {self.part_number} not found, refetching")
+            workspace_id = self.get_onshape_workspace_id(client, refresh=True)
+            if workspace_id:
+                result = call(workspace_id)
+        return result
+
+    async def aget_onshape_workspace_id(self, client, refresh=False):
+        """get_onshape_workspace_id for an AsyncOnshapeClient."""
+        if not self.onshape_document_id:
+            return None
+        if self.onshape_workspace_id and not refresh:
+            return self.onshape_workspace_id
+        workspace = await client.get_document_workspace(self.onshape_document_id)
+        if not workspace:
+            # A failed lookup (timeout, 5xx, throttling) leaves the stored id alone
+            return None
+        self.onshape_workspace_id = workspace['id']
+        await Assembly.objects.filter(pk=self.pk).aupdate(onshape_workspace_id=self.onshape_workspace_id)
+        return self.onshape_workspace_id
+
+    async def awith_onshape_workspace(self, client, call):
+        """with_onshape_workspace for an AsyncOnshapeClient; call(workspace_id) returns an awaitable."""
+        workspace_id = await self.aget_onshape_workspace_id(client)
+        if not workspace_id:
+            return None
+        result = await call(workspace_id)
+        if result is None and client.last_status == 404:
+            logger.info(f"Workspace {workspace_id} of {self.part_number} not found, refetching")
+            workspace_id = await self.aget_onshape_workspace_id(client, refresh=True)
+            if workspace_id:
+                result = await call(workspace_id)
+        return result
     
 class SubAssembly(Assembly):
     assembly = models.ForeignKey(Assembly, related_name="sub", on_delete=models.CASCADE)
@@ -66,6 +144,10 @@ class Part(models.Model):
     description = models.CharField(max_length=200)
     latest_revision = models.ForeignKey('PartRevision', on_delete=models.SET_NULL, null=True, blank=True, related_name='part_latest')
     onshape_element_id = models.CharField(max_length=200, null=True, blank=True)
+    onshape_step = models.PositiveSmallIntegerField(choices=OnshapeStep, default=OnshapeStep.NONE)
+
+    class Meta:
+        indexes = [models.Index(fields=['part_number'], name='part_part_number_idx')]
 
     def __str__(self):
         return self.name
@@ -85,11 +167,119 @@ class PartRevision(models.Model):
 
     class Meta:
         ordering = ['-revision_number']
+        # The unique index on (part, revision_number) also serves "latest revision of a part"
         unique_together = ['part', 'revision_number']
+        indexes = [
+            models.Index(fields=['status'], name='revision_status_idx'),
+            models.Index(fields=['mfg_type', 'status'], name='revision_mfg_type_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.part.name} - Rev {self.revision_number}"
 
+class MfgCount(models.Model):
+    """Number of a project's parts whose latest revision has this mfg_type ("" if unset) and status."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='mfg_counts')
+    mfg_type = models.CharField(max_length=200, choices=MfgTypes, blank=True)
+    status = models.PositiveSmallIntegerField(choices=PartStatus)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['mfg_type', 'status']
+        unique_together = ['project', 'mfg_type', 'status']
+
+    def __str__(self):
+        return f"{self.project} {self.mfg_type or 'unspecified'} {self.get_status_display()}: {self.count}"
+
+
+#ONSHAPE INTEGRATION MODELS
+
+class JobKind(models.TextChoices):
+    ASSEMBLY = "ASSEMBLY", _("Provision Assembly")
+    PART = "PART", _("Provision Part")
+    BULK_PARTS = "BULK_PARTS", _("Provision Imported Parts")
+    VERSION = "VERSION", _("Create Revision Version")
+    STEP_EXPORT = "STEP_EXPORT", _("Download STEP Export")
+    EXPORT_BATCH = "EXPORT_BATCH", _("Start Batch Export")
+
+class JobStatus(models.IntegerChoices):
+    PENDING = 1, _("Pending")
+    RUNNING = 2, _("Running")
+    DONE = 3, _("Done")
+    FAILED = 4, _("Failed")
+
+class OnshapeJob(models.Model):
+    kind = models.CharField(max_length=20, choices=JobKind)
+    assembly = models.ForeignKey(Assembly, on_delete=models.CASCADE, null=True, blank=True)
+    part = models.ForeignKey(Part, on_delete=models.CASCADE, null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.PositiveSmallIntegerField(choices=JobStatus, default=JobStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+
+# Values match the requestState Onshape reports for a translation
+class TranslationState(models.TextChoices):
+    ACTIVE = "ACTIVE", _("In Progress")
+    DONE = "DONE", _("Ready")
+    FAILED = "FAILED", _("Failed")
+
+class StepExport(models.Model):
+    """An Onshape translation (STEP or DXF) of a part revision and, once finished, the downloaded file."""
+    revision = models.ForeignKey(PartRevision, on_delete=models.CASCADE, related_name="step_exports")
+    translation_id = models.CharField(max_length=200, unique=True)
+    format = models.CharField(max_length=10, default="STEP")
+    state = models.CharField(max_length=10, choices=TranslationState, default=TranslationState.ACTIVE)
+    # The revision's updated_at when the export started; editing the revision makes the export stale
+    revision_updated_at = models.DateTimeField()
+    file = models.FileField(upload_to="exports/%Y/%m/%d", null=True, blank=True)
+    polls = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"STEP export of {self.revision} ({self.get_state_display()})"
+
+    @classmethod
+    def current_for(cls, revision, format="STEP"):
+        """Exports of the revision as it is now, newest first, skipping failed ones."""
+        return cls.objects.filter(
+            revision=revision, revision_updated_at=revision.updated_at, format=format
+        ).exclude(state=TranslationState.FAILED)
+
+class ExportBatch(models.Model):
+    """Every part in an mfg filter exported together, downloadable as one ZIP."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    filter = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, default="STEP")
+    exports = models.ManyToManyField(StepExport, blank=True, related_name="batches")
+    # Part numbers that couldn't be exported (not linked to Onshape)
+    skipped = models.JSONField(default=list, blank=True)
+    part_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.project.prefix} {self.filter} export #{self.pk}"
+
 
 #ORDER MANAGEMENT MODELS
 
@@ -110,62 +300,85 @@ class Order(models.Model):
     tax = models.FloatField(default=0.0)
     shipping = models.FloatField(default=0.0)
 
+    class Meta:
+        # Covers the status tabs (ordered by vendor) and the open-order-per-vendor lookup in newitem
+        indexes = [models.Index(fields=['status', 'vendor'], name='order_status_vendor_idx')]
+
     def __str__(self):
         return self.order_id
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the status as loaded so save() can spot transitions without re-reading the row
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        old_status = getattr(self, "_loaded_status", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_status is not None and old_status != self.status:
+                queue_order_status_message(self)
+        self._loaded_status = self.status
+
+    def item_subtotal(self):
+        """Sum of unit_price * quantity over the order's items, computed in the database."""
+        return self.item_set.aggregate(
+            subtotal=Sum(F("unit_price") * F("quantity"), output_field=models.FloatField())
+        )["subtotal"] or 0
+
+    def update_total(self, save=False):
+        """
+        Recomputes order_total as items + tax + shipping while holding the
+        order's row lock, so concurrent item saves and order edits queue up
+        instead of overwriting each other's totals.
+
+        By default only order_total is written, using the stored tax and
+        shipping. With save=True the whole order is saved with this
+        instance's tax and shipping (an edit from OrderFormEdit).
+        """
+        with transaction.atomic():
+            # NO KEY UPDATE doesn't conflict with the key-share lock inserting an item takes
+            stored = Order.objects.select_for_update(no_key=True).filter(pk=self.pk).values("tax", "shipping").first()
+            if stored is None:
+                # Deleted along with its items
+                return None
+            charges = (self.tax or 0) + (self.shipping or 0) if save else (stored["tax"] or 0) + (stored["shipping"] or 0)
+            self.order_total = self.item_subtotal() + charges
+            if save:
+                self.save()
+            else:
+                # Queryset update so recomputing a total doesn't re-save the whole order
+                Order.objects.filter(pk=self.pk).update(order_total=self.order_total)
+        return self.order_total
     
-@receiver(pre_save, sender=Order)
-def send_slack_message_on_ready(sender, instance, **kwargs):
-    # Check if this is an existing order (has a primary key) and its status is being updated to READY
-    if instance.pk is not None:
-        old_instance = Order.objects.get(pk=instance.pk)
-        if old_instance.status != OrderStatus.READY and instance.status == OrderStatus.READY:
-            attachments = [
-                {
-                'title': f'{instance.vendor} order is ready to order',
-                'fields': [
-                    {
-                        'title': 'Order Total',
-                        'value': f'${instance.order_total}',
-                        'short': False
-                    },
-                    {
-                        'title': 'Link to Order',
-                        'value': f'<https://parts.team668.org/orders/{instance.pk}/>',
-                        'short': False
-                    },
-                ]
-                },
-            ]
-            try:
-                slack_message('slack/order_ready.slack', {
-                    'order': instance,
-                }, attachments=attachments)
-            except Exception as e:
-                logger.error(f"Failed to send Slack message for order ready: {e}")
-        if old_instance.status != OrderStatus.PLACED and instance.status == OrderStatus.PLACED:
-            attachments = [
-                {
-                'title': f'{instance.vendor} order is placed',
-                'fields': [
-                    {
-                        'title': 'Order Total',
-                        'value': f'${instance.order_total}',
-                        'short': False
-                    },
-                    {
-                        'title': 'Link to Order',
-                        'value': f'<https://parts.team668.org/orders/{instance.pk}/>',
-                        'short': False
-                    },
-                ]
-                },
-            ]
-            try:
-                slack_message('slack/order_ready.slack', {
-                    'order': instance,
-                }, attachments=attachments)
-            except Exception as e:
-                logger.error(f"Failed to send Slack message for order placed: {e}")
+def queue_order_status_message(order):
+    """Adds a Slack message to the outbox when an order becomes ready or is placed."""
+    if order.status == OrderStatus.READY:
+        title = f'{order.vendor} order is ready to order'
+    elif order.status == OrderStatus.PLACED:
+        title = f'{order.vendor} order is placed'
+    else:
+        return None
+    attachments = [
+        {
+        'title': title,
+        'fields': [
+            {
+                'title': 'Order Total',
+                'value': f'${order.order_total}',
+                'short': False
+            },
+            {
+                'title': 'Link to Order',
+                'value': f'<https://parts.team668.org/orders/{order.pk}/>',
+                'short': False
+            },
+        ]
+        },
+    ]
+    return SlackMessage.objects.create(order=order, template='slack/order_ready.slack', attachments=attachments)
     
 class Item(models.Model):
     name = models.CharField(max_length=200)
@@ -182,53 +395,115 @@ class Item(models.Model):
         return self.name
     
     def save(self, *args, **kwargs):
-        items = self.order.item_set.all()
-        # Start with current item total
-        subtotal = self.unit_price * self.quantity
-        for item in items:
-            # Add existing items (if this is an update, it might double count if self is in items? 
-            # item_set.all() gets from DB. If self is new, not in DB. If self is update, it IS in DB.
-            # If update, we should exclude self from query or handle it.
-            # But the simplest way is to just sum everything from DB and add self?
-            # Wait, if self is in DB, and we update price, DB has old price.
-            # So if self.pk is set, we should exclude it from items list.
-            if item.pk != self.pk:
-                subtotal = subtotal + (item.unit_price * item.quantity)
-        
-        self.order.order_total = subtotal + self.order.tax + self.order.shipping
-        self.order.save()
-        return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.order.update_total()
+
+@receiver(post_delete, sender=Item, dispatch_uid="update_order_total_on_item_delete")
+def update_order_total_on_item_delete(sender, instance, **kwargs):
+    try:
+        order = instance.order
+    except Order.DoesNotExist:
+        return
+    order.update_total()
+
+
+#NOTIFICATION MODELS
+
+class SlackMessage(models.Model):
+    """
+    Outbox for Slack notifications. Rows are written in the same transaction
+    as the change they announce and sent by the send_slack_messages worker,
+    so saving an order never waits on Slack.
+    """
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    template = models.CharField(max_length=200)
+    attachments = models.JSONField(default=list, blank=True)
+    status = models.PositiveSmallIntegerField(choices=JobStatus, default=JobStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Slack message #{self.pk} ({self.get_status_display()})"
+
+
+#SEARCH MODELS
+
+class SearchKind(models.TextChoices):
+    PART = "part", _("Part")
+    ASSEMBLY = "assembly", _("Assembly")
+    REVISION = "revision", _("Revision")
+    ITEM = "item", _("Order Item")
+
+class SearchEntry(models.Model):
+    """
+    The searchable text of a part, assembly, revision or order item.
+
+    The full-text index over title and body is maintained by database
+    triggers from migration 0020 (a weighted tsvector with a GIN index on
+    PostgreSQL, an FTS5 table on SQLite), so saving the row is all it takes.
+    """
+    kind = models.CharField(max_length=20, choices=SearchKind)
+    object_id = models.PositiveBigIntegerField()
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True)
+    title = models.CharField(max_length=400)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=400)
+    # PostgreSQL only; filled in by the trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
 
 
 # Signal definitions
-def update_assembly_status(sender, instance, **kwargs):
-    assembly = instance.part.assembly
-    final_status = PartStatus.NEW
-    
-    # Check each status level from highest to lowest
-    for status in reversed(PartStatus.values):
-        all_parts_at_status = True
-        
-        # Check all parts in this assembly
-        for part in assembly.part_set.all():
-            if not part.latest_revision or part.latest_revision.status < status:
-                all_parts_at_status = False
-                break
-        
-        # Check all sub-assemblies
-        if all_parts_at_status:
-            for sub in assembly.sub.all():
-                if sub.status < status:
-                    all_parts_at_status = False
-                    break
-        
-        # If all parts and sub-assemblies are at this status or higher, this is our final status
-        if all_parts_at_status:
-            final_status = status
-            break
-    
-    assembly.status = final_status
-    assembly.save()
+def rollup_assembly_status(assembly_id):
+    """
+    Recomputes an assembly's status as the lowest status among its parts'
+    latest revisions and its sub-assemblies, then walks up the SubAssembly
+    chain while the status keeps changing. Costs two queries per level.
+    """
+    parts_min = (
+        Part.objects.filter(assembly=OuterRef("pk"))
+        .values("assembly")
+        .annotate(m=Min(Coalesce("latest_revision__status", PartStatus.NEW)))
+        .values("m")
+    )
+    subs_min = (
+        SubAssembly.objects.filter(assembly=OuterRef("pk"))
+        .values("assembly")
+        .annotate(m=Min("status"))
+        .values("m")
+    )
+
+    while assembly_id is not None:
+        row = (
+            Assembly.objects.filter(pk=assembly_id)
+            .annotate(parts_min=Subquery(parts_min), subs_min=Subquery(subs_min))
+            .values("status", "parts_min", "subs_min", "subassembly__assembly")
+            .first()
+        )
+        if row is None:
+            return
+
+        children = [s for s in (row["parts_min"], row["subs_min"]) if s is not None]
+        # An assembly with nothing in it has nothing to be done
+        final_status = min(children) if children else PartStatus.NEW
+        if final_status == row["status"]:
+            return
+
+        Assembly.objects.filter(pk=assembly_id).update(status=final_status)
+        assembly_id = row["subassembly__assembly"]
 
 
 @receiver(post_save, sender=PartRevision, dispatch_uid="update_part_latest_revision")
@@ -238,8 +513,182 @@ def update_part_latest_revision(sender, instance, **kwargs):
     # Get the revision with the highest revision_number (latest letter)
     latest_revision = part.revisions.order_by('-revision_number').first()
     if latest_revision:
-        part.latest_revision = latest_revision
-        part.save()
-        
+        if part.latest_revision_id != latest_revision.pk:
+            part.latest_revision = latest_revision
+            part.save()
+        elif latest_revision.pk != instance.pk:
+            # Editing an older revision can't change the assembly status
+            return
+
         # Now update the assembly status since the part's latest_revision is updated
-        update_assembly_status(sender, instance, **kwargs)
+        rollup_assembly_status(part.assembly_id)
+
+
+def refresh_mfg_counts(project_id):
+    """
+    Recounts a project's parts by latest revision mfg_type and status in one
+    grouped query and writes only the MfgCount cells that changed. Emptied
+    cells are kept at zero so updated_at always moves forward.
+    """
+    counts = {
+        (mfg_type, status): count
+        for mfg_type, status, count in Part.objects.filter(assembly__project_id=project_id, latest_revision__isnull=False)
+        .annotate(mfg_type=Coalesce("latest_revision__mfg_type", Value("")))
+        .values_list("mfg_type", "latest_revision__status")
+        .annotate(count=Count("id"))
+        .order_by()
+    }
+    with transaction.atomic():
+        cells = {(cell.mfg_type, cell.status): cell for cell in MfgCount.objects.select_for_update().filter(project_id=project_id)}
+        changed = []
+        for key, cell in cells.items():
+            count = counts.pop(key, 0)
+            if cell.count != count:
+                cell.count = count
+                cell.updated_at = timezone.now()
+                changed.append(cell)
+        if changed:
+            MfgCount.objects.bulk_update(changed, ["count", "updated_at"])
+        if counts:
+            # A concurrent refresh may have created the same cells first
+            MfgCount.objects.bulk_create(
+                [MfgCount(project_id=project_id, mfg_type=mfg_type, status=status, count=count)
+                 for (mfg_type, status), count in counts.items()],
+                update_conflicts=True,
+                unique_fields=["project", "mfg_type", "status"],
+                update_fields=["count", "updated_at"],
+            )
+
+
+def schedule_mfg_counts(project_id):
+    """Refreshes the project's MfgCount cells once the current transaction commits."""
+    if project_id is not None:
+        transaction.on_commit(lambda: refresh_mfg_counts(project_id))
+
+
+def _project_id_of(instance):
+    try:
+        if isinstance(instance, Assembly):
+            return instance.project_id
+        if isinstance(instance, Part):
+            return instance.assembly.project_id
+        return instance.part.assembly.project_id
+    except (Assembly.DoesNotExist, Part.DoesNotExist):
+        # Deleted along with its assembly or project
+        return None
+
+
+@receiver(post_save, sender=Assembly, dispatch_uid="invalidate_tree_on_assembly_save")
+@receiver(post_save, sender=SubAssembly, dispatch_uid="invalidate_tree_on_subassembly_save")
+@receiver(post_save, sender=Part, dispatch_uid="invalidate_tree_on_part_save")
+@receiver(post_save, sender=PartRevision, dispatch_uid="invalidate_tree_on_revision_save")
+@receiver(post_delete, sender=Assembly, dispatch_uid="invalidate_tree_on_assembly_delete")
+@receiver(post_delete, sender=SubAssembly, dispatch_uid="invalidate_tree_on_subassembly_delete")
+@receiver(post_delete, sender=Part, dispatch_uid="invalidate_tree_on_part_delete")
+@receiver(post_delete, sender=PartRevision, dispatch_uid="invalidate_tree_on_revision_delete")
+def invalidate_project_tree(sender, instance, **kwargs):
+    invalidate_project(_project_id_of(instance))
+
+
+@receiver(post_save, sender=PartRevision, dispatch_uid="mfg_counts_on_revision_save")
+@receiver(post_delete, sender=PartRevision, dispatch_uid="mfg_counts_on_revision_delete")
+@receiver(post_delete, sender=Part, dispatch_uid="mfg_counts_on_part_delete")
+def update_mfg_counts(sender, instance, **kwargs):
+    schedule_mfg_counts(_project_id_of(instance))
+
+
+@receiver(m2m_changed, sender=Group.user_set.through, dispatch_uid="invalidate_roles_on_membership_change")
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidate_roles([instance.pk])
+    else:
+        # Changed from the group's side; clear() doesn't say which users it removed
+        invalidate_roles(pk_set)
+
+
+@receiver(post_save, sender=Group, dispatch_uid="invalidate_roles_on_group_save")
+@receiver(post_delete, sender=Group, dispatch_uid="invalidate_roles_on_group_delete")
+def invalidate_roles_on_group_change(sender, instance, **kwargs):
+    invalidate_roles()
+
+
+def search_document(instance):
+    """SearchEntry fields for a Part, Assembly (or SubAssembly), PartRevision or Item."""
+    if isinstance(instance, Part):
+        assembly = instance.assembly
+        return dict(
+            kind=SearchKind.PART,
+            project_id=assembly.project_id,
+            title=f"{instance.part_number} {instance.name}",
+            body=instance.description,
+            url=reverse("part", args=(assembly.project_id, assembly.pk, instance.pk)),
+        )
+    if isinstance(instance, PartRevision):
+        part = instance.part
+        assembly = part.assembly
+        return dict(
+            kind=SearchKind.REVISION,
+            project_id=assembly.project_id,
+            title=f"{part.part_number} {part.name} Rev {instance.revision_number}",
+            body=" ".join(filter(None, [instance.material, instance.notes])),
+            url=reverse("part_revision", args=(assembly.project_id, assembly.pk, part.pk, instance.pk)),
+        )
+    if isinstance(instance, Assembly):
+        return dict(
+            kind=SearchKind.ASSEMBLY,
+            project_id=instance.project_id,
+            title=f"{instance.part_number} {instance.name}",
+            body=instance.description,
+            url=reverse("assembly", args=(instance.project_id, instance.pk)),
+        )
+    return dict(
+        kind=SearchKind.ITEM,
+        project_id=None,
+        title=f"{instance.part_number} {instance.name}",
+        body=f"{instance.vendor} {instance.justification}",
+        url=reverse("order", args=(instance.order_id,)),
+    )
+
+
+def index_for_search(instances):
+    """Creates or refreshes the SearchEntry of each instance in one upsert."""
+    entries = []
+    for instance in instances:
+        document = search_document(instance)
+        document["title"] = document["title"][:400]
+        entries.append(SearchEntry(object_id=instance.pk, **document))
+    if entries:
+        SearchEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["project", "title", "body", "url"],
+        )
+
+
+@receiver(post_save, sender=Part, dispatch_uid="index_part")
+def index_part(sender, instance, **kwargs):
+    # Revision titles carry the part's number and name
+    index_for_search([instance, *instance.revisions.all()])
+
+
+@receiver(post_save, sender=Assembly, dispatch_uid="index_assembly")
+@receiver(post_save, sender=SubAssembly, dispatch_uid="index_subassembly")
+@receiver(post_save, sender=PartRevision, dispatch_uid="index_revision")
+@receiver(post_save, sender=Item, dispatch_uid="index_item")
+def index_saved_object(sender, instance, **kwargs):
+    index_for_search([instance])
+
+
+@receiver(post_delete, sender=Part, dispatch_uid="unindex_part")
+@receiver(post_delete, sender=Assembly, dispatch_uid="unindex_assembly")
+@receiver(post_delete, sender=SubAssembly, dispatch_uid="unindex_subassembly")
+@receiver(post_delete, sender=PartRevision, dispatch_uid="unindex_revision")
+@receiver(post_delete, sender=Item, dispatch_uid="unindex_item")
+def unindex_deleted_object(sender, instance, **kwargs):
+    kind = SearchKind.ASSEMBLY if isinstance(instance, Assembly) else {
+        Part: SearchKind.PART, PartRevision: SearchKind.REVISION, Item: SearchKind.ITEM,
+    }[sender]
+    SearchEntry.objects.filter(kind=kind, object_id=instance.pk).delete()
@@ -0,0 +1,78 @@
+"""
+Sends the Slack outbox.
+
+Order.save() writes a SlackMessage row in the same transaction as the
+status change; the send_slack_messages command claims pending rows in
+batches and posts them, retrying failures with backoff.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_slack import slack_message
+
+from .metrics import SLACK_LATENCY
+from .models import JobStatus, SlackMessage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 8
+RETRY_DELAY = 15  # seconds, doubled after every failed attempt
+STALE_LOCK = timedelta(minutes=5)
+
+
+def claim_batch(size=BATCH_SIZE):
+    """Locks up to size sendable messages and marks them RUNNING."""
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            SlackMessage.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.PENDING, run_after__lte=now)
+                | Q(status=JobStatus.RUNNING, locked_at__lt=now - STALE_LOCK)
+            )
+            .select_related("order")
+            .order_by("id")[:size]
+        )
+        SlackMessage.objects.filter(pk__in=[m.pk for m in messages]).update(status=JobStatus.RUNNING, locked_at=now)
+    return messages
+
+
+def send_message(message):
+    fields = {"locked_at": None}
+    start = time.perf_counter()
+    try:
+        slack_message(message.template, {"order": message.order}, attachments=message.attachments, fail_silently=False)
+    except Exception as e:
+        SLACK_LATENCY.labels("error").observe(time.perf_counter() - start)
+        attempts = message.attempts + 1
+        logger.error(f"Slack message {message.pk} failed (attempt {attempts}/{MAX_ATTEMPTS}): {e}")
+        fields.update(attempts=attempts, last_error=str(e))
+        if attempts >= MAX_ATTEMPTS:
+            fields["status"] = JobStatus.FAILED
+        else:
+            fields.update(status=JobStatus.PENDING, run_after=timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (attempts - 1)))
+    else:
+        SLACK_LATENCY.labels("ok").observe(time.perf_counter() - start)
+        fields.update(status=JobStatus.DONE, last_error="", sent_at=timezone.now())
+
+    SlackMessage.objects.filter(pk=message.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(message, name, value)
+    return message
+
+
+def send_pending(batch_size=BATCH_SIZE):
+    """Sends batches until nothing is due; returns how many messages were attempted."""
+    count = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return count
+        for message in batch:
+            send_message(message)
+        count += len(batch)
@@ -0,0 +1,58 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .constants import *
+from .models import Assembly, Project
+
+
+def number_of(part_number):
+    """The numeric suffix of a part number, e.g. 668-BOT-A-0100 -> 100."""
+    return int(part_number.split("-")[3])
+
+
+def format_part_number(project, kind, number):
+    """kind is "A" for assemblies and "P" for parts."""
+    return f"{TEAM}-{project.prefix}-{kind}-{str(number).zfill(PART_DIGITS)}"
+
+
+def allocate_part_numbers(assembly, count=1):
+    """
+    Reserves a contiguous block of part numbers for an assembly.
+
+    A single UPDATE bumps the assembly's last_part_number counter, which
+    takes the row lock, so concurrent requests (or gunicorn workers) never
+    get overlapping blocks. The counter starts from the assembly's own
+    number, so parts of 668-BOT-A-0100 are numbered 0101, 0102, ...
+
+    The block ends below the next assembly's number (ASM_INCR up); an
+    allocation that would run past it raises ValidationError and reserves
+    nothing.
+    """
+    base = number_of(assembly.part_number)
+    with transaction.atomic():
+        Assembly.objects.filter(pk=assembly.pk).update(
+            last_part_number=Greatest(F("last_part_number"), Value(base)) + count
+        )
+        last = Assembly.objects.filter(pk=assembly.pk).values_list("last_part_number", flat=True).get()
+        if last >= base + ASM_INCR:
+            # Raising inside the atomic block rolls the counter back
+            left = max(base + ASM_INCR - 1 - (last - count), 0)
+            raise ValidationError(
+                f"{assembly.part_number} has {left} part number(s) left, not enough for {count} new part(s)"
+            )
+    assembly.last_part_number = last
+    return range(last - count + 1, last + 1)
+
+
+def allocate_assembly_number(project):
+    """
+    Reserves the next assembly number in a project (ASM_INCR apart, so each
+    assembly owns the block of part numbers below the next one).
+    """
+    with transaction.atomic():
+        Project.objects.filter(pk=project.pk).update(last_assembly_number=F("last_assembly_number") + ASM_INCR)
+        number = Project.objects.filter(pk=project.pk).values_list("last_assembly_number", flat=True).get()
+    project.last_assembly_number = number
+    return number
@@ -1,4 +1,7 @@
+import asyncio
 import base64
+import contextlib
+import contextvars
 import hashlib
 import hmac
 import json
@@ -6,22 +9,116 @@ import logging
 import os
 import random
 import string
+import threading
 import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+from .metrics import record_onshape_call
+
 logger = logging.getLogger(__name__)
 
+# Statuses worth retrying. 429 is always safe to retry since Onshape rejected
+# the call; 5xx is only retried for idempotent methods so a POST that timed
+# out half way doesn't create a second folder/document.
+RETRY_ON_THROTTLE = {429}
+RETRY_ON_SERVER_ERROR = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Returns the process-wide keep-alive session shared by every OnshapeClient."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.environ.get("ONSHAPE_POOL_SIZE", "10"))
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+_shared_async_session = None
+
+def _new_async_session():
+    pool_size = int(os.environ.get("ONSHAPE_POOL_SIZE", "10"))
+    return httpx.AsyncClient(limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+
+def get_async_session():
+    """Returns the ASGI worker's keep-alive httpx client, or None when there isn't one (see open_async_session)."""
+    return _shared_async_session
+
+def open_async_session():
+    """
+    Creates the keep-alive httpx client shared by every AsyncOnshapeClient.
+    Called at ASGI lifespan startup, where one event loop serves the worker
+    for its whole life. Under WSGI each async_to_sync call runs on a new
+    loop, so AsyncOnshapeClient opens and closes a client per call instead.
+    """
+    global _shared_async_session
+    _shared_async_session = _new_async_session()
+
+async def close_async_session():
+    """Closes the shared client; called at ASGI lifespan shutdown."""
+    global _shared_async_session
+    session, _shared_async_session = _shared_async_session, None
+    if session is not None:
+        await session.aclose()
+
 class OnshapeClient:
     def __init__(self):
         self.access_key = os.environ.get("ONSHAPE_ACCESS_KEY")
         self.secret_key = os.environ.get("ONSHAPE_SECRET_KEY")
         self.base_url = os.environ.get("ONSHAPE_BASE_URL", "https://cad.onshape.com")
+        self.timeout = (
+            float(os.environ.get("ONSHAPE_CONNECT_TIMEOUT", "5")),
+            float(os.environ.get("ONSHAPE_READ_TIMEOUT", "30")),
+        )
+        self.max_retries = int(os.environ.get("ONSHAPE_MAX_RETRIES", "3"))
+        self.backoff = float(os.environ.get("ONSHAPE_BACKOFF", "0.5"))
+        self.max_backoff = float(os.environ.get("ONSHAPE_MAX_BACKOFF", "30"))
+        self.batch_workers = int(os.environ.get("ONSHAPE_BATCH_WORKERS", "4"))
+        self.session = get_session()
+        self._local = threading.local()
         
         if not self.access_key or not self.secret_key:
             logger.warning("Onshape credentials not found in environment variables.")
 
+    @property
+    def last_status(self):
+        """Status of this thread's most recent call, so callers can tell a 404 from other failures."""
+        return getattr(self._local, "status", None)
+
+    @last_status.setter
+    def last_status(self, value):
+        self._local.status = value
+
+    def run_batch(self, calls, max_workers=None):
+        """
+        Runs independent calls concurrently and returns their results in order.
+
+        calls is a list of (method, *args) tuples, for example
+        [(client.delete_element, did, wid, eid), ...]. At most max_workers
+        (ONSHAPE_BATCH_WORKERS by default) requests are in flight at once.
+        """
+        calls = list(calls)
+        if len(calls) <= 1:
+            return [func(*args) for func, *args in calls]
+        workers = min(max_workers or self.batch_workers, len(calls))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="onshape") as pool:
+            futures = [pool.submit(func, *args) for func, *args in calls]
+            return [future.result() for future in futures]
+
     def _make_nonce(self):
         chars = string.ascii_letters + string.digits
         return "".join(random.choice(chars) for _ in range(25))
@@ -58,25 +155,82 @@ class OnshapeClient:
             "On-Nonce": nonce,
             "Authorization": auth,
             "Content-Type": ctype,
-            "Accept": "application/vnd.onshape.v1+json",
+            "Accept": headers.get("Accept", "application/vnd.onshape.v1+json"),
         }
 
+    def _retry_delay(self, attempt, response=None):
+        """Exponential backoff with full jitter, honouring Retry-After when present."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    try:
+                        delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                    except (TypeError, ValueError):
+                        delay = None
+                if delay is not None:
+                    return min(max(delay, 0), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _should_retry(self, method, status_code):
+        return status_code in RETRY_ON_THROTTLE or (
+            status_code in RETRY_ON_SERVER_ERROR and method in IDEMPOTENT_METHODS
+        )
+
+    def _record_latency(self, method, endpoint, status, elapsed):
+        """Hook for per-call latency; status is None when no response came back."""
+        logger.info(f"Onshape API {method} {endpoint} -> {status} in {elapsed * 1000:.0f}ms")
+        record_onshape_call(method, endpoint, status, elapsed)
+
+    def _send(self, method, url, endpoint, query, body, accept=None):
+        """Sends the request, retrying throttled and transient failures."""
+        extra = {"Content-Type": "application/json", **({"Accept": accept} if accept else {})}
+        for attempt in range(self.max_retries + 1):
+            retries_left = attempt < self.max_retries
+            # Headers are rebuilt every attempt since the nonce is single use
+            headers = self._make_auth_headers(method, f"/api/{endpoint}", query, extra)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    params=query,
+                    json=body,
+                    timeout=self.timeout,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record_latency(method, endpoint, None, time.perf_counter() - start)
+                # A connect failure never reached Onshape, so it's always safe to retry
+                safe = method in IDEMPOTENT_METHODS or isinstance(e, requests.exceptions.ConnectTimeout)
+                if retries_left and safe:
+                    delay = self._retry_delay(attempt)
+                    logger.warning(f"Onshape API {method} {endpoint} failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                raise
+            self._record_latency(method, endpoint, response.status_code, time.perf_counter() - start)
+
+            if retries_left and self._should_retry(method, response.status_code):
+                delay = self._retry_delay(attempt, response)
+                logger.warning(f"Onshape API {method} {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            return response
+
     def _request(self, method, endpoint, query={}, body=None):
         url = f"{self.base_url}/api/{endpoint}"
-        headers = self._make_auth_headers(method, f"/api/{endpoint}", query, {"Content-Type": "application/json"})
         
         logger.info(f"Onshape API {method} {url}")
         if body:
             logger.info(f"Request body: {json.dumps(body, indent=2)}")
         
+        self.last_status = None
         try:
-            response = requests.request(
-                method,
-                url,
-                headers=headers,
-                params=query,
-                json=body
-            )
+            response = self._send(method, url, endpoint, query, body)
+            self.last_status = response.status_code
             logger.info(f"Response status: {response.status_code}")
             logger.info(f"Response body: {response.text[:500]}")
             
@@ -224,6 +378,20 @@ class OnshapeClient:
         # GET /api/translations/{tid}
         return self._request("GET", f"translations/{translation_id}")
 
+    def download_external_data(self, document_id, external_data_id):
+        """Downloads a finished translation; returns the file contents as bytes, or None."""
+        # GET /api/documents/d/{did}/externaldata/{fid}
+        endpoint = f"documents/d/{document_id}/externaldata/{external_data_id}"
+        self.last_status = None
+        try:
+            response = self._send("GET", f"{self.base_url}/api/{endpoint}", endpoint, {}, None, accept="application/octet-stream")
+            self.last_status = response.status_code
+            response.raise_for_status()
+            return response.content
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Onshape download of {external_data_id} failed: {e}")
+            return None
+
     def register_webhook(self, url, events=["onshape.model.translation.complete"]):
         """Registers a webhook."""
         # POST /api/webhooks
@@ -235,3 +403,122 @@ class OnshapeClient:
             }
         }
         return self._request("POST", "webhooks", body=body)
+
+
+_async_status = contextvars.ContextVar("onshape_last_status", default=None)
+
+class AsyncOnshapeClient(OnshapeClient):
+    """
+    asyncio variant of OnshapeClient for async views, so a slow Onshape call
+    parks a coroutine instead of a whole worker.
+
+    Configuration, request signing and the retry policy are shared with
+    OnshapeClient; every API method is awaited instead of called, e.g.
+    ``workspace = await client.get_document_workspace(did)``.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.session = None  # _send uses the shared client or one per call
+
+    @property
+    def last_status(self):
+        """Status of this task's most recent call."""
+        return _async_status.get()
+
+    @last_status.setter
+    def last_status(self, value):
+        _async_status.set(value)
+
+    async def run_batch(self, calls, max_workers=None):
+        """Awaits independent calls concurrently, at most max_workers at a time, returning results in order."""
+        semaphore = asyncio.Semaphore(max_workers or self.batch_workers)
+
+        async def run(func, *args):
+            async with semaphore:
+                return await func(*args)
+
+        return await asyncio.gather(*(run(func, *args) for func, *args in calls))
+
+    async def _send(self, method, url, endpoint, query, body, accept=None):
+        """Sends the request, retrying throttled and transient failures."""
+        shared = get_async_session()
+        connect_timeout, read_timeout = self.timeout
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        extra = {"Content-Type": "application/json", **({"Accept": accept} if accept else {})}
+        # Responses are read in full, so a per-call client can close on return
+        async with contextlib.nullcontext(shared) if shared else _new_async_session() as session:
+            for attempt in range(self.max_retries + 1):
+                retries_left = attempt < self.max_retries
+                headers = self._make_auth_headers(method, f"/api/{endpoint}", query, extra)
+                start = time.perf_counter()
+                try:
+                    response = await session.request(method, url, headers=headers, params=query, json=body, timeout=timeout)
+                except httpx.TransportError as e:
+                    self._record_latency(method, endpoint, None, time.perf_counter() - start)
+                    safe = method in IDEMPOTENT_METHODS or isinstance(e, httpx.ConnectTimeout)
+                    if retries_left and safe:
+                        delay = self._retry_delay(attempt)
+                        logger.warning(f"Onshape API {method} {endpoint} failed ({e!r}), retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    raise
+                self._record_latency(method, endpoint, response.status_code, time.perf_counter() - start)
+
+                if retries_left and self._should_retry(method, response.status_code):
+                    delay = self._retry_delay(attempt, response)
+                    logger.warning(f"Onshape API {method} {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                return response
+
+    async def _request(self, method, endpoint, query={}, body=None):
+        url = f"{self.base_url}/api/{endpoint}"
+        logger.info(f"Onshape API {method} {url}")
+
+        self.last_status = None
+        try:
+            response = await self._send(method, url, endpoint, query, body)
+            self.last_status = response.status_code
+            response.raise_for_status()
+            if not response.text or response.text.strip() == "":
+                return {}
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"Onshape API request failed: {e!r}")
+            if isinstance(e, httpx.HTTPStatusError):
+                logger.error(f"Response: {e.response.text}")
+            return None
+
+    # The endpoint methods inherited from OnshapeClient return self._request(...)
+    # directly, so they already return awaitables. Only the ones that look at
+    # the result need async versions.
+
+    async def get_document_workspace(self, document_id):
+        """Gets the default workspace of a document."""
+        workspaces = await self._request("GET", f"documents/{document_id}/workspaces")
+        if workspaces and len(workspaces) > 0:
+            return workspaces[0]
+        return None
+
+    async def download_external_data(self, document_id, external_data_id):
+        """Downloads a finished translation; returns the file contents as bytes, or None."""
+        endpoint = f"documents/d/{document_id}/externaldata/{external_data_id}"
+        self.last_status = None
+        try:
+            response = await self._send("GET", f"{self.base_url}/api/{endpoint}", endpoint, {}, None, accept="application/octet-stream")
+            self.last_status = response.status_code
+            response.raise_for_status()
+            return response.content
+        except httpx.HTTPError as e:
+            logger.error(f"Onshape download of {external_data_id} failed: {e!r}")
+            return None
+
+    async def move_document_to_folder(self, document_id, folder_id):
+        result = await self._request("POST", f"globaltreenodes/folder/{folder_id}", body={
+            "itemsToMove": [{
+                "resourceType": "document",
+                "id": document_id
+            }]
+        })
+        return result is not None
@@ -7,51 +7,46 @@ from django.contrib.auth.decorators import login_required
 from .models import *
 from .forms import *
 from .constants import *
+from .pagination import request_page
 
 @login_required
 def orders(request):
     return render(request, "orders.html")
 
+# Status and listing order of each orders tab; open orders by vendor, the rest newest first
+ORDER_TABS = {
+    "ready": (OrderStatus.READY, ["-vendor", "-id"]),
+    "new": (OrderStatus.NEW, ["-vendor", "-id"]),
+    "placed": (OrderStatus.PLACED, ["-order_placed_date", "-id"]),
+    "received": (OrderStatus.RECEIVED, ["-order_recv_date", "-id"]),
+}
+
 @login_required
 def orders_filters(request, filter):
-    
-    orders = Order.objects.all()
-
-    for order in orders:
-        items = order.item_set.all()
-        total = 0
-        for item in items:
-            total = total + (item.unit_price * item.quantity)
-        order.order_total = total
-        order.save()
-
-    match filter:
-        case "ready":
-            order_list = orders.filter(status__exact = OrderStatus.READY.value)
-        case "new":
-            order_list = orders.filter(status__exact = OrderStatus.NEW.value)
-        case "placed":
-            order_list = orders.filter(status__exact = OrderStatus.PLACED.value)
-        case "received":
-            order_list = orders.filter(status__exact = OrderStatus.RECEIVED.value)
-
-    if order_list:
-        order_list = order_list.order_by(F("vendor").desc())
-
-    context = {"order_list": order_list,
+    if filter in ORDER_TABS:
+        status, ordering = ORDER_TABS[filter]
+        orders = Order.objects.filter(status=status)
+    else:
+        ordering = ["id"]
+        orders = Order.objects.none()
+    page = request_page(request, orders, ordering)
+
+    context = {"order_list": page,
+               "page": page,
                "current_filter": filter,
                }
 
-    return render(request, "orders_filter.html", context)
+    return render(request, "orders_filter_rows.html" if "cursor" in request.GET else "orders_filter.html", context)
 
 @login_required
 def order(request, order_id):
     order = get_object_or_404(Order, pk=order_id)
-    item_list = order.item_set.all()
-    context = {"item_list": item_list,
+    page = request_page(request, order.item_set.select_related("requested_by"), ["id"])
+    context = {"item_list": page,
+               "page": page,
                "order": order,
                "auto_add": auto_add_available(order.vendor)}
-    return render(request, "order.html", context)
+    return render(request, "order_item_rows.html" if "cursor" in request.GET else "order.html", context)
 
 @login_required
 def editorder(request, order_id):
@@ -80,7 +75,7 @@ def delete(request, order_id = None, item_id = None):
         item.delete(keep_parents=True)
         return HttpResponseRedirect(reverse("order",args=(order_id,)))
     elif order_id:
-        if not (request.user.groups.filter(name='leads').exists() or request.user.groups.filter(name='mentors').exists()):
+        if not (request.roles.is_lead or request.roles.is_mentor):
             return HttpResponseRedirect(reverse("orders"))
             
         order = get_object_or_404(Order, pk=order_id)
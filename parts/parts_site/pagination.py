@@ -0,0 +1,105 @@
+"""
+Keyset (cursor) pagination for the long listings.
+
+A page is the first `size` rows after the previous page's last row in a
+fixed ordering, fetched as WHERE (keys) > (last keys) ORDER BY keys LIMIT
+size + 1. That costs the same on page 1 and page 500, and rows added or
+removed meanwhile don't shift later pages the way OFFSET does. The
+ordering must end in a unique field (normally id). Nullable keys sort last
+in either direction. Cursors are the last row's key values, signed so a
+tampered cursor is rejected instead of producing an odd query.
+"""
+import datetime
+
+from django.core import signing
+from django.core.exceptions import BadRequest
+from django.db.models import F, Q
+
+from .constants import LIST_PAGE_SIZE
+
+CURSOR_SALT = "parts_site.pagination"
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _keys(model, ordering):
+    """[(field, descending)] for an ordering like ["-order_placed_date", "-id"]."""
+    return [(model._meta.get_field(key.lstrip("-")), key.startswith("-")) for key in ordering]
+
+
+def _after(keys, values):
+    """Q for the rows that come after values in the ordering."""
+    after = Q(pk__in=[])
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        name = field.name
+        if value is None:
+            # Nothing sorts after NULL at this key; only ties carry on
+            equal &= Q(**{f"{name}__isnull": True})
+            continue
+        beyond = Q(**{f"{name}__lt" if descending else f"{name}__gt": value})
+        if field.null:
+            beyond |= Q(**{f"{name}__isnull": True})
+        after |= equal & beyond
+        equal &= Q(**{name: value})
+    return after
+
+
+def _encode(values):
+    return signing.dumps(
+        [value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value for value in values],
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def _decode(keys, cursor):
+    try:
+        values = signing.loads(cursor, salt=CURSOR_SALT)
+        if len(values) != len(keys):
+            raise ValueError(cursor)
+        return [None if value is None else field.to_python(value) for (field, _), value in zip(keys, values)]
+    except (signing.BadSignature, ValueError, TypeError) as e:
+        raise BadRequest(f"Invalid cursor: {e}")
+
+
+def keyset_queryset(queryset, ordering, cursor=None):
+    """queryset in ordering, starting after cursor; slice it to get a page."""
+    keys = _keys(queryset.model, ordering)
+    if cursor:
+        queryset = queryset.filter(_after(keys, _decode(keys, cursor)))
+    return queryset.order_by(*[
+        F(field.name).desc(nulls_last=True) if descending else F(field.name).asc(nulls_last=True)
+        for field, descending in keys
+    ])
+
+
+def keyset_page(queryset, ordering, cursor=None, size=None):
+    """The page of queryset in ordering that starts after cursor (or the first page)."""
+    size = size or LIST_PAGE_SIZE
+    keys = _keys(queryset.model, ordering)
+    items = list(keyset_queryset(queryset, ordering, cursor)[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = _encode([getattr(items[-1], field.attname) for field, _ in keys])
+    return KeysetPage(items, next_cursor)
+
+
+def request_page(request, queryset, ordering, size=None):
+    """keyset_page for the ?cursor= of a request."""
+    return keyset_page(queryset, ordering, request.GET.get("cursor"), size)
@@ -0,0 +1,85 @@
+from collections import defaultdict
+
+from .models import Assembly, SubAssembly, Part
+
+
+def annotate_part(part):
+    """Copies the latest revision's fields onto the part for the list templates."""
+    revision = part.latest_revision
+    if revision:
+        part.current_status = revision.status
+        part.current_status_display = revision.get_status_display()
+        part.current_mfg_type = revision.mfg_type
+        part.current_mfg_type_display = revision.get_mfg_type_display()
+        part.current_material = revision.material
+        part.current_quantity = revision.quantity
+        part.current_drawing = revision.drawing
+    else:
+        part.current_status = None
+        part.current_status_display = "No revisions"
+        part.current_mfg_type = None
+        part.current_mfg_type_display = "Not specified"
+        part.current_material = None
+        part.current_quantity = None
+        part.current_drawing = None
+    return part
+
+
+def part_queryset():
+    """Parts with everything the list templates dereference joined in."""
+    return Part.objects.select_related(
+        "assembly",
+        "latest_revision",
+        "latest_revision__owner",
+    ).order_by("id")
+
+
+def load_project_tree(project):
+    """
+    Returns (assembly_list, parts_list) for every assembly in a project.
+
+    Top level assemblies are listed in id order, each followed by its direct
+    sub-assemblies (as SubAssembly instances so the parent is available).
+    Parts are grouped by assembly in the same order. The whole tree is
+    loaded in three queries regardless of project size.
+    """
+    subs_by_parent = defaultdict(list)
+    sub_ids = set()
+    for sub in SubAssembly.objects.filter(project=project).select_related("assembly").order_by("id"):
+        subs_by_parent[sub.assembly_id].append(sub)
+        sub_ids.add(sub.pk)
+
+    assembly_list = []
+    for a in Assembly.objects.filter(project=project).order_by("id"):
+        if a.pk not in sub_ids:
+            assembly_list.append(a)
+        assembly_list.extend(subs_by_parent[a.pk])
+
+    parts_by_assembly = defaultdict(list)
+    for part in part_queryset().filter(assembly__project=project):
+        parts_by_assembly[part.assembly_id].append(annotate_part(part))
+
+    parts_list = []
+    for a in assembly_list:
+        parts_list.extend(parts_by_assembly[a.pk])
+
+    return assembly_list, parts_list
+
+
+def load_assembly_tree(assembly):
+    """Returns (assembly_list, parts_list) for the direct children of an assembly."""
+    assembly_list = list(assembly.sub.select_related("assembly").order_by("id"))
+    parts_list = [annotate_part(part) for part in part_queryset().filter(assembly=assembly)]
+    return assembly_list, parts_list
+
+
+def assembly_subtree_ids(assembly):
+    """Ids of an assembly and every assembly below it, from one query over the project."""
+    children = defaultdict(list)
+    for sub_id, parent_id in SubAssembly.objects.filter(project_id=assembly.project_id).values_list("id", "assembly_id"):
+        children[parent_id].append(sub_id)
+
+    ids = [assembly.pk]
+    for assembly_id in ids:
+        ids.extend(children[assembly_id])
+    return ids
@@ -0,0 +1,129 @@
+"""
+Request-scoped user roles.
+
+RoleMiddleware gives every request a lazy request.roles, resolved at most
+once per request. The user's group names are kept in the session along
+with the role versions they were read at. Changing a user's groups bumps
+that user's version, and renaming or deleting a group bumps the global one,
+so the next request reads them again. ROLE_CACHE_TIMEOUT bounds how stale a
+session can get when the cache isn't shared between workers.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .metrics import record_cache_lookup
+
+LEAD_GROUP = "leads"
+MENTOR_GROUP = "mentors"
+SESSION_KEY = "_roles"
+GLOBAL_VERSION_KEY = "roles-version"
+
+
+class Roles:
+    """The group names a user belongs to, with flags for the ones the site checks."""
+
+    def __init__(self, groups=()):
+        self.groups = frozenset(groups)
+
+    @property
+    def is_lead(self):
+        return LEAD_GROUP in self.groups
+
+    @property
+    def is_mentor(self):
+        return MENTOR_GROUP in self.groups
+
+    def __repr__(self):
+        return f"Roles({sorted(self.groups)})"
+
+
+NO_ROLES = Roles()
+
+
+def _user_version_key(user_id):
+    return f"roles-version:{user_id}"
+
+
+def _versions(user_id):
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    versions = cache.get_many(keys)
+    return [versions.get(key) for key in keys]
+
+
+def roles_for(user):
+    """Reads a user's roles straight from the database."""
+    if not user.is_authenticated:
+        return NO_ROLES
+    return Roles(user.groups.values_list("name", flat=True))
+
+
+def get_roles(request):
+    """The request user's roles, from the session when they are still current."""
+    user = request.user
+    if not user.is_authenticated:
+        return NO_ROLES
+
+    versions = _versions(user.pk)
+    cached = request.session.get(SESSION_KEY)
+    if (
+        cached
+        and cached["user"] == user.pk
+        and cached["versions"] == versions
+        and time.time() - cached["at"] < settings.ROLE_CACHE_TIMEOUT
+    ):
+        record_cache_lookup("roles", True)
+        return Roles(cached["groups"])
+
+    record_cache_lookup("roles", False)
+    roles = roles_for(user)
+    request.session[SESSION_KEY] = {
+        "user": user.pk,
+        "versions": versions,
+        "groups": sorted(roles.groups),
+        "at": time.time(),
+    }
+    return roles
+
+
+def invalidate_roles(user_ids=None):
+    """Makes sessions re-read their roles: for the given users, or everyone if user_ids is None."""
+    # A fresh timestamp rather than a counter, so an evicted version can't repeat
+    version = time.time_ns()
+    if user_ids is None:
+        cache.set(GLOBAL_VERSION_KEY, version, None)
+    else:
+        cache.set_many({_user_version_key(user_id): version for user_id in user_ids}, None)
+
+
+def roles_context(request):
+    """Context processor exposing is_lead and is_mentor to templates."""
+    roles = getattr(request, "roles", NO_ROLES)
+    return {"is_lead": roles.is_lead, "is_mentor": roles.is_mentor}
+
+
+class RoleMiddleware:
+    """Sets request.roles; must come after AuthenticationMiddleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.roles = SimpleLazyObject(lambda: get_roles(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Still lazy: views that read request.roles do so from sync code
+        request.roles = SimpleLazyObject(lambda: get_roles(request))
+        return await self.get_response(request)
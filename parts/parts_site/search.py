@@ -0,0 +1,66 @@
+"""
+Ranked search over SearchEntry.
+
+Every word of the query must match the start of a word in an entry, so
+results narrow as the user types. PostgreSQL matches the GIN-indexed
+search_vector and ranks with ts_rank; SQLite matches the FTS5 table and
+ranks with bm25. Titles (part numbers and names) weigh more than bodies
+on both. Other databases fall back to unindexed icontains.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import SearchEntry
+
+FTS_TABLE = "parts_site_searchentry_fts"
+RESULT_LIMIT = 20
+MAX_TERMS = 8
+
+
+def search_terms(query):
+    # Word characters only, which leaves nothing for tsquery or FTS5 syntax to trip over
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _search_postgres(terms, limit):
+    query = SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config="simple")
+    return list(
+        SearchEntry.objects.select_related("project")
+        .filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "title")[:limit]
+    )
+
+
+def _search_sqlite(terms, limit):
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s",
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    entries = SearchEntry.objects.select_related("project").in_bulk(ids)
+    return [entries[pk] for pk in ids if pk in entries]
+
+
+def _search_unindexed(terms, limit):
+    entries = SearchEntry.objects.select_related("project")
+    for term in terms:
+        entries = entries.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    return list(entries.order_by("title")[:limit])
+
+
+def search_entries(query, limit=RESULT_LIMIT):
+    """The best matching SearchEntry rows for query, best first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == "postgresql":
+        return _search_postgres(terms, limit)
+    if connection.vendor == "sqlite":
+        return _search_sqlite(terms, limit)
+    return _search_unindexed(terms, limit)
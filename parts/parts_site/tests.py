@@ -1,3 +1,1456 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from unittest import mock, skipUnless
+
+import httpx
+import requests
+from asgiref.sync import ThreadSensitiveContext, async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from .models import *
+from . import jobs, metrics, onshape
+from .bulk import create_parts
+from .forms import OrderFormEdit, PartRevisionForm
+from .media_views import _aiter, stream_zip
+from .jobs import ProvisioningError, claim_job, enqueue_assembly, enqueue_part, run_job, run_pending
+from .notifications import send_pending
+from .search import search_entries
+from .onshape import AsyncOnshapeClient, OnshapeClient
+from .project_tree import load_project_tree, load_assembly_tree
+from .roles import RoleMiddleware, Roles
+
+User = get_user_model()
+
+
+def make_project(prefix="TST"):
+    project = Project.objects.create(name="Robot", description="Robot", prefix=prefix)
+    tla = Assembly.objects.create(project=project, part_number=f"668-{prefix}-A-0000", name="Top Level Assembly", description="Robot")
+    return project, tla
+
+
+def make_part(assembly, number, owner=None):
+    part = Part.objects.create(assembly=assembly, part_number=f"668-TST-P-{number:04d}", name=f"Part {number}", description="")
+    PartRevision.objects.create(part=part, revision_number="A", status=PartStatus.NEW, owner=owner)
+    return part
+
 
 # Create your tests here.
+
+class ProjectTreeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", password="pw", first_name="A", last_name="B")
+        self.project, self.tla = make_project()
+        self.drivetrain = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0100", name="Drivetrain", description="")
+        self.gearbox = SubAssembly.objects.create(project=self.project, assembly=self.drivetrain, part_number="668-TST-A-0200", name="Gearbox", description="")
+        for i, assembly in enumerate([self.tla, self.drivetrain, self.gearbox] * 5):
+            make_part(assembly, i + 1, owner=self.user)
+
+    def test_project_tree_lists_every_assembly_once(self):
+        assembly_list, parts_list = load_project_tree(self.project)
+        self.assertEqual([a.pk for a in assembly_list], [self.tla.pk, self.drivetrain.pk, self.gearbox.pk])
+        self.assertIsInstance(assembly_list[1], SubAssembly)
+        self.assertEqual(len(parts_list), 15)
+
+    def test_project_tree_query_count_is_constant(self):
+        with self.assertNumQueries(3):
+            assembly_list, parts_list = load_project_tree(self.project)
+            for a in assembly_list:
+                getattr(a, "assembly", None)
+            for part in parts_list:
+                part.assembly.name
+                part.latest_revision.owner.first_name
+
+    def test_assembly_tree_query_count_is_constant(self):
+        with self.assertNumQueries(2):
+            assembly_list, parts_list = load_assembly_tree(self.drivetrain)
+            for a in assembly_list:
+                a.assembly.name
+            for part in parts_list:
+                part.latest_revision.owner.first_name
+
+    def test_project_view_does_not_scale_with_parts(self):
+        self.client.force_login(self.user)
+        url = reverse("project", args=(self.project.id,))
+        self.client.get(reverse("projects"))
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(20):
+                make_part(self.gearbox, 100 + i, owner=self.user)
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(before), len(after))
+
+
+class TreeCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        self.part = make_part(self.tla, 1)
+        self.url = reverse("project", args=(self.project.id,))
+        self.client.force_login(self.user)
+
+    def part_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, [q for q in queries if "parts_site_part" in q["sql"]]
+
+    def test_unchanged_project_is_served_from_cache(self):
+        _, first = self.part_queries()
+        response, second = self.part_queries()
+        self.assertTrue(first)
+        self.assertEqual(second, [])
+        self.assertContains(response, self.part.part_number)
+
+    def test_revision_change_invalidates_project_table(self):
+        self.part_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            PartRevision.objects.create(part=self.part, revision_number="B", status=PartStatus.IN_DESIGN)
+        response, queries = self.part_queries()
+        self.assertTrue(queries)
+        self.assertContains(response, PartStatus.IN_DESIGN.label)
+
+    def test_delete_buttons_are_cached_per_role(self):
+        self.client.get(self.url)
+        lead = User.objects.create_user(username="lead", password="pw")
+        lead.groups.create(name="leads")
+        self.client.force_login(lead)
+        response = self.client.get(self.url)
+        self.assertContains(response, f"/assembly/{self.tla.id}/delete")
+
+
+class RoleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="lead", password="pw")
+        self.user.groups.create(name="students")
+        self.user.groups.create(name="leads")
+        self.project, self.tla = make_project()
+        self.url = reverse("project", args=(self.project.id,))
+        self.client.force_login(self.user)
+
+    def group_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [q for q in queries if "auth_group" in q["sql"]]
+
+    def test_roles_are_read_once_per_session(self):
+        response, first = self.group_queries()
+        self.assertTrue(first)
+        # Any membership counts, not just the first group
+        self.assertContains(response, f"/assembly/{self.tla.id}/delete")
+        response, second = self.group_queries()
+        self.assertEqual(second, [])
+
+    def test_group_changes_reach_existing_sessions(self):
+        self.group_queries()
+        self.user.groups.remove(Group.objects.get(name="leads"))
+        response, queries = self.group_queries()
+        self.assertTrue(queries)
+        self.assertNotContains(response, f"/assembly/{self.tla.id}/delete")
+
+        Group.objects.get(name="students").user_set.add(User.objects.create_user(username="other"))
+        Group.objects.create(name="mentors").user_set.add(self.user)
+        response, queries = self.group_queries()
+        self.assertTrue(queries)
+        self.assertContains(response, f"/assembly/{self.tla.id}/delete")
+
+    async def test_middleware_runs_async_under_asgi(self):
+        async def get_response(request):
+            is_lead = await sync_to_async(lambda: request.roles.is_lead)()
+            return HttpResponse(str(is_lead))
+
+        middleware = RoleMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get(self.url)
+        request.user, request.session = self.user, {}
+        response = await middleware(request)
+        self.assertEqual(response.content, b"True")
+
+    def test_revision_form_checks_roles(self):
+        data = {"status": PartStatus.DESIGN_REVIEWED}
+        self.assertIn("Status", PartRevisionForm(data=data).errors)
+        self.assertNotIn("Status", PartRevisionForm(data=data, roles=Roles(["mentors"])).errors)
+
+
+class AsyncMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="lead", password="pw")
+        self.user.groups.create(name="leads")
+        self.project, self.tla = make_project()
+        self.url = reverse("project", args=(self.project.id,))
+
+    async def test_middleware_stack_stays_async_under_asgi(self):
+        # A sync-only middleware would run the whole stack above it on a thread
+        calls = []
+        acall = metrics.MetricsMiddleware.__acall__
+
+        async def spy(middleware, request):
+            calls.append(request.path)
+            return await acall(middleware, request)
+
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(metrics.MetricsMiddleware, "__acall__", spy):
+            response = await self.async_client.get(self.url)
+        self.assertEqual(calls, [self.url])
+        self.assertContains(response, f"/assembly/{self.tla.id}/delete")
+
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    async def test_static_files_are_served_on_the_async_path(self):
+        response = await self.async_client.get("/static/assets/js/jquery-1.8.3.min.js")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"jQuery", b"".join(response.streaming_content))
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        self.part = make_part(self.tla, 1)
+        Part.objects.filter(pk=self.part.pk).update(name="Intake Roller")
+        self.part.refresh_from_db()
+        self.part.description = "Polycarbonate roller"
+        self.part.save()
+        self.revision = self.part.revisions.get()
+        self.revision.notes = "Swap to a thicker intake plate"
+        self.revision.save()
+        order = Order.objects.create(vendor="WCP")
+        self.item = Item.objects.create(name="Intake bearing", vendor="WCP", order=order, part_number="WCP-0081",
+                                        unit_price=1, quantity=1, justification="", requested_by=self.user)
+        self.client.force_login(self.user)
+
+    def titles(self, query):
+        return [entry.title for entry in search_entries(query)]
+
+    def test_prefix_search_ranks_titles_first(self):
+        bracket = make_part(self.tla, 2)
+        bracket.description = "Mounts under the intake"
+        bracket.save()
+        titles = self.titles("intake")
+        self.assertEqual(set(titles[:3]), {"668-TST-P-0001 Intake Roller", "668-TST-P-0001 Intake Roller Rev A", "WCP-0081 Intake bearing"})
+        self.assertEqual(titles[3:], ["668-TST-P-0002 Part 2"])
+        self.assertEqual(self.titles("rol 668"), ["668-TST-P-0001 Intake Roller", "668-TST-P-0001 Intake Roller Rev A"])
+        self.assertEqual(self.titles("Top Lev"), ["668-TST-A-0000 Top Level Assembly"])
+        self.assertEqual(self.titles("wcp-0081"), ["WCP-0081 Intake bearing"])
+        self.assertEqual(self.titles('"* OR ( NOT'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.part.name = "Shooter Flywheel"
+        self.part.save()
+        self.assertEqual(self.titles("flywheel"), ["668-TST-P-0001 Shooter Flywheel", "668-TST-P-0001 Shooter Flywheel Rev A"])
+        self.assertNotIn("668-TST-P-0001 Intake Roller", self.titles("intake"))
+
+        self.item.delete()
+        self.part.delete()
+        self.assertEqual(self.titles("flywheel bearing"), [])
+        self.assertEqual(SearchEntry.objects.count(), 1)
+
+    def test_bulk_created_parts_are_indexed(self):
+        create_parts(self.tla, [("Climber Hook", ""), ("Climber Winch", "")])
+        self.assertEqual(len(self.titles("climber")), 4)
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        out = io.StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 4 object(s)", out.getvalue())
+        self.assertIn("WCP-0081 Intake bearing", self.titles("bearing"))
+
+    def test_type_ahead_and_page(self):
+        url = reverse("search")
+        response = self.client.get(url, {"q": "roll"}, headers={"hx-request": "true"})
+        self.assertNotContains(response, "<html")
+        self.assertContains(response, reverse("part", args=(self.project.id, self.tla.id, self.part.id)))
+        response = self.client.get(url, {"q": "roll"})
+        self.assertContains(response, "<html")
+        self.assertContains(response, "Polycarbonate roller")
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        self.client.force_login(self.user)
+
+    def test_requests_are_timed_by_url_name(self):
+        labels = {"view": "project", "method": "GET", "status": "200"}
+        before = sample("parts_request_duration_seconds_count", **labels)
+        queries = sample("parts_request_db_queries_sum", view="project")
+        self.client.get(reverse("project", args=(self.project.id,)))
+        self.assertEqual(sample("parts_request_duration_seconds_count", **labels), before + 1)
+        self.assertGreater(sample("parts_request_db_queries_sum", view="project"), queries)
+
+        before = sample("parts_request_duration_seconds_count", view="<unmatched>", method="GET", status="404")
+        self.client.get("/no-such-page/")
+        self.assertEqual(sample("parts_request_duration_seconds_count", view="<unmatched>", method="GET", status="404"), before + 1)
+
+    async def test_async_requests_count_their_queries(self):
+        async def get_response(request):
+            # The async ORM runs on the request's sync thread, not the event loop's
+            await Project.objects.acount()
+            return HttpResponse()
+
+        middleware = metrics.MetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        before = sample("parts_request_db_queries_sum", view="<unmatched>")
+        response = await middleware(RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sample("parts_request_db_queries_sum", view="<unmatched>"), before + 1)
+
+    def test_cache_lookups(self):
+        url = reverse("project", args=(self.project.id,))
+        self.client.get(url)
+        hits = sample("parts_cache_lookups_total", cache="tree", result="hit")
+        self.client.get(url)
+        self.assertEqual(sample("parts_cache_lookups_total", cache="tree", result="hit"), hits + 1)
+        self.assertGreater(sample("parts_cache_lookups_total", cache="roles", result="hit"), 0)
+
+    @mock.patch("parts_site.onshape.time.sleep")
+    def test_onshape_calls_are_labelled_without_ids(self, sleep):
+        client = OnshapeClient()
+        labels = {"method": "GET", "endpoint": "documents/:id/workspaces", "status": "200"}
+        before = sample("parts_onshape_request_duration_seconds_count", **labels)
+        with mock.patch.object(client.session, "request", return_value=fake_response(200, '[{"id": "w1"}]')):
+            client.get_document_workspace("0123456789abcdef01234567")
+        self.assertEqual(sample("parts_onshape_request_duration_seconds_count", **labels), before + 1)
+
+    @override_settings(METRICS_TOKEN="scrape")
+    def test_endpoint_access(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "parts_request_duration_seconds_bucket")
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_multiprocess_files_are_added_up(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        script = "from parts_site.metrics import record_cache_lookup; record_cache_lookup('tree', True)"
+        for directory in (root, os.path.join(root, "worker")):
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory}
+            subprocess.run([sys.executable, "-c", script], check=True, env=env, cwd=settings.BASE_DIR)
+
+        with mock.patch("parts_site.metrics.MULTIPROC_DIR", root):
+            registry = metrics._registry()
+        self.assertEqual(registry.get_sample_value("parts_cache_lookups_total", {"cache": "tree", "result": "hit"}), 2)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+
+    def test_benchmark_reports_both_runs(self):
+        User.objects.create_superuser(username="admin", password="pw")
+        project, tla = make_project()
+        make_part(tla, 1)
+        out = io.StringIO()
+        cache.set("unrelated", 1)
+        call_command("benchmark_project_page", project.id, requests=2, stdout=out)
+        self.assertIn("new connection per request", out.getvalue())
+        self.assertIn("CONN_MAX_AGE=", out.getvalue())
+
+        generation = cache.get(f"project-tree-gen:{project.id}")
+        call_command("benchmark_project_page", project.id, requests=2, cold=True, stdout=io.StringIO())
+        # Bumped before each timed request of both runs
+        self.assertEqual(cache.get(f"project-tree-gen:{project.id}"), generation + 4)
+        self.assertEqual(cache.get("unrelated"), 1)
+
+    def test_fresh_run_connects_once_per_request(self):
+        User.objects.create_superuser(username="admin", password="pw")
+        project, tla = make_project()
+        out = io.StringIO()
+        if connection.vendor == "sqlite":
+            # Really close the in-memory test database's connections; the
+            # keeper holds the shared-cache database open in between
+            keeper = sqlite3.connect(connection.settings_dict["NAME"], uri=True)
+            self.addCleanup(keeper.close)
+            self.enterContext(mock.patch.object(type(connections["default"]), "is_in_memory_db", return_value=False))
+        call_command("benchmark_project_page", project.id, requests=3, stdout=out)
+        lines = out.getvalue().splitlines()
+        fresh = next(line for line in lines if line.startswith("new connection per request"))
+        persistent = next(line for line in lines if line.startswith("CONN_MAX_AGE=") or line.startswith("persistent"))
+        self.assertTrue(fresh.endswith(" 3 connections"), fresh)
+        self.assertTrue(persistent.endswith(" 0 connections"), persistent)
+
+
+class ExplainHotQueriesTests(TestCase):
+
+    def test_reports_every_query_and_rolls_back_the_seed(self):
+        out = io.StringIO()
+        call_command("explain_hot_queries", parts=100, stdout=out)
+        self.assertIn("Seeded 100 parts", out.getvalue())
+        for label in ("orders tab placed", "mfg filter todo", "mfg drawings zip", "latest revision of part"):
+            self.assertIn(label, out.getvalue())
+        self.assertFalse(Project.objects.exists())
+
+    @skipUnless(connection.vendor == "sqlite", "plans depend on the database")
+    def test_hot_queries_use_indexes_on_sqlite(self):
+        out = io.StringIO()
+        call_command("explain_hot_queries", parts=500, strict=True, stdout=out)
+        self.assertIn("order_status_vendor_idx", out.getvalue())
+        self.assertNotIn("NO INDEX", out.getvalue())
+
+
+class SlackOutboxTests(TestCase):
+
+    def setUp(self):
+        Order.objects.create(vendor="WCP", order_total=12.5)
+        self.order = Order.objects.get()
+
+    def test_status_change_is_queued_without_rereading_the_order(self):
+        self.order.status = OrderStatus.READY
+        with mock.patch("parts_site.notifications.slack_message") as send, CaptureQueriesContext(connection) as queries:
+            self.order.save()
+        send.assert_not_called()
+        self.assertFalse([q for q in queries if q["sql"].startswith("SELECT")])
+        message = SlackMessage.objects.get()
+        self.assertEqual(message.order, self.order)
+        self.assertEqual(message.attachments[0]["title"], "WCP order is ready to order")
+
+        # Saving again without a transition queues nothing
+        self.order.tracking = "1Z"
+        self.order.save()
+        self.assertEqual(SlackMessage.objects.count(), 1)
+
+    def test_worker_sends_and_retries(self):
+        self.order.status = OrderStatus.PLACED
+        self.order.save()
+        with mock.patch("parts_site.notifications.slack_message", side_effect=requests.exceptions.ConnectionError("down")):
+            self.assertEqual(send_pending(), 1)
+        message = SlackMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), (JobStatus.PENDING, 1))
+        self.assertGreater(message.run_after, timezone.now())
+
+        SlackMessage.objects.update(run_after=timezone.now())
+        with mock.patch("parts_site.notifications.slack_message") as send:
+            send_pending()
+        send.assert_called_once()
+        self.assertEqual(send.call_args.kwargs["attachments"][0]["title"], "WCP order is placed")
+        self.assertEqual(SlackMessage.objects.get().status, JobStatus.DONE)
+
+
+class OrderTotalTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.order = Order.objects.create(vendor="WCP", tax=1.0, shipping=2.0)
+
+    def add_item(self, price, quantity):
+        return Item.objects.create(name="Bearing", vendor="WCP", order=self.order, part_number="WCP-1",
+                                   unit_price=price, quantity=quantity, justification="", requested_by=self.user)
+
+    def test_total_follows_item_changes(self):
+        item = self.add_item(2.5, 4)
+        self.add_item(1.0, 3)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_total, 16.0)
+
+        item.quantity = 2
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_total, 11.0)
+
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_total, 6.0)
+
+    def test_stale_order_instance_keeps_stored_charges(self):
+        item = self.add_item(2.0, 1)
+        Order.objects.filter(pk=self.order.pk).update(tax=5.0)
+        item.quantity = 2
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_total, 11.0)
+
+    def test_edit_form_totals_in_the_database(self):
+        def save_form():
+            form = OrderFormEdit({"status": OrderStatus.READY, "tax": 0.5, "shipping": 1.5}, instance=Order.objects.get(pk=self.order.pk))
+            self.assertTrue(form.is_valid(), form.errors)
+            with CaptureQueriesContext(connection) as queries:
+                form.save()
+            return len(queries)
+
+        self.add_item(1.0, 2)
+        few = save_form()
+        for _ in range(30):
+            self.add_item(1.0, 1)
+        Order.objects.filter(pk=self.order.pk).update(status=OrderStatus.NEW)
+        self.assertEqual(save_form(), few)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_total, 34.0)
+        # The Slack message for READY is built with the new total
+        self.assertEqual(SlackMessage.objects.last().attachments[0]["fields"][0]["value"], "$34.0")
+
+    def test_orders_filter_is_read_only(self):
+        for _ in range(3):
+            self.add_item(1.0, 1)
+        Order.objects.create(vendor="REV", status=OrderStatus.READY)
+        self.client.force_login(self.user)
+        # The first request stores the user's roles in the session
+        self.client.get(reverse("orders"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("ordersfilters", args=("new",)))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "WCP")
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE")])
+
+
+@mock.patch("parts_site.pagination.LIST_PAGE_SIZE", 2)
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        """Follows the cursors from the first page; returns the rows and the SQL of each page."""
+        rows, queries, cursor = [], [], None
+        while True:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, {"cursor": cursor} if cursor else {})
+            self.assertEqual(response.status_code, 200)
+            page = response.context["page"]
+            rows.extend(page)
+            queries.extend(q["sql"] for q in captured)
+            if not page.has_next:
+                return rows, queries
+            self.assertContains(response, 'hx-trigger="revealed"')
+            cursor = page.next_cursor
+
+    def test_orders_tab_pages_by_vendor(self):
+        for vendor in ["AndyMark", "REV", "WCP", "McMaster", "Vex"]:
+            Order.objects.create(vendor=vendor)
+        rows, queries = self.walk(reverse("ordersfilters", args=("new",)))
+        self.assertEqual([order.vendor for order in rows], ["WCP", "Vex", "REV", "McMaster", "AndyMark"])
+        self.assertFalse([sql for sql in queries if "OFFSET" in sql])
+
+        # Later pages are bare rows for the infinite scroll, not the tabs again
+        url = reverse("ordersfilters", args=("new",))
+        response = self.client.get(url, {"cursor": self.client.get(url).context["page"].next_cursor})
+        self.assertNotContains(response, "tab-list")
+
+    def test_nullable_dates_sort_last_without_gaps(self):
+        dates = [datetime.date(2025, 1, 5), None, datetime.date(2026, 2, 1), None, datetime.date(2025, 1, 5)]
+        orders = [Order.objects.create(vendor="WCP", status=OrderStatus.PLACED, order_placed_date=date) for date in dates]
+        rows, _ = self.walk(reverse("ordersfilters", args=("placed",)))
+        self.assertEqual([order.pk for order in rows], [orders[i].pk for i in (2, 4, 0, 3, 1)])
+
+    def test_projects_and_order_items(self):
+        for n in range(5):
+            make_project(f"P{n}")
+        rows, _ = self.walk(reverse("projects"))
+        self.assertEqual([project.prefix for project in rows], [f"P{n}" for n in range(5)])
+        rows, _ = self.walk(reverse("mfgsummary"))
+        self.assertEqual(len(rows), 5)
+
+        order = Order.objects.create(vendor="WCP")
+        items = [Item.objects.create(name=f"Item {n}", vendor="WCP", order=order, part_number="", unit_price=1, quantity=1,
+                                     justification="", requested_by=self.user) for n in range(3)]
+        rows, _ = self.walk(reverse("order", args=(order.id,)))
+        self.assertEqual(rows, items)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get(reverse("projects"), {"cursor": "bogus"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AssemblyStatusRollupTests(TestCase):
+
+    def setUp(self):
+        self.project, self.tla = make_project()
+        self.drivetrain = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0100", name="Drivetrain", description="")
+        self.gearbox = SubAssembly.objects.create(project=self.project, assembly=self.drivetrain, part_number="668-TST-A-0200", name="Gearbox", description="")
+        self.parts = [make_part(self.gearbox, i) for i in range(1, 4)]
+
+    def set_status(self, part, status):
+        revision = part.revisions.get()
+        revision.status = status
+        revision.save()
+
+    def status_of(self, assembly):
+        return Assembly.objects.get(pk=assembly.pk).status
+
+    def test_status_is_lowest_child_and_propagates_up(self):
+        for part in self.parts[:2]:
+            self.set_status(part, PartStatus.MANUFACTURED)
+        self.assertEqual(self.status_of(self.gearbox), PartStatus.NEW)
+
+        self.set_status(self.parts[2], PartStatus.IN_MANUFACTURE)
+        self.assertEqual(self.status_of(self.gearbox), PartStatus.IN_MANUFACTURE)
+        self.assertEqual(self.status_of(self.drivetrain), PartStatus.IN_MANUFACTURE)
+        self.assertEqual(self.status_of(self.tla), PartStatus.IN_MANUFACTURE)
+
+    def test_unchanged_status_stops_at_first_level(self):
+        self.set_status(self.parts[0], PartStatus.MANUFACTURED)
+        with self.assertNumQueries(1):
+            rollup_assembly_status(self.gearbox.pk)
+
+
+def fake_response(status, text="{}", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = text.encode()
+    response.headers.update(headers or {})
+    return response
+
+
+@mock.patch("parts_site.onshape.time.sleep")
+class OnshapeClientRetryTests(TestCase):
+
+    def test_throttled_call_honours_retry_after(self, sleep):
+        client = OnshapeClient()
+        responses = [fake_response(429, headers={"Retry-After": "2"}), fake_response(200, '[{"id": "w1"}]')]
+        with mock.patch.object(client.session, "request", side_effect=responses) as request:
+            workspace = client.get_document_workspace("d1")
+        self.assertEqual(workspace, {"id": "w1"})
+        self.assertEqual(request.call_count, 2)
+        sleep.assert_called_once_with(2.0)
+        self.assertEqual(request.call_args.kwargs["timeout"], client.timeout)
+
+    def test_calls_without_a_shared_client_close_theirs(self, sleep):
+        # Under WSGI every call runs on a new event loop, so nothing may outlive it
+        session = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=[{"id": "w1"}])))
+        with mock.patch("parts_site.onshape._new_async_session", return_value=session):
+            self.assertEqual(async_to_sync(AsyncOnshapeClient().get_document_workspace)("d1"), {"id": "w1"})
+        self.assertTrue(session.is_closed)
+
+    def test_asgi_lifespan_opens_and_closes_the_shared_client(self, sleep):
+        from parts import asgi
+
+        async def run():
+            messages = asyncio.Queue()
+            sent = []
+
+            async def send(message):
+                sent.append(message["type"])
+                if message["type"] == "lifespan.startup.complete":
+                    shared.append(onshape.get_async_session())
+                    await messages.put({"type": "lifespan.shutdown"})
+
+            shared = []
+            await messages.put({"type": "lifespan.startup"})
+            await asgi.application({"type": "lifespan"}, messages.get, send)
+            return sent, shared[0]
+
+        sent, session = async_to_sync(run)()
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertTrue(session.is_closed)
+        self.assertIsNone(onshape.get_async_session())
+
+    def test_post_is_not_retried_on_server_error(self, sleep):
+        client = OnshapeClient()
+        with mock.patch.object(client.session, "request", return_value=fake_response(502)) as request:
+            self.assertIsNone(client.create_document("668-TST-A-0000"))
+        self.assertEqual(request.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_get_gives_up_after_max_retries(self, sleep):
+        client = OnshapeClient()
+        with mock.patch.object(client.session, "request", side_effect=requests.exceptions.ReadTimeout()) as request:
+            self.assertIsNone(client.get_elements("d1", "w1"))
+        self.assertEqual(request.call_count, client.max_retries + 1)
+
+
+class FakeOnshapeClient:
+    """Records calls and hands out sequential ids; methods listed in fail_once return None the first time."""
+
+    def __init__(self, fail_once=()):
+        self.last_status = 200
+        self.calls = []
+        self.fail_once = set(fail_once)
+        self.counter = 0
+
+    def _result(self, name, *args):
+        self.calls.append(name)
+        if name in self.fail_once:
+            self.fail_once.discard(name)
+            return None
+        self.counter += 1
+        return {"id": f"{name}-{self.counter}"}
+
+    def create_folder(self, name, parent_id=None):
+        return self._result("create_folder", name, parent_id)
+
+    def create_document(self, name, folder_id=None):
+        return self._result("create_document", name, folder_id)
+
+    def get_document_workspace(self, document_id):
+        return self._result("get_document_workspace", document_id)
+
+    def create_assembly(self, document_id, workspace_id, name):
+        return self._result("create_assembly", document_id, workspace_id, name)
+
+    def create_part_studio(self, document_id, workspace_id, name):
+        return self._result("create_part_studio", document_id, workspace_id, name)
+
+    def create_version(self, document_id, name, description=""):
+        return self._result("create_version", document_id, name)
+
+    def get_elements(self, document_id, workspace_id):
+        self.calls.append("get_elements")
+        return [{"id": "e1", "name": "Part Studio 1", "elementType": "PARTSTUDIO"}]
+
+    def delete_element(self, document_id, workspace_id, element_id):
+        self.calls.append("delete_element")
+        return {}
+
+    def run_batch(self, calls, max_workers=None):
+        return [func(*args) for func, *args in calls]
+
+
+class OnshapeJobTests(TestCase):
+
+    def setUp(self):
+        self.project, self.tla = make_project()
+
+    def test_views_enqueue_instead_of_calling_onshape(self):
+        user = User.objects.create_user(username="lead", password="pw")
+        self.client.force_login(user)
+        with mock.patch("parts_site.jobs.OnshapeClient") as client:
+            response = self.client.post(reverse("newproject"), {"name": "Bot", "description": "Bot", "prefix": "BOT", "create_onshape_project": "on"})
+        self.assertEqual(response.status_code, 302)
+        client.assert_not_called()
+        job = OnshapeJob.objects.get()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertEqual(job.assembly.onshape_step, OnshapeStep.QUEUED)
+
+    def test_top_level_then_sub_assembly_and_part(self):
+        sub = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0100", name="Drivetrain", description="")
+        part = make_part(sub, 1)
+        # Queued children before the parent: they wait for it instead of failing
+        enqueue_part(part)
+        enqueue_assembly(sub)
+        enqueue_assembly(self.tla, top_level=True)
+
+        client = FakeOnshapeClient()
+        run_pending(client=client)
+        OnshapeJob.objects.update(run_after=timezone.now())
+        run_pending(client=client)
+        OnshapeJob.objects.update(run_after=timezone.now())
+        run_pending(client=client)
+
+        self.assertEqual(list(OnshapeJob.objects.values_list("status", flat=True)), [JobStatus.DONE] * 3)
+        self.project.refresh_from_db()
+        sub = Assembly.objects.get(pk=sub.pk)
+        part.refresh_from_db()
+        self.assertEqual(Assembly.objects.get(pk=self.tla.pk).onshape_folder_id, self.project.onshape_folder_id)
+        self.assertEqual(sub.onshape_step, OnshapeStep.DONE)
+        self.assertEqual(part.onshape_step, OnshapeStep.DONE)
+        self.assertTrue(part.onshape_element_id.startswith("create_part_studio"))
+
+    def test_failed_step_resumes_without_repeating_earlier_steps(self):
+        enqueue_assembly(self.tla, top_level=True)
+        client = FakeOnshapeClient(fail_once=["create_document"])
+        run_pending(client=client)
+        job = OnshapeJob.objects.get()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(Assembly.objects.get(pk=self.tla.pk).onshape_step, OnshapeStep.FOLDER)
+
+        OnshapeJob.objects.update(run_after=timezone.now())
+        run_pending(client=client)
+        self.assertEqual(OnshapeJob.objects.get().status, JobStatus.DONE)
+        self.assertEqual(client.calls.count("create_folder"), 1)
+        self.assertEqual(client.calls.count("create_document"), 2)
+
+    def test_parts_need_a_document_or_a_provisioning_assembly(self):
+        user = User.objects.create_user(username="student", password="pw")
+        self.client.force_login(user)
+        url = reverse("newpart", args=(self.project.id, self.tla.id))
+        data = {"assembly": self.tla.id, "name": "Plate", "description": "1/4in"}
+
+        # A folder left over from before the job queue, with no document
+        Assembly.objects.filter(pk=self.tla.pk).update(onshape_folder_id="f1", onshape_step=OnshapeStep.FOLDER)
+        self.client.post(url, data)
+        self.assertEqual(Part.objects.count(), 1)
+        self.assertFalse(OnshapeJob.objects.exists())
+
+        enqueue_assembly(self.tla, top_level=True)
+        self.client.post(url, data)
+        self.assertEqual(OnshapeJob.objects.filter(kind=JobKind.PART).count(), 1)
+
+    def test_heartbeat_keeps_a_long_job_from_being_reclaimed(self):
+        enqueue_assembly(self.tla, top_level=True)
+        job = claim_job()
+        # The handler has been running for longer than STALE_LOCK
+        job.locked_at = timezone.now() - jobs.STALE_LOCK - datetime.timedelta(minutes=1)
+        OnshapeJob.objects.filter(pk=job.pk).update(locked_at=job.locked_at)
+        self.assertTrue(jobs._Heartbeat(job).beat())
+        self.assertIsNone(claim_job())
+
+    def test_reclaimed_job_keeps_the_new_owners_state(self):
+        enqueue_assembly(self.tla, top_level=True)
+        job = claim_job()
+
+        def handler(job, client):
+            # Another worker took the job over and is still running it
+            OnshapeJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() + datetime.timedelta(seconds=1))
+            raise ProvisioningError("too late")
+
+        with mock.patch.dict(jobs.HANDLERS, {JobKind.ASSEMBLY: handler}):
+            run_job(job, client=FakeOnshapeClient())
+        job = OnshapeJob.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.attempts), (JobStatus.RUNNING, 0))
+        self.assertIsNotNone(job.locked_at)
+
+    def test_subassemblies_need_a_parent_folder_or_a_provisioning_parent(self):
+        user = User.objects.create_user(username="student", password="pw")
+        self.client.force_login(user)
+        url = reverse("newsubassembly", args=(self.project.id, self.tla.id))
+
+        # The parent's provisioning ran out of attempts before creating its folder
+        job = enqueue_assembly(self.tla, top_level=True)
+        OnshapeJob.objects.filter(pk=job.pk).update(status=JobStatus.FAILED)
+        self.client.post(url, {"name": "Intake", "description": "Rollers"})
+        self.assertEqual(Assembly.objects.count(), 2)
+        self.assertEqual(OnshapeJob.objects.filter(kind=JobKind.ASSEMBLY).count(), 1)
+
+        Assembly.objects.filter(pk=self.tla.pk).update(onshape_folder_id="f1")
+        self.client.post(url, {"name": "Shooter", "description": "Flywheel"})
+        self.assertEqual(OnshapeJob.objects.filter(kind=JobKind.ASSEMBLY).count(), 2)
+
+
+class OnshapeWorkspaceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        Assembly.objects.filter(pk=self.tla.pk).update(onshape_document_id="d1", onshape_element_id="e1", onshape_workspace_id="w1")
+        self.tla.refresh_from_db()
+
+    def test_onshape_link_is_a_pure_redirect(self):
+        self.client.force_login(self.user)
+        with mock.patch("parts_site.onshape.OnshapeClient._request") as request:
+            response = self.client.get(reverse("onshape_link", args=("assembly", self.tla.pk)))
+        request.assert_not_called()
+        self.assertRedirects(response, "https://cad.onshape.com/documents/d1/w/w1/e/e1", fetch_redirect_response=False)
+
+    def test_stale_workspace_is_refetched_on_404(self):
+        client = FakeOnshapeClient()
+        seen = []
+
+        def call(workspace_id):
+            seen.append(workspace_id)
+            if workspace_id == "w1":
+                client.last_status = 404
+                return None
+            client.last_status = 200
+            return {"id": "t1"}
+
+        self.assertEqual(self.tla.with_onshape_workspace(client, call), {"id": "t1"})
+        self.assertEqual(seen[0], "w1")
+        self.assertNotEqual(seen[1], "w1")
+        self.assertEqual(Assembly.objects.get(pk=self.tla.pk).onshape_workspace_id, seen[1])
+
+    def test_failed_refresh_keeps_stored_workspace(self):
+        client = mock.Mock(get_document_workspace=mock.Mock(return_value=None), last_status=404)
+        self.assertIsNone(self.tla.with_onshape_workspace(client, lambda workspace_id: None))
+        self.assertEqual(self.tla.onshape_workspace_id, "w1")
+
+        async_client = mock.Mock(get_document_workspace=mock.AsyncMock(return_value=None))
+        self.assertIsNone(async_to_sync(self.tla.aget_onshape_workspace_id)(async_client, refresh=True))
+        self.assertEqual(Assembly.objects.get(pk=self.tla.pk).onshape_workspace_id, "w1")
+
+
+def mock_onshape(handler):
+    """Patches the async Onshape transport; handler(request) returns an httpx.Response."""
+    return mock.patch("parts_site.onshape.get_async_session",
+                      return_value=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+@mock.patch("parts_site.onshape.asyncio.sleep")
+class AsyncOnshapeClientTests(TestCase):
+
+    def test_throttled_call_is_retried(self, sleep):
+        responses = iter([httpx.Response(429, headers={"Retry-After": "1"}), httpx.Response(200, json=[{"id": "w1"}])])
+        with mock_onshape(lambda request: next(responses)):
+            workspace = async_to_sync(AsyncOnshapeClient().get_document_workspace)("d1")
+        self.assertEqual(workspace, {"id": "w1"})
+        sleep.assert_called_once_with(1.0)
+
+    def test_download_external_data(self, sleep):
+        def handler(request):
+            self.assertEqual(request.headers["Accept"], "application/octet-stream")
+            return httpx.Response(200, content=b"ISO-10303-21;")
+
+        client = AsyncOnshapeClient()
+        client.access_key, client.secret_key = "access", "secret"
+        with mock_onshape(handler):
+            self.assertEqual(async_to_sync(client.download_external_data)("d1", "f1"), b"ISO-10303-21;")
+        with mock_onshape(lambda request: httpx.Response(404)):
+            self.assertIsNone(async_to_sync(client.download_external_data)("d1", "f1"))
+
+    def test_post_is_not_retried_on_server_error(self, sleep):
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(502)
+
+        async def create():
+            return await AsyncOnshapeClient().create_document("668-TST-A-0000")
+
+        with mock_onshape(handler):
+            self.assertIsNone(async_to_sync(create)())
+        self.assertEqual(len(requests_seen), 1)
+        sleep.assert_not_called()
+
+    def test_export_step_view_is_async_and_refetches_stale_workspace(self, sleep):
+        user = User.objects.create_user(username="student", password="pw")
+        project, tla = make_project()
+        Assembly.objects.filter(pk=tla.pk).update(onshape_document_id="d1", onshape_workspace_id="w-old")
+        part = make_part(tla, 1)
+        Part.objects.filter(pk=part.pk).update(onshape_element_id="e1")
+
+        def handler(request):
+            if request.url.path == "/api/documents/d1/workspaces":
+                return httpx.Response(200, json=[{"id": "w-new"}])
+            if "/w/w-old/" in request.url.path:
+                return httpx.Response(404)
+            return httpx.Response(200, json={"id": "t1"})
+
+        self.client.force_login(user)
+        with mock_onshape(handler):
+            response = self.client.get(reverse("export_step", args=(project.id, tla.id, part.id)))
+        self.assertEqual(response.json(), {"status": "started", "translationId": "t1"})
+        self.assertEqual(Assembly.objects.get(pk=tla.pk).onshape_workspace_id, "w-new")
+
+    def test_new_revision_queues_version_job(self, sleep):
+        user = User.objects.create_user(username="student", password="pw")
+        project, tla = make_project()
+        Assembly.objects.filter(pk=tla.pk).update(onshape_document_id="d1", onshape_step=OnshapeStep.DONE)
+        part = make_part(tla, 1)
+        self.client.force_login(user)
+        with mock_onshape(lambda request: self.fail("newrevision called Onshape")):
+            self.client.post(reverse("newrevision", args=(project.id, tla.id, part.id)),
+                             {"revision_number": "B", "status": PartStatus.NEW})
+        job = OnshapeJob.objects.get(kind=JobKind.VERSION)
+        self.assertEqual(job.payload["name"], "Rev B - Part 1")
+
+        client = FakeOnshapeClient()
+        run_pending(client=client)
+        self.assertEqual(client.calls, ["create_version"])
+        self.assertEqual(OnshapeJob.objects.get(pk=job.pk).status, JobStatus.DONE)
+
+
+class FakeTranslationClient(FakeOnshapeClient):
+    """Reports each state in turn for any translation, then serves a small STEP file."""
+
+    def __init__(self, states):
+        super().__init__()
+        self.states = list(states)
+
+    def get_translation_status(self, translation_id):
+        self.calls.append("get_translation_status")
+        return {"requestState": self.states.pop(0), "documentId": "d1", "resultExternalDataIds": ["x1"]}
+
+    def create_part_studio_export(self, document_id, workspace_id, element_id, format_name="STEP"):
+        return self._result("create_part_studio_export", document_id, workspace_id, element_id, format_name)
+
+    def download_external_data(self, document_id, external_data_id):
+        self.calls.append("download_external_data")
+        return b"ISO-10303-21;"
+
+
+class StepExportTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        Assembly.objects.filter(pk=self.tla.pk).update(onshape_document_id="d1", onshape_workspace_id="w1")
+        self.part = make_part(self.tla, 1)
+        Part.objects.filter(pk=self.part.pk).update(onshape_element_id="e1")
+        self.url = reverse("export_step", args=(self.project.id, self.tla.id, self.part.id))
+        self.client.force_login(self.user)
+        self.translations = 0
+
+    def export(self):
+        started = []
+
+        def handler(request):
+            started.append(request.url.path)
+            self.translations += 1
+            return httpx.Response(200, json={"id": f"t{self.translations}"})
+
+        with mock_onshape(handler):
+            data = self.client.get(self.url).json()
+        return data, started
+
+    def test_export_is_polled_downloaded_and_reused(self):
+        data, started = self.export()
+        self.assertEqual(data, {"status": "started", "translationId": "t1"})
+        self.assertEqual(len(started), 1)
+
+        # A second click while Onshape is still working doesn't start another translation
+        data, started = self.export()
+        self.assertEqual((data["translationId"], started), ("t1", []))
+
+        client = FakeTranslationClient(["ACTIVE", "DONE"])
+        OnshapeJob.objects.update(run_after=timezone.now())
+        run_pending(client=client)
+        job = OnshapeJob.objects.get(kind=JobKind.STEP_EXPORT)
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertGreater(job.run_after, timezone.now())
+
+        # The webhook makes the deferred poll run now
+        payload = {"event": "onshape.model.translation.complete", "translationId": "t1"}
+        self.client.post(reverse("onshape_webhook"), payload, content_type="application/json")
+        run_pending(client=client)
+        self.assertEqual(client.calls, ["get_translation_status", "get_translation_status", "download_external_data"])
+
+        export = StepExport.objects.get()
+        self.assertEqual(export.state, TranslationState.DONE)
+        data, started = self.export()
+        self.assertEqual(data, {"status": "ready", "url": reverse("stepexport", args=(export.id,))})
+        self.assertEqual(started, [])
+        response = self.client.get(data["url"])
+        self.assertEqual(b"".join(response.streaming_content), b"ISO-10303-21;")
+        self.assertContains(self.client.get(reverse("part", args=(self.project.id, self.tla.id, self.part.id))), "Download STEP")
+
+    def test_editing_the_revision_starts_a_new_export(self):
+        self.export()
+        StepExport.objects.update(state=TranslationState.DONE)
+        revision = self.part.revisions.get()
+        revision.material = "6061"
+        revision.save()
+        data, started = self.export()
+        self.assertEqual((data["status"], len(started)), ("started", 1))
+        self.assertEqual(StepExport.objects.count(), 2)
+
+    def test_failed_translation_is_recorded(self):
+        self.export()
+        OnshapeJob.objects.update(run_after=timezone.now())
+        run_pending(client=FakeTranslationClient(["FAILED"]))
+        self.assertEqual(StepExport.objects.get().state, TranslationState.FAILED)
+        self.assertEqual(OnshapeJob.objects.get(kind=JobKind.STEP_EXPORT).status, JobStatus.DONE)
+
+
+class ExportBatchTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username="lead", password="pw")
+        self.project, self.tla = make_project()
+        Assembly.objects.filter(pk=self.tla.pk).update(onshape_document_id="d1", onshape_workspace_id="w1")
+        self.parts = [make_part(self.tla, i) for i in range(1, 4)]
+        Part.objects.filter(pk__in=[p.pk for p in self.parts[:2]]).update(onshape_element_id="e1")
+        PartRevision.objects.update(mfg_type=MfgTypes.LASER_CUT)
+        self.client.force_login(self.user)
+
+    def export_all(self, client):
+        response = self.client.post(reverse("mfgexport", args=(self.project.id, MfgTypes.LASER_CUT)))
+        run_pending(client=client)
+        OnshapeJob.objects.filter(status=JobStatus.PENDING).update(run_after=timezone.now())
+        run_pending(client=client)
+        return response
+
+    def test_filter_is_exported_and_zipped(self):
+        client = FakeTranslationClient(["DONE", "DONE"])
+        response = self.export_all(client)
+        batch = ExportBatch.objects.get()
+        self.assertRedirects(response, reverse("exportbatch", args=(batch.id,)))
+        self.assertEqual((batch.format, batch.part_count, batch.skipped), ("DXF", 2, ["668-TST-P-0003"]))
+        self.assertEqual(client.calls.count("create_part_studio_export"), 2)
+        self.assertContains(self.client.get(response.url), "2 of 2 ready")
+
+        response = self.client.get(reverse("exportbatchzip", args=(batch.id,)))
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ["668-TST-P-0001-A.dxf", "668-TST-P-0002-A.dxf"])
+        self.assertEqual(archive.read("668-TST-P-0001-A.dxf"), b"ISO-10303-21;")
+
+    def test_unchanged_parts_reuse_earlier_exports(self):
+        self.export_all(FakeTranslationClient(["DONE", "DONE"]))
+        client = FakeTranslationClient([])
+        self.export_all(client)
+        self.assertEqual(client.calls, [])
+        self.assertEqual(ExportBatch.objects.first().exports.count(), 2)
+
+
+class MfgFilterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        self.sub = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0100", name="Drivetrain", description="")
+        for number, assembly, status, mfg_type in [
+            (1, self.tla, PartStatus.IN_DESIGN, MfgTypes.LASER_CUT),
+            (2, self.sub, PartStatus.MANUFACTURED, MfgTypes.LASER_CUT),
+            (3, self.sub, PartStatus.ASSEMBLED, MfgTypes.LATHE),
+        ]:
+            make_part(assembly, number).revisions.update(status=status, mfg_type=mfg_type)
+        other, other_tla = make_project("OTH")
+        make_part(other_tla, 9).revisions.update(mfg_type=MfgTypes.LASER_CUT)
+        self.client.force_login(self.user)
+
+    def part_numbers(self, filter, **params):
+        response = self.client.get(reverse("mfgfilters", args=(self.project.id, filter)), params)
+        return [part.part_number for part in response.context["parts_list"]]
+
+    def test_filters_run_in_the_database_highest_status_first(self):
+        self.assertEqual(self.part_numbers("todo"), ["668-TST-P-0002", "668-TST-P-0001"])
+        self.assertEqual(self.part_numbers("complete"), ["668-TST-P-0003"])
+        self.assertEqual(self.part_numbers(MfgTypes.LASER_CUT), ["668-TST-P-0002", "668-TST-P-0001"])
+
+    def test_query_count_does_not_grow_with_parts(self):
+        url = reverse("mfgfilters", args=(self.project.id, "todo"))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        for number in range(10, 30):
+            make_part(self.sub, number)
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(url)
+        self.assertEqual(len(after), len(before))
+
+    def test_pages(self):
+        for number in range(10, 14):
+            make_part(self.tla, number)
+        with mock.patch("parts_site.mfg_views.MFG_PAGE_SIZE", 4):
+            self.assertEqual(len(self.part_numbers("todo")), 4)
+            self.assertEqual(self.part_numbers("todo", page=2), ["668-TST-P-0012", "668-TST-P-0013"])
+
+
+class MfgCountTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.parts = [make_part(self.tla, number) for number in range(1, 4)]
+        self.client.force_login(self.user)
+
+    def counts(self):
+        return {(c.mfg_type, c.status): c.count for c in MfgCount.objects.filter(project=self.project, count__gt=0)}
+
+    def update(self, part, **fields):
+        revision = part.revisions.get(revision_number="A")
+        for name, value in fields.items():
+            setattr(revision, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            revision.save()
+
+    def test_counts_follow_revision_saves(self):
+        self.assertEqual(self.counts(), {("", PartStatus.NEW): 3})
+        self.update(self.parts[0], mfg_type=MfgTypes.LASER_CUT, status=PartStatus.IN_MANUFACTURE)
+        self.update(self.parts[1], mfg_type=MfgTypes.LASER_CUT)
+        self.assertEqual(self.counts(), {
+            ("", PartStatus.NEW): 1,
+            (MfgTypes.LASER_CUT, PartStatus.NEW): 1,
+            (MfgTypes.LASER_CUT, PartStatus.IN_MANUFACTURE): 1,
+        })
+
+        # Only the latest revision counts
+        with self.captureOnCommitCallbacks(execute=True):
+            PartRevision.objects.create(part=self.parts[0], revision_number="B", status=PartStatus.IN_DESIGN, mfg_type=MfgTypes.LATHE)
+            self.parts[2].delete()
+        self.assertEqual(self.counts(), {
+            (MfgTypes.LASER_CUT, PartStatus.NEW): 1,
+            (MfgTypes.LATHE, PartStatus.IN_DESIGN): 1,
+        })
+
+    def test_rebuild_command_repairs_drift(self):
+        MfgCount.objects.update(count=0)
+        out = io.StringIO()
+        call_command("rebuild_mfg_counts", stdout=out)
+        self.assertIn("Recounted 1 project(s)", out.getvalue())
+        self.assertEqual(self.counts(), {("", PartStatus.NEW): 3})
+
+    def test_summary_page_and_json(self):
+        self.update(self.parts[0], mfg_type=MfgTypes.LATHE, status=PartStatus.ASSEMBLED)
+        self.assertContains(self.client.get(reverse("mfgsummary")), "Lathe: <strong>0</strong> todo, 1 complete")
+
+        url = reverse("mfgcounts", args=(self.project.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()["types"], [
+            {"mfg_type": "LATHE", "label": "Lathe", "todo": 0, "complete": 1, "statuses": {"10": 1}},
+            {"mfg_type": "", "label": "Unspecified", "todo": 2, "complete": 0, "statuses": {"1": 2}},
+        ])
+        self.assertEqual(self.client.get(url, headers={"if-none-match": response["ETag"]}).status_code, 304)
+
+    def test_json_changes_for_saves_in_the_same_second(self):
+        url = reverse("mfgcounts", args=(self.project.id,))
+        second = timezone.now().replace(microsecond=0)
+        with mock.patch("django.utils.timezone.now", return_value=second.replace(microsecond=100000)):
+            self.update(self.parts[0], status=PartStatus.ASSEMBLED)
+        etag = self.client.get(url)["ETag"]
+
+        with mock.patch("django.utils.timezone.now", return_value=second.replace(microsecond=600000)):
+            self.update(self.parts[1], status=PartStatus.ASSEMBLED)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["types"][0]["complete"], 2)
+
+
+class DrawingZipTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        self.drivetrain = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0100", name="Drivetrain", description="")
+        self.gearbox = SubAssembly.objects.create(project=self.project, assembly=self.drivetrain, part_number="668-TST-A-0200", name="Gearbox", description="")
+        self.intake = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0300", name="Intake", description="")
+        for number, assembly in enumerate([self.tla, self.drivetrain, self.gearbox, self.intake], start=1):
+            revision = make_part(assembly, number).revisions.get()
+            revision.drawing.save(f"drawing{number}.pdf", ContentFile(f"part {number}".encode()))
+        make_part(self.tla, 5)  # no drawing
+        self.client.force_login(self.user)
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))).namelist()
+
+    def test_project_zip_names_drawings_by_part_and_revision(self):
+        response = self.client.get(reverse("projectdrawings", args=(self.project.id,)))
+        self.assertIn("TST-drawings.zip", response["Content-Disposition"])
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [f"668-TST-P-{n:04d}-A.pdf" for n in range(1, 5)])
+        self.assertEqual(archive.read("668-TST-P-0003-A.pdf"), b"part 3")
+
+    def test_assembly_zip_covers_nested_subassemblies_only(self):
+        names = self.names(reverse("assemblydrawings", args=(self.project.id, self.drivetrain.id)))
+        self.assertEqual(names, ["668-TST-P-0002-A.pdf", "668-TST-P-0003-A.pdf"])
+
+    def test_mfg_zip_is_limited_to_the_filter(self):
+        PartRevision.objects.filter(part__part_number="668-TST-P-0004").update(mfg_type=MfgTypes.LASER_CUT)
+        names = self.names(reverse("mfgdrawings", args=(self.project.id, MfgTypes.LASER_CUT)))
+        self.assertEqual(names, ["668-TST-P-0004-A.pdf"])
+
+    def test_entries_are_read_while_streaming(self):
+        read = []
+
+        def entries():
+            for revision in PartRevision.objects.exclude(drawing=""):
+                read.append(revision.pk)
+                yield f"{revision.pk}.pdf", revision.drawing.path
+
+        response = stream_zip(RequestFactory().get("/"), entries(), "drawings.zip")
+        self.assertEqual(read, [])
+        content = b"".join(response.streaming_content)
+        self.assertEqual(len(read), 4)
+        self.assertEqual(len(zipfile.ZipFile(io.BytesIO(content)).namelist()), 4)
+
+    def test_async_stream_advances_on_the_request_thread(self):
+        async def run():
+            async with ThreadSensitiveContext():
+                view_thread = await sync_to_async(threading.get_ident)()
+                threads = [ident async for ident in _aiter(threading.get_ident() for _ in range(3))]
+            return view_thread, threads
+
+        view_thread, threads = async_to_sync(run)()
+        self.assertEqual(threads, [view_thread] * 3)
+
+
+class OnshapeBatchTests(TestCase):
+
+    def test_batch_runs_concurrently_and_keeps_order(self):
+        client = OnshapeClient()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def call(value):
+            # Deadlocks (and times out) unless all three run at the same time
+            barrier.wait()
+            return value * 2
+
+        self.assertEqual(client.run_batch([(call, 1), (call, 2), (call, 3)], max_workers=3), [2, 4, 6])
+
+
+class BulkPartTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="student", password="pw")
+        self.project, self.tla = make_project()
+        self.sub = SubAssembly.objects.create(project=self.project, assembly=self.tla, part_number="668-TST-A-0100", name="Drivetrain", description="")
+        self.client.force_login(self.user)
+        self.url = reverse("bulknewpart", args=(self.project.id, self.sub.id))
+
+    def test_json_bulk_create_allocates_a_contiguous_block(self):
+        make_part(self.sub, 101)
+        Assembly.objects.filter(pk=self.sub.pk).update(last_part_number=101)
+        rows = [{"name": f"Plate {i}", "description": "1/4in"} for i in range(3)]
+        response = self.client.post(self.url, rows, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        numbers = [p["part_number"] for p in response.json()["created"]]
+        self.assertEqual(numbers, ["668-TST-P-0102", "668-TST-P-0103", "668-TST-P-0104"])
+        for part in Part.objects.filter(part_number__in=numbers):
+            self.assertEqual(part.latest_revision.revision_number, "A")
+
+    def test_block_cannot_overflow_into_the_next_assembly(self):
+        rows = [{"name": f"Plate {i}", "description": ""} for i in range(150)]
+        response = self.client.post(self.url, rows, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Part.objects.exists())
+        self.assertEqual(Assembly.objects.get(pk=self.sub.pk).last_part_number, 0)
+
+        response = self.client.post(self.url, rows[:99], content_type="application/json")
+        self.assertEqual(response.json()["created"][-1]["part_number"], "668-TST-P-0199")
+        response = self.client.post(self.url, {"parts": "Spacer,"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "has 0 part number(s) left")
+        self.assertEqual(Part.objects.count(), 99)
+
+    def test_form_bulk_create_and_onshape_job(self):
+        Assembly.objects.filter(pk=self.sub.pk).update(onshape_document_id="d1", onshape_workspace_id="w1", onshape_step=OnshapeStep.DONE)
+        response = self.client.post(self.url, {"parts": "Plate, 1/4in\n\nSpacer,\nShaft, hex"})
+        self.assertEqual(response.status_code, 302)
+        parts = list(Part.objects.filter(assembly=self.sub).order_by("part_number"))
+        self.assertEqual([p.part_number for p in parts], ["668-TST-P-0101", "668-TST-P-0102", "668-TST-P-0103"])
+
+        job = OnshapeJob.objects.get()
+        self.assertEqual(job.kind, JobKind.BULK_PARTS)
+        client = FakeOnshapeClient(fail_once=["create_part_studio"])
+        run_pending(client=client)
+        self.assertEqual(Part.objects.filter(onshape_step=OnshapeStep.ELEMENT).count(), 2)
+        OnshapeJob.objects.update(run_after=timezone.now())
+        run_pending(client=client)
+        self.assertEqual(Part.objects.filter(onshape_step=OnshapeStep.DONE).count(), 3)
+        self.assertEqual(client.calls.count("create_part_studio"), 4)
+        self.assertEqual(client.calls.count("create_version"), 1)
+
+    def test_rejects_rows_without_a_name(self):
+        response = self.client.post(self.url, [{"description": "no name"}], content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Part.objects.exists())
+
+    def test_single_part_numbers_do_not_repeat(self):
+        from .numbering import allocate_part_numbers
+        first = allocate_part_numbers(self.sub, 2)
+        second = allocate_part_numbers(Assembly.objects.get(pk=self.sub.pk))
+        self.assertEqual(list(first) + list(second), [101, 102, 103])
+
+
+class AssemblyNumberingTests(TestCase):
+
+    def test_new_assemblies_take_the_next_block(self):
+        user = User.objects.create_user(username="student", password="pw")
+        project, tla = make_project()
+        Project.objects.filter(pk=project.pk).update(last_assembly_number=300)
+        self.client.force_login(user)
+        self.client.post(reverse("newsubassembly", args=(project.id, tla.id)), {"name": "Intake", "description": "Rollers"})
+        self.client.post(reverse("newassembly", args=(project.id,)), {"name": "Shooter", "description": "Flywheel"})
+        numbers = list(Assembly.objects.exclude(pk=tla.pk).order_by("id").values_list("part_number", flat=True))
+        self.assertEqual(numbers, ["668-TST-A-0400", "668-TST-A-0500"])
+
+
+class DrawingDownloadTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username="student", password="pw")
+        project, tla = make_project()
+        self.revision = make_part(tla, 1).revisions.get()
+        self.revision.drawing.save("plate.dxf", ContentFile(b"0123456789" * 10))
+        self.url = reverse("drawing", args=(self.revision.id,))
+        self.client.force_login(self.user)
+
+    def content(self, response):
+        return b"".join(response.streaming_content)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), b"0123456789")
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.assertEqual(self.client.get("/media/" + self.revision.drawing.name).status_code, 302)
+
+    def test_full_download_and_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.content(response)), 100)
+        self.assertIn("668-TST-P-0001-A.dxf", response["Content-Disposition"])
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(self.content(response), b"0123456789")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(self.content(response), b"56789")
+
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=500-").status_code, 416)
+
+        # A stale If-Range gets the whole file instead of a partial one
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_media_path_traversal_is_rejected(self):
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect", MEDIA_ACCEL_PREFIX="/protected-media/")
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.revision.drawing.name)
+        self.assertEqual(response.content, b"")
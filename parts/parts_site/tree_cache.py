@@ -0,0 +1,76 @@
+"""
+Cached rendering of the project/assembly part tables.
+
+Each project has a generation number in the cache. Every fragment key
+includes it, so bumping the generation (on any Part, PartRevision or
+Assembly change in the project) orphans all of that project's fragments at
+once; they simply age out of the cache. Repeat views of an unchanged
+project are served without running the tree queries.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .metrics import record_cache_lookup
+
+TABLE_TEMPLATE = "part_assembly_list.html"
+
+
+def _generation_key(project_id):
+    return f"project-tree-gen:{project_id}"
+
+
+def project_generation(project_id):
+    # Seeded from the clock rather than 1, so a generation evicted from the
+    # cache can never come back as a number an old fragment was stored under
+    generation = cache.get(_generation_key(project_id))
+    if generation is None:
+        generation = time.time_ns()
+        if not cache.add(_generation_key(project_id), generation, timeout=None):
+            generation = cache.get(_generation_key(project_id), generation)
+    return generation
+
+
+def _bump(project_id):
+    try:
+        cache.incr(_generation_key(project_id))
+    except ValueError:
+        # Not cached yet, so there are no fragments for this generation
+        pass
+
+
+def invalidate_project(project_id):
+    """Drops the project's cached tables once the current transaction commits."""
+    if project_id is not None:
+        transaction.on_commit(lambda: _bump(project_id))
+
+
+def _can_delete(request):
+    # Mirrors the role check in part_assembly_list.html, which decides
+    # whether the Delete buttons are rendered
+    return request.roles.is_lead or request.roles.is_mentor
+
+
+def render_tree_table(request, project, scope, loader):
+    """
+    Returns the rendered part_assembly_list.html for a project or assembly.
+
+    scope names the table ("project" or an assembly id) and loader returns
+    the (assembly_list, parts_list) pair; it is only called on a cache miss.
+    """
+    key = f"project-tree:{project.pk}:{project_generation(project.pk)}:{scope}:{int(_can_delete(request))}"
+    html = cache.get(key)
+    record_cache_lookup("tree", html is not None)
+    if html is None:
+        assembly_list, parts_list = loader()
+        html = render_to_string(TABLE_TEMPLATE, {
+            "project": project,
+            "assembly_list": assembly_list,
+            "parts_list": parts_list,
+        }, request=request)
+        cache.set(key, html, settings.TREE_CACHE_TIMEOUT)
+    return mark_safe(html)
@@ -1,11 +1,13 @@
 from django.urls import path, include
 
-from . import views, mfg_views, order_views
+from . import views, mfg_views, order_views, media_views, metrics
 
 urlpatterns = [
     path("", views.index, name="index"),
     path('accounts/', include('allauth.urls')),
 
+    path("search/", views.search, name="search"),
+    path("metrics", metrics.metrics, name="metrics"),
     path("projects/", views.projects, name="projects"),
     path("newproject/", views.newproject, name="newproject"),
 
@@ -19,6 +21,7 @@ urlpatterns = [
     path("projects/<int:project_id>/assembly/<int:assembly_id>/edit/", views.edit, name="editassembly"),
     path("projects/<int:project_id>/assembly/<int:assembly_id>/newsubassembly/", views.newassembly, name="newsubassembly"),
     path("projects/<int:project_id>/assembly/<int:assembly_id>/newpart/", views.newpart, name="newpart"),
+    path("projects/<int:project_id>/assembly/<int:assembly_id>/bulknewpart/", views.bulknewpart, name="bulknewpart"),
 
     path("projects/<int:project_id>/assembly/<int:assembly_id>/part/<int:part_id>/", views.part, name="part"),
     path("projects/<int:project_id>/assembly/<int:assembly_id>/part/<int:part_id>/revision/<int:revision_id>/", views.part, name="part_revision"),
@@ -28,12 +31,21 @@ urlpatterns = [
     path("projects/<int:project_id>/assembly/<int:assembly_id>/part/<int:part_id>/revision/<int:revision_id>/edit/", views.editrevision, name="editrevision"),
     path("projects/<int:project_id>/assembly/<int:assembly_id>/part/<int:part_id>/revision/<int:revision_id>/delete/", views.deleterevision, name="deleterevision"),
     path("projects/<int:project_id>/assembly/<int:assembly_id>/part/<int:part_id>/export/step/", views.export_step, name="export_step"),
+    path("drawings/<int:revision_id>/", media_views.drawing, name="drawing"),
+    path("exports/<int:export_id>/", media_views.step_export, name="stepexport"),
+    path("projects/<int:project_id>/drawings.zip", media_views.project_drawings, name="projectdrawings"),
+    path("projects/<int:project_id>/assembly/<int:assembly_id>/drawings.zip", media_views.assembly_drawings, name="assemblydrawings"),
+    path("mfg/projects/<int:project_id>/<filter>/drawings.zip", media_views.mfg_drawings, name="mfgdrawings"),
     path("webhooks/onshape/", views.onshape_webhook, name="onshape_webhook"),
     path("onshape/link/<str:type>/<int:id>/", views.onshape_link, name="onshape_link"),
 
     path("mfg/", mfg_views.mfg, name="mfgsummary"),
     path("mfg/projects/<int:project_id>/", mfg_views.mfg_project, name="mfgproject"),
+    path("mfg/projects/<int:project_id>/counts.json", mfg_views.mfg_counts, name="mfgcounts"),
     path("mfg/projects/<int:project_id>/<filter>", mfg_views.mfg_filters, name="mfgfilters"),
+    path("mfg/projects/<int:project_id>/<filter>/export/", mfg_views.mfg_export, name="mfgexport"),
+    path("mfg/exports/<int:batch_id>/", mfg_views.export_batch, name="exportbatch"),
+    path("mfg/exports/<int:batch_id>/zip/", media_views.export_batch_zip, name="exportbatchzip"),
 
     path("orders/", order_views.orders, name="orders"),
     path("orders/filters/<filter>", order_views.orders_filters, name="ordersfilters"),
@@ -1,13 +1,22 @@
 from django.http import HttpResponseRedirect, JsonResponse, HttpResponse
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.core.exceptions import ValidationError
 
 from .models import *
 from .forms import *
 from .constants import *
-from .onshape import OnshapeClient
+from .onshape import AsyncOnshapeClient
+from .project_tree import load_project_tree, load_assembly_tree
+from .tree_cache import render_tree_table
+from .jobs import assembly_has_onshape_folder, assembly_is_onshape_managed, enqueue_assembly, enqueue_part, enqueue_step_export, enqueue_version, project_is_onshape_managed, step_export_finished
+from .numbering import allocate_assembly_number, allocate_part_numbers, format_part_number
+from .bulk import create_parts
+from .pagination import request_page
+from .search import search_entries
+from asgiref.sync import sync_to_async
 import logging
 import json
 
@@ -19,11 +28,20 @@ logger = logging.getLogger(__name__)
 def index(request):
     return render(request, "index.html")
 
+@login_required
+def search(request):
+    """Search page, or just the type-ahead results for htmx requests from the navbar."""
+    query = request.GET.get("q", "").strip()
+    context = {"query": query,
+               "results": search_entries(query) if query else [],
+               }
+    return render(request, "search_results.html" if request.headers.get("HX-Request") else "search.html", context)
+
 @login_required
 def projects(request):
-    project_list = Project.objects.order_by("id")
-    context = {"project_list": project_list}
-    return render(request, "projects.html", context)
+    page = request_page(request, Project.objects.all(), ["id"])
+    context = {"project_list": page, "page": page}
+    return render(request, "project_rows.html" if "cursor" in request.GET else "projects.html", context)
 
 @login_required
 def delete(request, project_id = None, assembly_id = None, part_id = None):
@@ -93,66 +111,14 @@ def newproject(request):
             tla.name = "Top Level Assembly"
             tla.description = project.name
             tla.project = project
-            tla.part_number = f"{TEAM}-{project.prefix}-A-0000"
+            tla.part_number = format_part_number(project, "A", 0)
             tla.status = PartStatus.NEW
 
             tla.save()
             
             # Onshape Integration
             if form.cleaned_data.get('create_onshape_project'):
-                try:
-                    logger.info(f"Creating Onshape project for: {project.name}")
-                    client = OnshapeClient()
-                    # 1. Create Folder
-                    logger.info("Step 1: Creating folder")
-                    folder = client.create_folder(project.name)
-                    if folder:
-                        logger.info(f"Folder created with ID: {folder.get('id')}")
-                        project.onshape_folder_id = folder['id']
-                        project.save()
-                        logger.info(f"Saved project with folder_id: {project.onshape_folder_id}")
-                        
-                        # 2. Create Document in Folder
-                        logger.info("Step 2: Creating document")
-                        doc = client.create_document(tla.part_number, folder_id=folder['id'])
-                        if doc:
-                            logger.info(f"Document created with ID: {doc.get('id')}")
-                            tla.onshape_document_id = doc['id']
-                            tla.onshape_folder_id = folder['id'] # TLA lives in Project Folder
-                            
-                            # 3. Create Assembly Tab
-                            logger.info("Step 3: Getting workspace")
-                            workspace = client.get_document_workspace(doc['id'])
-                            if workspace:
-                                logger.info(f"Workspace ID: {workspace.get('id')}")
-                                logger.info("Step 4: Creating assembly tab")
-                                assembly_tab = client.create_assembly(doc['id'], workspace['id'], tla.part_number)
-                                if assembly_tab:
-                                    logger.info(f"Assembly created with ID: {assembly_tab.get('id')}")
-                                    tla.onshape_element_id = assembly_tab['id']
-                                    tla.save()
-                                    logger.info(f"Saved TLA with element_id: {tla.onshape_element_id}")
-                                    
-                                    # 4. Delete default elements (Part Studio 1 and Assembly 1)
-                                    logger.info("Step 5: Deleting default elements")
-                                    elements = client.get_elements(doc['id'], workspace['id'])
-                                    if elements:
-                                        for e in elements:
-                                            # Delete default Part Studio 1 and Assembly 1
-                                            if ((e.get('name') == "Part Studio 1" and e.get('elementType') == "PARTSTUDIO") or
-                                                (e.get('name') == "Assembly 1" and e.get('elementType') == "ASSEMBLY")):
-                                                logger.info(f"Deleting default element: {e.get('name')} ({e.get('id')})")
-                                                client.delete_element(doc['id'], workspace['id'], e['id'])
-                                else:
-                                    logger.warning("Assembly tab creation returned None")
-                            else:
-                                logger.warning("Workspace not found")
-                        else:
-                            logger.warning("Document creation returned None")
-                    else:
-                        logger.warning("Folder creation returned None")
-                except Exception as e:
-                    logger.error(f"Failed to create Onshape project: {e}", exc_info=True)
+                enqueue_assembly(tla, top_level=True)
 
             return HttpResponseRedirect(reverse("project",args=(project.id,)))
     else:
@@ -181,95 +147,20 @@ def newassembly(request, project_id, assembly_id = None):
             if(assembly_id):
                 current_assembly = get_object_or_404(Assembly, pk=assembly_id)
                 assembly.assembly = current_assembly
-            assembly_number = 0
-            for a in current_project.assembly_set.all():
-                if a.part_number.split("-")[2] == "A":
-                    if int(a.part_number.split("-")[3]) > assembly_number:
-                        assembly_number = int(a.part_number.split("-")[3])
-            assembly.part_number = f"{TEAM}-{current_project.prefix}-A-{str(assembly_number+ASM_INCR).zfill(PART_DIGITS)}"
+            assembly.part_number = format_part_number(current_project, "A", allocate_assembly_number(current_project))
             assembly.status = PartStatus.NEW
             assembly.save()
             form.save_m2m()
             
             # Onshape Integration
-            try:
-                # Check if parent has Onshape Folder ID (implies Onshape Project)
-                parent_folder_id = None
-                if assembly_id:
-                    # SubAssembly: Parent is the assembly we are adding to
-                    parent_assembly = get_object_or_404(Assembly, pk=assembly_id)
-                    parent_folder_id = parent_assembly.onshape_folder_id
-                    logger.info(f"SubAssembly: parent_assembly={parent_assembly.part_number}, parent_folder_id={parent_folder_id}")
-                else:
-                    # Top Level Assembly (adding to project directly? No, newassembly is for subassemblies usually?)
-                    # Wait, newassembly logic: if assembly_id is None, it's a TLA?
-                    # But TLA is created in newproject.
-                    # Ah, newassembly with project_id only creates a TLA?
-                    # Let's check logic.
-                    # If assembly_id is None, it uses AssemblyForm.
-                    # But TLA is created in newproject.
-                    # Is this for additional top-level assemblies?
-                    # If so, they should go in Project Folder.
-                    if current_project.onshape_folder_id:
-                        parent_folder_id = current_project.onshape_folder_id
-                    logger.info(f"Top-level assembly: project={current_project.name}, parent_folder_id={parent_folder_id}")
-
-                if parent_folder_id:
-                    logger.info(f"Creating Onshape assembly: {assembly.part_number}")
-                    client = OnshapeClient()
-                    # 1. Create Folder in Parent Folder
-                    logger.info(f"Step 1: Creating folder in parent {parent_folder_id}")
-                    folder = client.create_folder(assembly.part_number, parent_id=parent_folder_id)
-                    if folder:
-                        logger.info(f"Folder created with ID: {folder.get('id')}")
-                        assembly.onshape_folder_id = folder['id']
-                        assembly.save()
-                        logger.info(f"Saved assembly with folder_id: {assembly.onshape_folder_id}")
-                        
-                        # 2. Create Document in new Folder
-                        logger.info("Step 2: Creating document")
-                        doc = client.create_document(assembly.part_number, folder_id=folder['id'])
-                        if doc:
-                            logger.info(f"Document created with ID: {doc.get('id')}")
-                            assembly.onshape_document_id = doc['id']
-                            assembly.save()
-                            logger.info(f"Saved assembly with document_id: {assembly.onshape_document_id}")
-                            
-                            # 3. Create Assembly Tab
-                            logger.info("Step 3: Getting workspace")
-                            workspace = client.get_document_workspace(doc['id'])
-                            if workspace:
-                                logger.info(f"Workspace ID: {workspace.get('id')}")
-                                logger.info("Step 4: Creating assembly tab")
-                                assembly_tab = client.create_assembly(doc['id'], workspace['id'], assembly.part_number)
-                                if assembly_tab:
-                                    logger.info(f"Assembly tab created with ID: {assembly_tab.get('id')}")
-                                    assembly.onshape_element_id = assembly_tab['id']
-                                    assembly.save()
-                                    logger.info(f"Saved assembly with element_id: {assembly.onshape_element_id}")
-                                    
-                                    # 4. Delete default elements (Part Studio 1 and Assembly 1)
-                                    logger.info("Step 5: Deleting default elements")
-                                    elements = client.get_elements(doc['id'], workspace['id'])
-                                    if elements:
-                                        for e in elements:
-                                            # Delete default Part Studio 1 and Assembly 1
-                                            if ((e.get('name') == "Part Studio 1" and e.get('elementType') == "PARTSTUDIO") or
-                                                (e.get('name') == "Assembly 1" and e.get('elementType') == "ASSEMBLY")):
-                                                logger.info(f"Deleting default element: {e.get('name')} ({e.get('id')})")
-                                                client.delete_element(doc['id'], workspace['id'], e['id'])
-                                else:
-                                    logger.warning("Assembly tab creation returned None")
-                            else:
-                                logger.warning("Workspace not found")
-                        else:
-                            logger.warning("Document creation returned None")
-                    else:
-                        logger.warning("Folder creation returned None")
-                else:
-                    logger.info(f"Skipping Onshape creation - no parent folder ID (project.onshape_folder_id={current_project.onshape_folder_id})")
-            except Exception as e:
-                logger.error(f"Failed to create Onshape assembly: {e}", exc_info=True)
+            if assembly_id:
+                onshape_managed = assembly_has_onshape_folder(current_assembly)
+            else:
+                onshape_managed = project_is_onshape_managed(current_project)
+            if onshape_managed:
+                enqueue_assembly(assembly)
+            else:
+                logger.info(f"Skipping Onshape creation - parent of {assembly.part_number} is not Onshape managed")
 
             return HttpResponseRedirect(reverse("project",args=(project_id,)))
 
@@ -295,48 +186,27 @@ def newpart(request, project_id, assembly_id = None):
             part = form.save(commit=False)
             current_project = get_object_or_404(Project, pk=project_id)
             current_assembly = part.assembly
-            part_number = int(current_assembly.part_number.split("-")[3])
-            for p in current_assembly.part_set.all():
-                if p.part_number.split("-")[2] == "P":
-                    if int(p.part_number.split("-")[3]) > part_number:
-                        part_number = int(p.part_number.split("-")[3])
-            part.part_number = f"{TEAM}-{current_project.prefix}-P-{str(part_number+1).zfill(PART_DIGITS)}"
-            part.save()
-            
-            # Onshape Integration
             try:
-                # Check if parent assembly has Onshape Document ID
-                if current_assembly.onshape_document_id:
-                    client = OnshapeClient()
-                    workspace = client.get_document_workspace(current_assembly.onshape_document_id)
-                    if workspace:
-                        part_studio = client.create_part_studio(current_assembly.onshape_document_id, workspace['id'], part.part_number)
-                        if part_studio:
-                            part.onshape_element_id = part_studio['id']
-                            part.save()
-            except Exception as e:
-                logger.error(f"Failed to create Onshape part: {e}")
+                [part_number] = allocate_part_numbers(current_assembly)
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                part.part_number = format_part_number(current_project, "P", part_number)
+                part.save()
+                form.save_m2m()
 
-            form.save_m2m()
-            
-            # Create initial revision
-            initial_revision = PartRevision.objects.create(
-                part=part,
-                revision_number='A',
-                status=PartStatus.NEW
-            )
-            
-            # Create Onshape Version for initial revision
-            try:
-                if current_assembly.onshape_document_id:
-                    client = OnshapeClient()
-                    version_name = f"Rev A - {part.name}"
-                    logger.info(f"Creating Onshape version for initial revision: {version_name}")
-                    client.create_version(current_assembly.onshape_document_id, version_name, description=f"Initial revision for {part.part_number}")
-            except Exception as e:
-                logger.error(f"Failed to create Onshape version for initial revision: {e}")
-            
-            return HttpResponseRedirect(reverse("project",args=(project_id,)))
+                # Create initial revision
+                initial_revision = PartRevision.objects.create(
+                    part=part,
+                    revision_number='A',
+                    status=PartStatus.NEW
+                )
+
+                # Onshape Integration: part studio and version for the initial revision
+                if assembly_is_onshape_managed(current_assembly):
+                    enqueue_part(part)
+
+                return HttpResponseRedirect(reverse("project",args=(project_id,)))
     else:
         initial_values = {}
         if assembly_id:
@@ -347,48 +217,54 @@ def newpart(request, project_id, assembly_id = None):
     context['form']= form
     return render(request, "newobject.html", context)
 
+@login_required
+def bulknewpart(request, project_id, assembly_id):
+    """
+    Creates many parts in one request. Accepts the BulkPartForm (pasted
+    lines or a CSV upload), or a JSON POST of [{"name": ..., "description": ...}].
+    """
+    current_assembly = get_object_or_404(Assembly.objects.select_related('project'), pk=assembly_id, project_id=project_id)
+
+    if request.method == "POST" and request.content_type == "application/json":
+        try:
+            payload = json.loads(request.body)
+            if isinstance(payload, dict):
+                payload = payload.get("parts", [])
+            rows = clean_part_rows([(r.get("name", ""), r.get("description", "")) if isinstance(r, dict) else r for r in payload])
+        except ValidationError as e:
+            return JsonResponse({"error": e.messages}, status=400)
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({"error": "Expected a JSON list of {name, description} objects"}, status=400)
+
+        try:
+            parts = create_parts(current_assembly, rows)
+        except ValidationError as e:
+            return JsonResponse({"error": e.messages}, status=400)
+        return JsonResponse({"created": [{"id": p.id, "part_number": p.part_number, "name": p.name} for p in parts]}, status=201)
+
+    context = {}
+    if request.method == "POST":
+        form = BulkPartForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                create_parts(current_assembly, form.cleaned_data["rows"])
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                return HttpResponseRedirect(reverse("assembly", args=(project_id, assembly_id)))
+    else:
+        form = BulkPartForm()
+
+    context['form'] = form
+    return render(request, "newobject.html", context)
+
 @login_required
 def project(request, project_id):
     current_project = get_object_or_404(Project, pk=project_id)
-    
-    assembly_list = []
-    for a in current_project.assembly_set.all():
-        assembly_list.append(a)
-        for a_ in a.sub.all():
-            assembly_list.append(a_)
-    for a in assembly_list:
-        if type(a) == SubAssembly:
-            for i in range(len(assembly_list)):
-                if assembly_list[i].part_number == a.part_number and type(assembly_list[i]) == Assembly:
-                    assembly_list.pop(i)
-                    break
-
-    parts_list = []
-    for assembly in assembly_list:
-        parts = assembly.part_set.all()
-        for part in parts:
-            # Add revision info to each part
-            if part.latest_revision:
-                part.current_status = part.latest_revision.status
-                part.current_status_display = part.latest_revision.get_status_display()
-                part.current_mfg_type = part.latest_revision.mfg_type
-                part.current_mfg_type_display = part.latest_revision.get_mfg_type_display()
-                part.current_material = part.latest_revision.material
-                part.current_quantity = part.latest_revision.quantity
-                part.current_drawing = part.latest_revision.drawing
-            else:
-                part.current_status = None
-                part.current_status_display = "No revisions"
-                part.current_mfg_type = None
-                part.current_mfg_type_display = "Not specified"
-                part.current_material = None
-                part.current_quantity = None
-                part.current_drawing = None
-            parts_list.append(part)
+    tree_table = render_tree_table(request, current_project, "project", lambda: load_project_tree(current_project))
 
     context = {"project": current_project,
-               "assembly_list": assembly_list,
-               "parts_list": parts_list,
+               "tree_table": tree_table,
                }
 
     return render(request, "project.html", context)
@@ -397,32 +273,11 @@ def project(request, project_id):
 def assembly_view(request, project_id, assembly_id):
     current_project = get_object_or_404(Project, pk=project_id)
     current_assembly = get_object_or_404(Assembly, pk=assembly_id)
-    assembly_list = current_assembly.sub.all()
-    parts_list = []
-    for part in current_assembly.part_set.all():
-        # Add revision info to each part
-        if part.latest_revision:
-            part.current_status = part.latest_revision.status
-            part.current_status_display = part.latest_revision.get_status_display()
-            part.current_mfg_type = part.latest_revision.mfg_type
-            part.current_mfg_type_display = part.latest_revision.get_mfg_type_display()
-            part.current_material = part.latest_revision.material
-            part.current_quantity = part.latest_revision.quantity
-            part.current_drawing = part.latest_revision.drawing
-        else:
-            part.current_status = None
-            part.current_status_display = "No revisions"
-            part.current_mfg_type = None
-            part.current_mfg_type_display = "Not specified"
-            part.current_material = None
-            part.current_quantity = None
-            part.current_drawing = None
-        parts_list.append(part)
+    tree_table = render_tree_table(request, current_project, current_assembly.pk, lambda: load_assembly_tree(current_assembly))
 
     context = {"project": current_project,
                "c_assembly": current_assembly,
-               "assembly_list": assembly_list,
-               "parts_list": parts_list,
+               "tree_table": tree_table,
                }
 
     return render(request, "assembly.html", context)
@@ -442,16 +297,17 @@ def part(request, project_id, assembly_id, part_id, revision_id=None):
     # Get all revisions for the dropdown, ordered by revision letter
     revisions = current_part.revisions.order_by('-revision_number')
     
-    # Check if user can delete revisions
-    can_delete_revisions = (request.user.groups.filter(name='leads').exists() or 
-                           request.user.groups.filter(name='mentors').exists())
-    
+    step_export = None
+    if current_revision and current_revision.pk == current_part.latest_revision_id:
+        step_export = StepExport.current_for(current_revision).filter(state=TranslationState.DONE).first()
+
     context = {"project": current_project,
                "assembly": current_assembly,
                "part": current_part,
                "revision": current_revision,
+               "step_export": step_export,
                "revisions": revisions,
-               "can_delete_revisions": can_delete_revisions,
+               "can_delete_revisions": request.roles.is_lead or request.roles.is_mentor,
                }
 
     return render(request, "part.html", context)
@@ -462,24 +318,16 @@ def newrevision(request, project_id, assembly_id, part_id):
     current_part = get_object_or_404(Part, pk=part_id)
     
     if request.method == "POST":
-        form = PartRevisionCreateForm(request.POST, request.FILES, user=request.user)
+        form = PartRevisionCreateForm(request.POST, request.FILES, roles=request.roles)
         
         if form.is_valid():
             revision = form.save(commit=False)
             revision.part = current_part
             revision.save()
             
-            # Create Onshape Version for new revision
-            try:
-                # Find the parent assembly to get the document ID
-                # Part -> Assembly
-                if current_part.assembly.onshape_document_id:
-                    client = OnshapeClient()
-                    version_name = f"Rev {revision.revision_number} - {current_part.name}"
-                    logger.info(f"Creating Onshape version for revision: {version_name}")
-                    client.create_version(current_part.assembly.onshape_document_id, version_name, description=f"Revision {revision.revision_number} for {current_part.part_number}")
-            except Exception as e:
-                logger.error(f"Failed to create Onshape version for revision: {e}")
+            # The Onshape version is created by the job worker
+            if assembly_is_onshape_managed(current_part.assembly):
+                enqueue_version(revision)
                 
             return HttpResponseRedirect(reverse("part", args=(project_id, assembly_id, part_id)))
     else:
@@ -491,7 +339,7 @@ def newrevision(request, project_id, assembly_id, part_id):
         else:
             next_revision = 'A'
         
-        form = PartRevisionCreateForm(user=request.user, initial={'revision_number': next_revision})
+        form = PartRevisionCreateForm(roles=request.roles, initial={'revision_number': next_revision})
     
     context['form'] = form
     context['part'] = current_part
@@ -503,13 +351,13 @@ def editrevision(request, project_id, assembly_id, part_id, revision_id):
     current_revision = get_object_or_404(PartRevision, pk=revision_id, part_id=part_id)
     
     if request.method == "POST":
-        form = PartRevisionForm(request.POST, request.FILES, user=request.user, instance=current_revision)
+        form = PartRevisionForm(request.POST, request.FILES, roles=request.roles, instance=current_revision)
         
         if form.is_valid():
             form.save()
             return HttpResponseRedirect(reverse("part_revision", args=(project_id, assembly_id, part_id, revision_id)))
     else:
-        form = PartRevisionForm(user=request.user, instance=current_revision)
+        form = PartRevisionForm(roles=request.roles, instance=current_revision)
     
     context['form'] = form
     context['part'] = current_revision.part
@@ -522,8 +370,7 @@ def deleterevision(request, project_id, assembly_id, part_id, revision_id):
     current_part = current_revision.part
     
     # Check if user has permission to delete revisions
-    if not (request.user.groups.filter(name='leads').exists() or 
-            request.user.groups.filter(name='mentors').exists()):
+    if not (request.roles.is_lead or request.roles.is_mentor):
         from django.contrib import messages
         messages.error(request, "Only leads and mentors can delete revisions.")
         return HttpResponseRedirect(reverse("part", args=(project_id, assembly_id, part_id)))
@@ -544,6 +391,7 @@ def deleterevision(request, project_id, assembly_id, part_id, revision_id):
     
     # Delete the revision
     current_revision.delete()
+    rollup_assembly_status(current_part.assembly_id)
     
     from django.contrib import messages
     messages.success(request, f"Revision {current_revision.revision_number} has been deleted.")
@@ -551,42 +399,45 @@ def deleterevision(request, project_id, assembly_id, part_id, revision_id):
     return HttpResponseRedirect(reverse("part", args=(project_id, assembly_id, part_id)))
 
 @login_required
-def export_step(request, project_id, assembly_id, part_id):
+async def export_step(request, project_id, assembly_id, part_id):
     """
-    Initiates the STEP export process for a part.
+    Starts a STEP export of the part's latest revision, or points at the
+    stored file if this revision was already exported and hasn't changed.
+
+    Async so the Onshape round trips park a coroutine instead of a worker
+    when the site runs under ASGI (see parts.asgi).
     """
-    current_part = get_object_or_404(Part, pk=part_id)
-    current_assembly = get_object_or_404(Assembly, pk=assembly_id)
+    current_part = await aget_object_or_404(Part.objects.select_related("latest_revision"), pk=part_id)
+    current_assembly = await aget_object_or_404(Assembly, pk=assembly_id)
+    revision = current_part.latest_revision
     
-    if not current_assembly.onshape_document_id or not current_part.onshape_element_id:
+    if not current_assembly.onshape_document_id or not current_part.onshape_element_id or revision is None:
         return JsonResponse({"error": "Not an Onshape managed part"}, status=400)
+
+    # Repeat clicks reuse the stored file, or the translation already running
+    export = await StepExport.current_for(revision).afirst()
+    if export and export.state == TranslationState.DONE:
+        return JsonResponse({"status": "ready", "url": reverse("stepexport", args=(export.id,))})
+    if export:
+        return JsonResponse({"status": "started", "translationId": export.translation_id})
     
     try:
-        client = OnshapeClient()
-        workspace = client.get_document_workspace(current_assembly.onshape_document_id)
-        
-        if not workspace:
+        client = AsyncOnshapeClient()
+        if not await current_assembly.aget_onshape_workspace_id(client):
             return JsonResponse({"error": "Could not find workspace"}, status=404)
             
-        # We need to register a webhook if not already done?
-        # Actually, the prompt says "webhook has to be registered".
-        # Assuming we register a global webhook or one for this document.
-        # For now, we'll just initiate the translation.
-        # In a real app, we'd probably have a persistent webhook or register one here.
-        
-        # Ideally, we should register a webhook for this translation.
-        # But Onshape webhooks are typically registered per-app or per-document.
-        # Let's assume the webhook endpoint exists and we just need to trigger the translation.
-        
-        response = client.create_part_studio_export(
+        response = await current_assembly.awith_onshape_workspace(client, lambda workspace_id: client.create_part_studio_export(
             current_assembly.onshape_document_id,
-            workspace['id'],
+            workspace_id,
             current_part.onshape_element_id,
             format_name="STEP"
-        )
+        ))
         
         if response and 'id' in response:
-             return JsonResponse({"status": "started", "translationId": response['id']})
+            export = await StepExport.objects.acreate(revision=revision, translation_id=response['id'], revision_updated_at=revision.updated_at)
+            # The job worker polls for the result; the webhook just hurries it along
+            await sync_to_async(enqueue_step_export)(export)
+            return JsonResponse({"status": "started", "translationId": response['id']})
         else:
              return JsonResponse({"error": "Failed to start translation"}, status=500)
 
@@ -608,9 +459,10 @@ def onshape_webhook(request):
             event = payload.get('event')
             if event == 'onshape.model.translation.complete':
                 translation_id = payload.get('translationId')
-                # Here we would ideally notify the frontend via websockets or updated DB state
-                # For now, we just log it.
                 logger.info(f"Translation complete for ID: {translation_id}")
+                # Downloading is left to the job worker so Onshape gets its 200 straight away
+                if not step_export_finished(translation_id):
+                    logger.info(f"No pending STEP export for translation {translation_id}")
                 
             return HttpResponse("OK")
         except Exception as e:
@@ -625,36 +477,29 @@ def onshape_link(request, type, id):
     Redirects to the Onshape element.
     type: 'assembly' or 'part'
     id: database id of the assembly or part
+
+    Uses the workspace id stored on the assembly, so this never calls Onshape.
     """
-    try:
-        client = OnshapeClient()
-        
-        if type == 'assembly':
-            assembly = get_object_or_404(Assembly, pk=id)
-            if not assembly.onshape_document_id or not assembly.onshape_element_id:
-                return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
-                
-            doc_id = assembly.onshape_document_id
-            element_id = assembly.onshape_element_id
+    if type == 'assembly':
+        assembly = get_object_or_404(Assembly, pk=id)
+        if not assembly.onshape_document_id or not assembly.onshape_element_id:
+            return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
             
-        elif type == 'part':
-            part = get_object_or_404(Part, pk=id)
-            if not part.assembly.onshape_document_id or not part.onshape_element_id:
-                 return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
-                 
-            doc_id = part.assembly.onshape_document_id
-            element_id = part.onshape_element_id
-        else:
+        element_id = assembly.onshape_element_id
+        
+    elif type == 'part':
+        part = get_object_or_404(Part.objects.select_related('assembly'), pk=id)
+        assembly = part.assembly
+        if not assembly.onshape_document_id or not part.onshape_element_id:
              return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
              
-        # Get default workspace
-        workspace = client.get_document_workspace(doc_id)
-        if workspace:
-            return HttpResponseRedirect(f"https://cad.onshape.com/documents/{doc_id}/w/{workspace['id']}/e/{element_id}")
-        else:
-            # Fallback if no workspace found (unlikely for valid doc)
-            return HttpResponseRedirect(f"https://cad.onshape.com/documents/{doc_id}")
-            
-    except Exception as e:
-        logger.error(f"Failed to redirect to Onshape: {e}")
-        return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
+        element_id = part.onshape_element_id
+    else:
+         return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
+         
+    doc_id = assembly.onshape_document_id
+    if assembly.onshape_workspace_id:
+        return HttpResponseRedirect(f"https://cad.onshape.com/documents/{doc_id}/w/{assembly.onshape_workspace_id}/e/{element_id}")
+    else:
+        # Not backfilled yet; Onshape opens the document's default workspace
+        return HttpResponseRedirect(f"https://cad.onshape.com/documents/{doc_id}")